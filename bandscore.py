@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Scoring of individuals in horizontal bands, for targets that are too large to render
+    at full resolution for every candidate.
+
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from lazymodule import QtGui
+from libimg import (qt_image_to_array, render_qgraphics_scene_band, max_score_rgb,
+                    QT_SLICE_RGB, QT_DEPTH_A)
+
+
+class BandScorer(object):
+
+    def __init__(self, target_arr, band_height = 256):
+        """ Renders and scores individuals band by band using buffers that are reused.
+
+            The memory that is used per candidate only depends on band_height and the image
+            width, not on the image height or the number of generations.
+
+            :param target_arr: (height, width, 4) uint8 array in Qt depth order
+        """
+        self._target_arr = target_arr
+        self._height, self._width, _ = target_arr.shape
+        self._band_height = min(band_height, self._height)
+        self._max_score_rgb = max_score_rgb(target_arr)
+
+        self._band_image = None  # created on first use so that Qt is imported lazily
+        self._band_arr = None    # shares memory with self._band_image
+        shape = (self._band_height, self._width, 3)
+        self._diff_buf = np.empty(shape, dtype = np.int16)
+        logger.debug("BandScorer: {} bands of {} rows, buffers: {:.1f} MB"
+                     .format(self.n_bands, self._band_height, self.buffer_bytes / 1e6))
+
+    @property
+    def band_height(self):
+        return self._band_height
+
+    @property
+    def n_bands(self):
+        return (self._height + self._band_height - 1) // self._band_height
+
+    @property
+    def buffer_bytes(self):
+        "Number of bytes of the reused buffers"
+        return self._diff_buf.nbytes + self._band_height * self._width * 4
+
+    def _get_band_arr(self):
+        if self._band_image is None:
+            self._band_image = QtGui.QImage(self._width, self._band_height,
+                                            QtGui.QImage.Format.Format_RGB32)
+            self._band_arr = qt_image_to_array(self._band_image, share_memory = True)
+        return self._band_arr
+
+    def score(self, individual, fitness_arr = None, antialiasing = False):
+        """ Returns the score of the individual (between 0 and 1, lower is better)
+
+            If fitness_arr is a (height, width, 4) uint8 array, the absolute difference with
+            the target (see libimg.image_array_abs_diff) is written into it.
+            If antialiasing is True, the polygon edges are anti-aliased.
+        """
+        band_arr = self._get_band_arr()
+        total = 0
+        for y_offset in range(0, self._height, self._band_height):
+            n_rows = min(self._band_height, self._height - y_offset)
+            render_qgraphics_scene_band(individual.graphics_scene, self._band_image, y_offset,
+                                        n_rows, self._width, self._height,
+                                        antialiasing = antialiasing)
+
+            diff = self._diff_buf[:n_rows]
+            np.subtract(band_arr[:n_rows, :, QT_SLICE_RGB],
+                        self._target_arr[y_offset:y_offset + n_rows, :, QT_SLICE_RGB],
+                        out = diff, dtype = np.int16)
+            np.abs(diff, out = diff)
+            total += int(diff.sum(dtype = np.int64))
+
+            if fitness_arr is not None:
+                fitness_band = fitness_arr[y_offset:y_offset + n_rows]
+                fitness_band[:, :, QT_SLICE_RGB] = diff
+                fitness_band[:, :, QT_DEPTH_A] = 255
+
+        return total / self._max_score_rgb
+
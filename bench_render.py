@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark of the renderers on individuals of triangles.
+
+    Renders the same mutated clones of a random individual with render_triangles,
+    render_front_to_back and, if PySide is available, with Qt (building the graphics scene,
+    rendering it and converting the image to an array, like the 'qt' renderer of the
+    engine). Reports the median time per render and the speedup relative to
+    render_front_to_back, and checks that the NumPy renderers agree with each other.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import sys
+import time
+
+import numpy as np
+
+from chromosomes import QtGsPolyChromosome
+from individuals import QtGsIndividual
+from rasterizer import render_front_to_back, render_triangles
+from rngstreams import create_rng
+
+# Same mutation parameters as the engine
+CLONE_KWARGS = dict(sigma_vertex = 5.0, sigma_color = 2.0, sigma_z = 1.0,
+                    min_z = 0, max_z = 1023, min_alpha = 0, max_alpha = 100)
+
+
+def render_qt(individual):
+    " Renders with Qt like the 'qt' renderer of the engine"
+    from libimg import qt_image_to_array
+    return qt_image_to_array(individual.render_image())
+
+
+def qt_available():
+    """ Returns True if PySide can be imported. Creates the QApplication if needed.
+    """
+    try:
+        from lazymodule import QtGui
+        QtGui.QApplication.instance() or QtGui.QApplication(sys.argv)
+    except ImportError:
+        return False
+    return True
+
+
+def create_individuals(width, height, n_triangles, n_renders, seed, max_alpha = 100):
+    """ Returns n_renders mutated clones of a random individual of triangles.
+    """
+    rng = create_rng(seed)
+    chrom = QtGsPolyChromosome.create_random(n_triangles, 3, (0, 0, width + 1, height + 1),
+                                             rng, max_alpha = max_alpha)
+    individual = QtGsIndividual([chrom], width, height)
+    return [individual.clone(rng, **CLONE_KWARGS) for _ in range(n_renders)]
+
+
+def time_renderer(render, individuals):
+    """ Renders each individual once. Returns the median duration and the last array.
+    """
+    durations = []
+    for individual in individuals:
+        start = time.time()
+        arr = render(individual)
+        durations.append(time.time() - start)
+    return float(np.median(durations)), arr
+
+
+def run_benchmark(width, height, n_triangles, n_renders, seed, max_alpha = 100):
+    """ Returns a list of (name, median seconds per render) tuples.
+    """
+    renderers = [('front-to-back', render_front_to_back), ('triangles', render_triangles)]
+    if qt_available():
+        renderers.append(('qt', render_qt))
+    else:
+        logger.warning("PySide is not available, Qt is not benchmarked")
+
+    individuals = create_individuals(width, height, n_triangles, n_renders, seed,
+                                     max_alpha = max_alpha)
+    results = []
+    arrays = {}
+    for name, render in renderers:
+        render(individuals[0])  # warm up
+        duration, arrays[name] = time_renderer(render, individuals)
+        results.append((name, duration))
+
+    n_different = np.count_nonzero(np.any(arrays['triangles'] != arrays['front-to-back'],
+                                          axis = 2))
+    if n_different:
+        logger.warning("render_triangles differs from render_front_to_back in {} pixels"
+                       .format(n_different))
+    return results
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmarks the renderers on triangles.')
+
+    parser.add_argument('-W', '--width', dest='width', type=int, default = 300,
+                        help = "Width of the image. Default: 300")
+
+    parser.add_argument('-H', '--height', dest='height', type=int, default = 300,
+                        help = "Height of the image. Default: 300")
+
+    parser.add_argument('-n', '--n-triangles', dest='n_triangles', type=int, default = 100,
+                        help = "Number of triangles. Default: 100")
+
+    parser.add_argument('-a', '--max-alpha', dest='max_alpha', type=int, default = 100,
+                        help = "Maximum alpha of the triangles. Default: 100")
+
+    parser.add_argument('-r', '--renders', dest='n_renders', type=int, default = 30,
+                        help = "Number of renders per renderer. Default: 30")
+
+    parser.add_argument('-s', '--seed', dest='seed', type=int, default = 1,
+                        help = "Seed of the random number generator. Default: 1")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level = 'INFO', stream = sys.stderr,
+        format='%(asctime)s: %(filename)16s:%(lineno)-4d : %(levelname)-6s: %(message)s')
+
+    results = run_benchmark(args.width, args.height, args.n_triangles, args.n_renders,
+                            args.seed, max_alpha = args.max_alpha)
+    baseline = dict(results)['front-to-back']
+    print("{:<14s} {:>10s} {:>8s}".format('renderer', 'ms/render', 'speedup'))
+    for name, duration in results:
+        print("{:<14s} {:10.2f} {:8.2f}".format(name, 1000 * duration, baseline / duration))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark of the shape chromosomes against triangles.
+
+    Runs the same hill climbing loop as the engine, with the NumPy renderers, on a synthetic
+    target image for individuals of triangles, ellipses, rectangles, strokes and a mix of
+    them. Triangles are rendered both with render_front_to_back and with the faster
+    render_triangles (the polygon baseline). All primitives are drawn with the same size
+    distribution. Reports the time per render and the score improvement per millisecond
+    of rendering, absolute and relative to the initial score, so that shape types can be
+    compared by what they buy per unit of work.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import sys
+import time
+
+import numpy as np
+
+from chromosomes import QtGsPolyChromosome
+from shapes import SHAPE_CHROMOSOMES, MIN_SIZE
+from individuals import QtGsIndividual
+from rasterizer import render_front_to_back, render_triangles
+from rngstreams import create_rng
+from libimg import (image_array_abs_diff, score_rgb, max_score_rgb,
+                    QT_DEPTH_R, QT_DEPTH_G, QT_DEPTH_B, QT_DEPTH_A)
+
+# Same mutation parameters as the engine
+CLONE_KWARGS = dict(sigma_vertex = 5.0, sigma_color = 2.0, sigma_z = 1.0,
+                    min_z = 0, max_z = 1023, min_alpha = 0, max_alpha = 100)
+
+# (name, {shape type: fraction of the number of shapes}, render function)
+CONFIGURATIONS = (
+    ('triangles', {'triangle': 1.0}, render_front_to_back),
+    ('tri-spans', {'triangle': 1.0}, render_triangles),
+    ('ellipses', {'ellipse': 1.0}, render_front_to_back),
+    ('rectangles', {'rectangle': 1.0}, render_front_to_back),
+    ('strokes', {'stroke': 1.0}, render_front_to_back),
+    ('mixed', {'triangle': 0.25, 'ellipse': 0.25, 'rectangle': 0.25, 'stroke': 0.25},
+     render_front_to_back),
+)
+
+
+def synthetic_target(width, height):
+    """ Returns a (height, width, 4) uint8 array in Qt depth order with gradients, a disc
+        and a bar, so that both smooth and sharp features must be approximated.
+    """
+    y, x = np.mgrid[0:height, 0:width] / np.array([height, width]).reshape(2, 1, 1)
+    arr = np.empty((height, width, 4), dtype = np.uint8)
+    disc = (x - 0.35) ** 2 + (y - 0.45) ** 2 < 0.06
+    bar = (np.abs(x + y - 1.2) < 0.08)
+    arr[:, :, QT_DEPTH_R] = np.where(disc, 230, 255 * x)
+    arr[:, :, QT_DEPTH_G] = np.where(bar, 40, 200 * y)
+    arr[:, :, QT_DEPTH_B] = np.where(disc | bar, 60, 255 * (1 - x) * (1 - y))
+    arr[:, :, QT_DEPTH_A] = 255
+    return arr
+
+
+def create_triangles(n_triangles, rectangle, rng, max_size):
+    """ Returns a QtGsPolyChromosome with random triangles of the same size distribution
+        as the shapes of QtGsShapeChromosome.create_random: the vertices lie within a
+        box around a center in rectangle, with half sides of at most 0.5 * max_size times
+        the smallest side of rectangle.
+    """
+    x, y, width, height = rectangle
+    chrom = QtGsPolyChromosome.create_random(n_triangles, 3, rectangle, rng,
+                                             max_alpha = CLONE_KWARGS['max_alpha'])
+    centers = np.stack((x + width * rng.random(n_triangles),
+                        y + height * rng.random(n_triangles)), axis = 1)
+    half_sizes = MIN_SIZE + (0.5 * max_size * min(width, height) - MIN_SIZE) * \
+                 rng.random((n_triangles, 1, 2))
+    offsets = half_sizes * (2 * rng.random((n_triangles, 3, 2)) - 1)
+    return QtGsPolyChromosome(centers[:, np.newaxis, :] + offsets, chrom.color_genes,
+                              chrom.z_genes)
+
+
+def create_individual(shape_fractions, n_shapes, width, height, rng, max_size = 0.25):
+    """ Returns a QtGsIndividual with n_shapes shapes, divided over the shape types.
+    """
+    rect = (-0.25 * width, -0.25 * height, 1.5 * width, 1.5 * height)
+    chromosomes = []
+    for name, fraction in sorted(shape_fractions.items()):
+        count = max(1, int(round(fraction * n_shapes)))
+        if name == 'triangle':
+            chrom = create_triangles(count, rect, rng, max_size)
+        else:
+            chrom = SHAPE_CHROMOSOMES[name].create_random(count, rect, rng, max_size = max_size,
+                                                          max_alpha = CLONE_KWARGS['max_alpha'])
+        chromosomes.append(chrom)
+    return QtGsIndividual(chromosomes, width, height)
+
+
+def hill_climb(individual, target_arr, rng, n_generations, render = render_front_to_back):
+    """ Hill climbs from individual, rendering with the render function. Returns a 
+        (initial score, final score, render seconds, n_renders) tuple.
+    """
+    max_score = max_score_rgb(target_arr)
+
+    def score(indiv):
+        start = time.time()
+        arr = render(indiv)
+        duration = time.time() - start
+        return score_rgb(image_array_abs_diff(target_arr, arr)) / max_score, duration
+
+    best_score, render_time = score(individual)
+    initial_score = best_score
+    for _ in range(n_generations):
+        candidate = individual.clone(rng, **CLONE_KWARGS)
+        candidate_score, duration = score(candidate)
+        render_time += duration
+        if candidate_score < best_score:
+            individual, best_score = candidate, candidate_score
+    return initial_score, best_score, render_time, n_generations + 1
+
+
+def run_benchmark(width, height, n_shapes, n_generations, seed, max_size = 0.25):
+    """ Runs all configurations and returns a list of result dicts.
+
+        The relative gain is the score improvement as a fraction of the initial score, so
+        that configurations that start at a different score can be compared.
+    """
+    target_arr = synthetic_target(width, height)
+    results = []
+    for name, shape_fractions, render in CONFIGURATIONS:
+        rng = create_rng(seed)
+        individual = create_individual(shape_fractions, n_shapes, width, height, rng,
+                                       max_size = max_size)
+        initial, final, render_time, n_renders = hill_climb(individual, target_arr, rng,
+                                                            n_generations, render = render)
+        render_ms = 1000 * render_time
+        results.append(dict(name = name, initial = initial, final = final,
+                            ms_per_render = render_ms / n_renders,
+                            gain_per_ms = (initial - final) / render_ms,
+                            rel_gain_per_ms = (initial - final) / initial / render_ms))
+    return results
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmarks shape chromosomes against triangles.')
+
+    parser.add_argument('-W', '--width', dest='width', type=int, default = 200,
+                        help = "Width of the target image. Default: 200")
+
+    parser.add_argument('-H', '--height', dest='height', type=int, default = 150,
+                        help = "Height of the target image. Default: 150")
+
+    parser.add_argument('-n', '--n-shapes', dest='n_shapes', type=int, default = 100,
+                        help = "Number of shapes per individual. Default: 100")
+
+    parser.add_argument('-g', '--generations', dest='n_generations', type=int, default = 300,
+                        help = "Number of hill climbing generations. Default: 300")
+
+    parser.add_argument('-m', '--max-size', dest='max_size', type=float, default = 0.25,
+                        help = "Maximum size of the shapes relative to the smallest side of "
+                               "the area in which they are placed. Default: 0.25")
+
+    parser.add_argument('-s', '--seed', dest='seed', type=int, default = 1,
+                        help = "Seed of the random number generator. Default: 1")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level = 'INFO', stream = sys.stderr,
+        format='%(asctime)s: %(filename)16s:%(lineno)-4d : %(levelname)-6s: %(message)s')
+
+    results = run_benchmark(args.width, args.height, args.n_shapes, args.n_generations,
+                            args.seed, max_size = args.max_size)
+    print("{:<12s} {:>9s} {:>9s} {:>10s} {:>14s} {:>14s}".format(
+        'shapes', 'initial', 'final', 'ms/render', 'gain/render-ms', 'rel-gain/ms'))
+    for result in results:
+        print("{name:<12s} {initial:9.6f} {final:9.6f} {ms_per_render:10.2f} "
+              "{gain_per_ms:14.3e} {rel_gain_per_ms:14.3e}".format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark of the import time of the numeric core.
+
+    Imports the modules in a fresh interpreter a number of times and reports the median
+    import time. Exits with a non-zero code if Qt or matplotlib were imported as a side
+    effect, or if the median import time, minus that of numpy alone, exceeds the budget.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import json
+import os
+import subprocess
+import sys
+
+# Modules that the numeric core should not import
+HEAVY_MODULES = ('PySide', 'PySide.QtCore', 'PySide.QtGui', 'matplotlib')
+
+_PROBE = """
+import json, sys, time
+start = time.time()
+for name in sys.argv[1:]:
+    __import__(name)
+duration = time.time() - start
+print(json.dumps({'duration': duration, 'modules': sorted(sys.modules)}))
+"""
+
+
+def time_import(module_names, n_runs = 5):
+    """ Imports module_names in n_runs fresh interpreters.
+
+        Returns a (median_duration, set_of_loaded_modules) tuple.
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    durations = []
+    loaded = set()
+    for _ in range(n_runs):
+        output = subprocess.check_output([sys.executable, '-c', _PROBE] + list(module_names),
+                                         cwd = repo_dir)
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        durations.append(result['duration'])
+        loaded.update(result['modules'])
+    durations.sort()
+    return durations[len(durations) // 2], loaded
+
+
+def check_startup(module_names, budget, n_runs = 5):
+    """ Returns True if importing module_names is fast and doesn't load heavy modules.
+    """
+    baseline, _ = time_import(['numpy'], n_runs = n_runs)
+    duration, loaded = time_import(module_names, n_runs = n_runs)
+    overhead = duration - baseline
+
+    logger.info("Import of numpy:      {:7.1f} ms".format(baseline * 1000))
+    logger.info("Import of {}: {:7.1f} ms ({:+.1f} ms relative to numpy, budget {:.1f} ms)"
+                .format(', '.join(module_names), duration * 1000, overhead * 1000, budget * 1000))
+
+    success = True
+    heavy = sorted(name for name in HEAVY_MODULES if name in loaded)
+    if heavy:
+        logger.error("Heavy modules were imported: {}".format(', '.join(heavy)))
+        success = False
+    if overhead > budget:
+        logger.error("Import overhead exceeds budget")
+        success = False
+    return success
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmarks the import time of the numeric core.')
+
+    parser.add_argument('modules', metavar='MODULE', nargs='*',
+                        default = ['engines', 'environments', 'genlog'],
+                        help = "Modules to import. Default: engines environments genlog")
+
+    parser.add_argument('-b', '--budget', dest='budget', type=float, default = 0.1,
+                        help = "Maximum import time in seconds on top of numpy. Default: 0.1")
+
+    parser.add_argument('-n', '--n-runs', dest='n_runs', type=int, default = 5,
+                        help = "Number of runs. Default: 5")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level = 'INFO', stream = sys.stderr,
+        format='%(asctime)s: %(filename)16s:%(lineno)-4d : %(levelname)-6s: %(message)s')
+
+    success = check_startup(args.modules, args.budget, n_runs = args.n_runs)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,16 +6,55 @@ from __future__ import print_function
 from __future__ import division
 
 import numpy as np
-import numpy.random as np_rnd
 import logging
 logger = logging.getLogger(__name__)
 
-from PySide import QtCore, QtGui
-from PySide.QtCore import Qt
+from lazymodule import QtCore, QtGui
+from spatialindex import GridIndex, polygon_bounding_boxes, boxes_overlap
 
-            
-NO_PEN = QtGui.QPen()
-NO_PEN.setStyle(QtCore.Qt.NoPen)
+_NO_PEN = None
+
+def no_pen():
+    """ Returns a QPen with the NoPen style. 
+    
+        Created on first use so that importing this module doesn't import Qt.
+    """
+    global _NO_PEN
+    if _NO_PEN is None:
+        _NO_PEN = QtGui.QPen()
+        _NO_PEN.setStyle(QtCore.Qt.NoPen)
+    return _NO_PEN
+    
+
+def triangles_contain_each_point(triangles, points):
+    """ Returns a (n_triangles, n_points) boolean array that is True where the triangle 
+        contains the point. 
+        
+        triangles must be a (n_triangles, 3, 2) array and points a (n_points, 2) array.
+        Points on the edges count as inside.
+    """
+    a = triangles[:, np.newaxis, 0, :]
+    b = triangles[:, np.newaxis, 1, :]
+    c = triangles[:, np.newaxis, 2, :]
+    p = points[np.newaxis, :, :]
+    
+    def edge(v0, v1):
+        return ((v1[..., 0] - v0[..., 0]) * (p[..., 1] - v0[..., 1]) - 
+                (v1[..., 1] - v0[..., 1]) * (p[..., 0] - v0[..., 0]))
+    
+    e0, e1, e2 = edge(a, b), edge(b, c), edge(c, a)
+    return ((e0 >= 0) & (e1 >= 0) & (e2 >= 0)) | ((e0 <= 0) & (e1 <= 0) & (e2 <= 0))
+    
+
+def triangles_contain_points(triangles, points):
+    """ Returns a (n_triangles, ) boolean array that is True for the triangles that contain 
+        all points. 
+        
+        triangles must be a (n_triangles, 3, 2) array and points a (n_points, 2) array.
+        Points on the edges count as inside.
+    """
+    return np.all(triangles_contain_each_point(triangles, points), axis = 1)
+    
 
 class Chromosome(object):
     """ Class that stores a number of genes"""
@@ -38,7 +77,7 @@ class QtGsPolyChromosome(Chromosome):
     RGB = slice(0, 3)
     ALPHA = 3
 
-    def __init__(self, poly_genes, color_genes, z_genes):
+    def __init__(self, poly_genes, color_genes, z_genes, sort_z = True):
         """ Class where each gene can be represented as a polygon (QGraphicsPolyItem).
         
             Each polygon has a color and a z-value (depth).
@@ -49,7 +88,14 @@ class QtGsPolyChromosome(Chromosome):
                 in the latter case all polygon will share this color
             z_genes must be a 1D array with length n_poly or length 1
                 in the latter case all polygons will have the same z-value
+                
+            If sort_z is True, the genes are stored in painting order (ascending z-values, 
+            equal z-values in their original order), so that renderers can iterate over the 
+            polygons without sorting. The rendered image doesn't change.
         """
+        if sort_z:
+            poly_genes, color_genes, z_genes = self._sorted_genes(poly_genes, color_genes, z_genes)
+            
         self._poly_genes = poly_genes
         self._color_genes = color_genes
         self._z_genes = z_genes
@@ -69,6 +115,36 @@ class QtGsPolyChromosome(Chromosome):
         assert z_genes.shape == (1,) or z_genes.shape == (self.n_polygons,), \
             "color_genes length must be 1 or n_polygons"
         
+        self._bounding_boxes = None  # created on first use
+        self._spatial_index = None   # created on first use
+        self._base_index = None      # index of the chromosome this one was derived from
+        
+        
+    @property
+    def poly_genes(self):
+        "3D float array with shape (n_poly, n_vertices, 2) containing the vertices"
+        return self._poly_genes
+        
+    @property
+    def color_genes(self):
+        "2D uint8 array with shape (n_poly, 4) or (1, 4) containing the RGBA colors"
+        return self._color_genes
+        
+    @property
+    def z_genes(self):
+        "1D float array with length n_poly or 1 containing the depths"
+        return self._z_genes
+        
+    @property
+    def is_z_sorted(self):
+        "True if the genes are stored in painting order"
+        return self._n_z_values == 1 or not np.any(self._z_genes[1:] < self._z_genes[:-1])
+        
+    def painting_order(self):
+        "Returns the indices of the polygons in the order in which they are painted"
+        if self.is_z_sorted:
+            return np.arange(self.n_polygons)
+        return np.argsort(self._z_genes, kind = 'stable')
         
     @property
     def n_polygons(self):
@@ -85,48 +161,158 @@ class QtGsPolyChromosome(Chromosome):
         "Returns the number colors in the gene"
         return self._n_colors
         
+    @property
+    def bounding_boxes(self):
+        "(n_poly, 4) array with the (x_min, y_min, x_max, y_max) of each polygon"
+        if self._bounding_boxes is None:
+            self._bounding_boxes = polygon_bounding_boxes(self._poly_genes)
+        return self._bounding_boxes
+        
+    @property
+    def spatial_index(self):
+        "GridIndex of the bounding boxes of the polygons"
+        if self._spatial_index is None:
+            if self._base_index is None:
+                self._spatial_index = GridIndex(self.bounding_boxes)
+            else:
+                # Only the boxes that moved to other grid cells are re-registered.
+                self._spatial_index = self._base_index.copy()
+                self._spatial_index.update(np.arange(self.n_polygons), self.bounding_boxes)
+                self._base_index = None
+        return self._spatial_index
+        
+    def _derive_index(self, chromosome):
+        """ Lets chromosome, a copy with the same number of polygons, derive its spatial 
+            index from the index of this chromosome when it is first used.
+        """
+        if self._spatial_index is not None:
+            chromosome._base_index = self._spatial_index
+        else:
+            chromosome._base_index = self._base_index
+        
+    def expanded_color_genes(self):
+        "Returns the color genes as a (n_poly, 4) array, also when the color is shared"
+        if self._n_colors == 1:
+            return np.repeat(self._color_genes, self.n_polygons, axis = 0)
+        return self._color_genes
+        
+    def expanded_z_genes(self):
+        "Returns the z genes as a n_poly array, also when the z-value is shared"
+        if self._n_z_values == 1:
+            return np.repeat(self._z_genes, self.n_polygons)
+        return self._z_genes
+        
     
-    def get_graphic_items(self):
-        """ Returns a list with the QGraphicItem representation of each gene
+    def polygons_overlapping(self, rect):
+        """ Returns a sorted array with the indices of the polygons whose bounding box 
+            overlaps with rect, a (x_min, y_min, x_max, y_max) tuple.
+        """
+        return self.spatial_index.query(rect)
+        
+        
+    def hidden_mask(self, canvas_rect, occlusion = False):
+        """ Returns a boolean mask of the polygons that don't contribute to the image.
+        
+            A polygon is hidden if it lies completely outside canvas_rect (a (x_min, y_min, 
+            x_max, y_max) tuple). If occlusion is True, a polygon is also hidden if its 
+            bounding box lies completely inside an opaque triangle of this chromosome that 
+            is painted on top of it. Occlusion by other chromosomes and by polygons with 
+            more than 3 vertices (which need not be convex) isn't detected, so the mask is 
+            conservative. The occlusion test costs more than it saves when rendering with 
+            Qt, so it is off by default.
         """
-        qitems = []
-        for idx, poly_gene in enumerate(self._poly_genes):
+        bboxes = self.bounding_boxes
+        hidden = ~boxes_overlap(bboxes, canvas_rect)
+        
+        if not occlusion or self.n_vertices != 3:
+            return hidden
+        occluders = np.flatnonzero(self.expanded_color_genes()[:, self.ALPHA] == 255)
+        candidates = np.flatnonzero(~hidden)
+        if len(occluders) == 0 or len(candidates) == 0:
+            return hidden
+        
+        # (n_occluders, n_candidates) mask of the occluders that contain all four corners 
+        # of the bounding box of a candidate.
+        x_min, y_min, x_max, y_max = bboxes[candidates].T
+        corners = np.stack((x_min, y_min, x_max, y_min, x_max, y_max, x_min, y_max), 
+                           axis = 1).reshape(-1, 2)
+        contained = triangles_contain_each_point(self._poly_genes[occluders], corners)
+        contained = np.all(contained.reshape(len(occluders), len(candidates), 4), axis = 2)
+        
+        # Painted on top: higher z, or equal z and added later
+        z_genes = self.expanded_z_genes()
+        z_occluders = z_genes[occluders, np.newaxis]
+        z_candidates = z_genes[np.newaxis, candidates]
+        on_top = (z_occluders > z_candidates) | \
+                 ((z_occluders == z_candidates) & (occluders[:, np.newaxis] > candidates))
+        hidden[candidates] = np.any(contained & on_top, axis = 0)
+        return hidden
+        
+    
+    def z_ordered_graphic_items(self, canvas_rect = None):
+        """ Returns a list of (z_value, QGraphicItem) tuples in painting order.
+        
+            The items themselves keep the default z-value. A scene paints items with equal
+            z-values in the order in which they were added, so when they are added in this
+            order, Qt doesn't have to sort them by depth (see QtGsIndividual).
+            
+            If canvas_rect, a (x_min, y_min, x_max, y_max) tuple, is given, no items are
+            created for the polygons that are hidden (see hidden_mask).
+        """
+        items = []
+        pen = no_pen()
+        if canvas_rect is None:
+            hidden = np.zeros(self.n_polygons, dtype = bool)
+        else:
+            hidden = self.hidden_mask(canvas_rect)
+        z_genes = self.expanded_z_genes()
+            
+        for idx in self.painting_order():
+            
+            if hidden[idx]:
+                continue
 
             if self._n_colors == 1:
                 color_gene = self._color_genes[0]
             else:
                 color_gene = self._color_genes[idx]
                 
-            if self._n_z_values == 1:
-                z_gene = self._z_genes[0]
-            else:
-                z_gene = self._z_genes[idx]
-                
-            qpoints = [QtCore.QPointF(row[0], row[1]) for row in poly_gene]
+            qpoints = [QtCore.QPointF(row[0], row[1]) for row in self._poly_genes[idx]]
             qpoly = QtGui.QPolygonF(qpoints)
             qitem = QtGui.QGraphicsPolygonItem(qpoly)
             
             qcolor = QtGui.QColor(*color_gene) # unpack tuple 
             qitem.setBrush(QtGui.QBrush(qcolor))
-            qitem.setPen(NO_PEN)
+            qitem.setPen(pen)
             
-            qitem.setZValue(z_gene)
+            items.append((z_genes[idx], qitem))
             
-            qitems.append(qitem)
-            
-        return qitems
+        return items
+        
+        
+    def get_graphic_items(self, canvas_rect = None):
+        """ Returns a list with the QGraphicItem representation of each gene in painting
+            order (see z_ordered_graphic_items)
+        """
+        return [qitem for _, qitem in self.z_ordered_graphic_items(canvas_rect = canvas_rect)]
 
         
-    def clone(self, 
+    def clone(self, rng,
               sigma_vertex = 0.0, 
               sigma_color  = 0.0,
               sigma_z      = 0.0,
               min_z        = 0,
               max_z        = 1023, 
               min_alpha    = 0,
-              max_alpha    = 255):
+              max_alpha    = 255,
+              n_layer_swaps = 0,
+              polygons     = None):
         """ Clones a chromosome and adds normal distributed noise.
         
+            Afterwards n_layer_swaps times two polygons that are adjacent in painting order 
+            swap their places (the z-values stay in place so the genes stay sorted).
+        
+            :param rng:          numpy.random.Generator from which the noise is drawn
             :param sigma_vertex: standard deviation of noise for polygon vertices
             :param sigma_color:  standard deviation of color for polygon vertices
             :param sigma_z:      standard deviation of depth for polygon vertices
@@ -134,19 +320,25 @@ class QtGsPolyChromosome(Chromosome):
             :param max_z:        maximum depth of the polygons
             :param min_alpha:    minimum transparency value of the polygons (must be >= 0)
             :param max_alpha:    maximum transparency value of the polygons (must be =< 255)
+            :param n_layer_swaps: number of swaps of adjacent polygons
+            :param polygons:     indices of the polygons that get noise (None: all polygons)
         
         """
         assert min_alpha >=0, "min_alpha should be >= 0"
         assert max_alpha <=255, "max_alpha should be <= 255"
 
-        if True:
-            noise_poly  = sigma_vertex * np_rnd.randn(self.n_polygons, self.n_vertices, 2)
-            noise_color = sigma_color  * np_rnd.randn(self.n_polygons, 4)
-            noise_z     = sigma_z      * np_rnd.randn(self.n_polygons)
+        if polygons is None:
+            noise_poly  = sigma_vertex * rng.standard_normal((self.n_polygons, self.n_vertices, 2))
+            noise_color = sigma_color  * rng.standard_normal((self.n_polygons, 4))
+            noise_z     = sigma_z      * rng.standard_normal(self.n_polygons)
         else:
-            noise_poly  = 5.0   * np_rnd.randn(self.n_polygons, self.n_vertices, 2)
-            noise_color = 5.0   * np_rnd.randn(self.n_polygons, 4)
-            noise_z     = 0.0001 * np_rnd.randn(self.n_polygons)
+            n_selected  = len(polygons)
+            noise_poly  = np.zeros((self.n_polygons, self.n_vertices, 2))
+            noise_color = np.zeros((self.n_polygons, 4))
+            noise_z     = np.zeros(self.n_polygons)
+            noise_poly[polygons]  = sigma_vertex * rng.standard_normal((n_selected, self.n_vertices, 2))
+            noise_color[polygons] = sigma_color  * rng.standard_normal((n_selected, 4))
+            noise_z[polygons]     = sigma_z      * rng.standard_normal(n_selected)
     
         new_poly_genes  = self._poly_genes.copy()  + noise_poly
         new_color_genes = self._color_genes.copy() + noise_color
@@ -156,11 +348,88 @@ class QtGsPolyChromosome(Chromosome):
         np.clip(new_color_genes[:,self.ALPHA], min_alpha, max_alpha, out = new_color_genes[:,self.ALPHA])
         np.clip(new_z_genes, min_z, max_z, out = new_z_genes)
 
-        return QtGsPolyChromosome(new_poly_genes, new_color_genes.astype(np.uint8), new_z_genes)
+        new_color_genes = new_color_genes.astype(np.uint8)
+        if n_layer_swaps > 0 and self.n_polygons > 1:
+            new_poly_genes, new_color_genes, new_z_genes = self._sorted_genes(
+                new_poly_genes, new_color_genes, new_z_genes)
+            per_polygon_colors = new_color_genes.shape[0] > 1
+            for idx in rng.integers(0, self.n_polygons - 1, size = n_layer_swaps):
+                swap = [idx + 1, idx]
+                new_poly_genes[[idx, idx + 1]] = new_poly_genes[swap]
+                if per_polygon_colors:
+                    new_color_genes[[idx, idx + 1]] = new_color_genes[swap]
+
+        clone = QtGsPolyChromosome(new_poly_genes, new_color_genes, new_z_genes)
+        self._derive_index(clone)
+        return clone
+        
+        
+    def replace_polygons(self, polygons, poly_genes, color_genes = None, z_genes = None):
+        """ Returns a copy in which the polygons with the given indices are replaced.
+        
+            poly_genes must be a (len(polygons), n_vertices, 2) array. The colors and 
+            z-values are only replaced if they are given and not shared by all polygons.
+        """
+        new_poly_genes = self._poly_genes.copy()
+        new_poly_genes[polygons] = poly_genes
+        new_color_genes = self._color_genes.copy()
+        if color_genes is not None and self._n_colors > 1:
+            new_color_genes[polygons] = color_genes
+        new_z_genes = self._z_genes.copy()
+        if z_genes is not None and self._n_z_values > 1:
+            new_z_genes[polygons] = z_genes
+            
+        result = QtGsPolyChromosome(new_poly_genes, new_color_genes, new_z_genes)
+        self._derive_index(result)
+        return result
+        
+        
+    def remove_polygons(self, polygons):
+        """ Returns a copy without the polygons with the given indices.
+        """
+        keep = np.ones(self.n_polygons, dtype = bool)
+        keep[polygons] = False
+        color_genes = self._color_genes[keep] if self._n_colors > 1 else self._color_genes.copy()
+        z_genes = self._z_genes[keep] if self._n_z_values > 1 else self._z_genes.copy()
+        return QtGsPolyChromosome(self._poly_genes[keep], color_genes, z_genes)
+        
+        
+    def add_polygons(self, poly_genes, color_genes, z_genes):
+        """ Returns a copy with extra polygons.
+        
+            poly_genes must be a (n, n_vertices, 2) array, color_genes a (n, 4) array and
+            z_genes an array of length n. The colors and z-values are ignored if they are 
+            shared by all polygons. The polygons are inserted in painting order.
+        """
+        if self._n_colors > 1:
+            color_genes = np.concatenate((self._color_genes, color_genes.astype(np.uint8)))
+        else:
+            color_genes = self._color_genes.copy()
+        if self._n_z_values > 1:
+            z_genes = np.concatenate((self._z_genes, z_genes))
+        else:
+            z_genes = self._z_genes.copy()
+        return QtGsPolyChromosome(np.concatenate((self._poly_genes, poly_genes)), 
+                                  color_genes, z_genes)
+        
+        
+    @staticmethod
+    def _sorted_genes(poly_genes, color_genes, z_genes):
+        """ Returns the genes sorted in painting order as a (poly, color, z) tuple.
+        
+            The genes are returned as is if they are already sorted. Otherwise a stable sort
+            is used, which is adaptive and therefore cheap when only a few genes moved.
+        """
+        if z_genes.shape[0] == 1 or not np.any(z_genes[1:] < z_genes[:-1]):
+            return poly_genes, color_genes, z_genes
+        order = np.argsort(z_genes, kind = 'stable')
+        if color_genes.shape[0] > 1:
+            color_genes = color_genes[order]
+        return poly_genes[order], color_genes, z_genes[order]
         
     
     @staticmethod
-    def create_random(n_polygons, n_vertices, rectangle, 
+    def create_random(n_polygons, n_vertices, rectangle, rng,
                       color     = None,
                       z         = None,
                       min_z     = 0,
@@ -170,6 +439,7 @@ class QtGsPolyChromosome(Chromosome):
         """ Creates random QtGsPolyChromosome.
         
             rectangle should be a (x, y, width, height) tuple.
+            rng should be a numpy.random.Generator.
             
             Will create n_polygons polygons each having n_vertices vertices 
             The vertices vary from (x, y) to (x+width, y+with)
@@ -184,19 +454,19 @@ class QtGsPolyChromosome(Chromosome):
         
         x, y, width, height = rectangle
         
-        poly_genes = np_rnd.rand(n_polygons, n_vertices, 2)
+        poly_genes = rng.random((n_polygons, n_vertices, 2))
         poly_genes[:,:,0] *= width  
         poly_genes[:,:,0] += x
         poly_genes[:,:,1] *= height 
         poly_genes[:,:,1] += y
         
-        if color == None:
-            color_genes = np_rnd.random_integers(0, 255, size = (n_polygons,4)).astype(np.uint8)
+        if color is None:
+            color_genes = rng.integers(0, 256, size = (n_polygons,4), dtype = np.uint8)
         else:
             color_genes = np.array(color).reshape(1,4).astype(np.uint8)
             
-        if z == None:
-            z_genes = (max_z - min_z) * np_rnd.rand(n_polygons) + min_z 
+        if z is None:
+            z_genes = (max_z - min_z) * rng.random(n_polygons) + min_z 
         else:
             z_genes = np.array(z).reshape(1)
             
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Crossover operators that combine the polygons of two parent chromosomes.
+
+    All operators return a new chromosome of the same type as the parents, with the same
+    number of polygons (or shapes) and vertices. Polygon and shape chromosomes are both
+    supported: a polygon or shape is one row of the vertex or shape genes, together with
+    its color and z-value. If the parents share a single color or z-value for all
+    polygons, the child has the shared value of parent A.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from chromosomes import QtGsPolyChromosome
+
+
+def _genes(chrom):
+    "Returns the array with one row of vertex or shape parameters per polygon or shape"
+    if isinstance(chrom, QtGsPolyChromosome):
+        return chrom.poly_genes
+    return chrom.shape_genes
+
+
+def _centers(chrom):
+    "Returns a (n_polygons, 2) array with the centroid of each polygon or shape"
+    if isinstance(chrom, QtGsPolyChromosome):
+        return chrom.poly_genes.mean(axis = 1)
+    bboxes = chrom.bounding_boxes  # the shapes are symmetric around their bbox center
+    return (bboxes[:, :2] + bboxes[:, 2:]) / 2
+
+
+def _check_parents(chrom_a, chrom_b):
+    assert type(chrom_a) is type(chrom_b), "parents must be chromosomes of the same type"
+    assert _genes(chrom_a).shape == _genes(chrom_b).shape, \
+        "parents must have the same number of polygons and vertices"
+    assert chrom_a.n_colors == chrom_b.n_colors, "parents must have the same color mode"
+    assert len(chrom_a.z_genes) == len(chrom_b.z_genes), "parents must have the same z mode"
+
+
+def _select(arr_a, arr_b, from_a):
+    """ Selects rows from arr_a where from_a is True and from arr_b elsewhere.
+
+        Arrays whose length differs from that of from_a (one row) are shared by all
+        polygons; then arr_a is returned.
+    """
+    if len(arr_a) != len(from_a):
+        return arr_a.copy()
+    return np.where(from_a.reshape((-1, ) + (1, ) * (arr_a.ndim - 1)), arr_a, arr_b)
+
+
+def uniform_crossover(chrom_a, chrom_b, rng, prob_a = 0.5):
+    """ Each polygon (with its color and z-value) is taken from parent A with probability
+        prob_a and from parent B otherwise. Polygons are matched by index.
+    """
+    _check_parents(chrom_a, chrom_b)
+    from_a = rng.random(chrom_a.n_polygons) < prob_a
+    return type(chrom_a)(_select(_genes(chrom_a), _genes(chrom_b), from_a),
+                         _select(chrom_a.color_genes, chrom_b.color_genes, from_a),
+                         _select(chrom_a.z_genes, chrom_b.z_genes, from_a))
+
+
+def z_order_crossover(chrom_a, chrom_b, rng, n_from_a = None):
+    """ One-point crossover in painting order.
+
+        The child gets the n_from_a bottom-most polygons of parent A and the remaining
+        top-most polygons of parent B, so that B's layers are painted on top of A's.
+        The polygons of B get the z-values of A's top-most polygons, so the painting order
+        within each parent is preserved and the child uses the same z-values as A.
+        If n_from_a is None it is drawn uniformly between 0 and n_polygons.
+    """
+    _check_parents(chrom_a, chrom_b)
+    n_poly = chrom_a.n_polygons
+    if n_from_a is None:
+        n_from_a = rng.integers(0, n_poly + 1)
+
+    if len(chrom_a.z_genes) == 1:
+        # A shared z-value: the polygons are painted in index order.
+        from_a = np.arange(n_poly) < n_from_a
+        return type(chrom_a)(_select(_genes(chrom_a), _genes(chrom_b), from_a),
+                             _select(chrom_a.color_genes, chrom_b.color_genes, from_a),
+                             chrom_a.z_genes.copy())
+
+    # Stable sorts, so equal z-values keep their insertion order just like in Qt.
+    order_a = np.argsort(chrom_a.z_genes, kind = 'stable')
+    order_b = np.argsort(chrom_b.z_genes, kind = 'stable')
+    idx_a = order_a[:n_from_a]
+    idx_b = order_b[n_from_a:]
+
+    genes = np.concatenate((_genes(chrom_a)[idx_a], _genes(chrom_b)[idx_b]))
+    z_genes = chrom_a.z_genes[order_a].copy()
+    if chrom_a.n_colors != n_poly:
+        color_genes = chrom_a.color_genes.copy()
+    else:
+        color_genes = np.concatenate((chrom_a.color_genes[idx_a], chrom_b.color_genes[idx_b]))
+    return type(chrom_a)(genes, color_genes, z_genes)
+
+
+def region_crossover(chrom_a, chrom_b, rng, rect):
+    """ Takes the polygons of parent A whose centroid lies inside rect and the polygons
+        of parent B whose centroid lies outside.
+
+        rect must be a (x_min, y_min, x_max, y_max) tuple. To keep the number of polygons
+        constant, randomly chosen polygons of B (outside rect) are left out if there are
+        too many, or randomly chosen polygons of B (inside rect) are added if there are too
+        few. The z-values are kept, so the painting order follows the parents.
+    """
+    _check_parents(chrom_a, chrom_b)
+    n_poly = chrom_a.n_polygons
+    x_min, y_min, x_max, y_max = rect
+
+    def inside(chrom):
+        centroids = _centers(chrom)
+        return ((centroids[:, 0] >= x_min) & (centroids[:, 0] <= x_max) &
+                (centroids[:, 1] >= y_min) & (centroids[:, 1] <= y_max))
+
+    idx_a = np.flatnonzero(inside(chrom_a))
+    inside_b = inside(chrom_b)
+    idx_b = np.flatnonzero(~inside_b)
+    n_missing = n_poly - len(idx_a) - len(idx_b)
+    if n_missing < 0:
+        idx_b = np.sort(rng.choice(idx_b, size = len(idx_b) + n_missing, replace = False))
+    elif n_missing > 0:
+        extra = rng.choice(np.flatnonzero(inside_b), size = n_missing, replace = False)
+        idx_b = np.sort(np.concatenate((idx_b, extra)))
+
+    def combine(arr_a, arr_b):
+        if len(arr_a) != n_poly:
+            return arr_a.copy()  # shared by all polygons
+        return np.concatenate((arr_a[idx_a], arr_b[idx_b]))
+
+    return type(chrom_a)(combine(_genes(chrom_a), _genes(chrom_b)),
+                         combine(chrom_a.color_genes, chrom_b.color_genes),
+                         combine(chrom_a.z_genes, chrom_b.z_genes))
+
+
+CROSSOVER_OPERATORS = {
+    'uniform': uniform_crossover,
+    'z_order': z_order_crossover,
+    'region': region_crossover,
+}
+
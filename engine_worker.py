@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Runs the evolution engine in a background thread
+
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import time
+
+from PySide import QtCore
+
+
+class EngineSnapshot(object):
+
+    def __init__(self, gen_nr, score, elapsed, individual_image, fitness_image, score_history):
+        """ The state of the engine at a certain generation.
+
+            Only contains copies so that it can be passed safely from the worker thread
+            to the GUI thread.
+
+            score_history is a list of (elapsed, score) tuples of the improvements that were
+            found since the previous snapshot was taken.
+        """
+        self.gen_nr = gen_nr
+        self.score = score
+        self.elapsed = elapsed
+        self.individual_image = individual_image
+        self.fitness_image = fitness_image
+        self.score_history = score_history
+
+
+class EngineWorker(QtCore.QObject):
+
+    sig_snapshot_ready = QtCore.Signal()
+
+    def __init__(self, engine, max_fps = 10.0, profiler = None):
+        """ Executes the generations of an engine. Should be moved to a QThread.
+
+            The worker never waits for the GUI. At most max_fps times per second it stores a
+            snapshot of the best individual and emits sig_snapshot_ready. Snapshots that have
+            not yet been picked up by take_snapshot() are replaced by newer ones, so a slow
+            GUI only skips frames and doesn't slow down the evolution.
+            
+            If profiler is a sampleprof.GenerationProfiler, it is updated after every 
+            generation so that it profiles the worker thread.
+        """
+        super(EngineWorker, self).__init__()
+        self._engine = engine
+        self._profiler = profiler
+        self._min_publish_interval = 1.0 / max_fps
+        self._running = False
+        self._elapsed = 0.0         # running time, excluding pauses
+        self._last_publish = None   # value of self._elapsed at the last snapshot
+        self._dirty = True          # True if the engine changed since the last snapshot
+
+        self._mutex = QtCore.QMutex()
+        self._snapshot = None       # latest snapshot that is not yet taken by the GUI
+        self._score_history = []    # improvements since the last taken snapshot
+
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    @property
+    def is_running(self):
+        return self._running
+
+
+    @QtCore.Slot()
+    def run(self):
+        """ Executes generations until pause() is called.
+        """
+        if self._running:
+            return
+        logger.debug("Engine worker started at generation {}".format(self._engine.gen_nr))
+        self._running = True
+        while self._running:
+            self._next_generation()
+        self._publish()
+        logger.debug("Engine worker paused at generation {}".format(self._engine.gen_nr))
+
+
+    def pause(self):
+        """ Stops the run loop after the current generation.
+
+            Is called directly from the GUI thread (not via a signal) because the event loop of
+            the worker thread is blocked while the run loop executes.
+        """
+        self._running = False
+
+
+    @QtCore.Slot()
+    def step(self):
+        """ Executes a single generation and publishes the result. Ignored while running.
+        """
+        if self._running:
+            return
+        self._next_generation()
+        self._publish()
+
+
+    def take_snapshot(self):
+        """ Returns the latest snapshot or None if there is no new snapshot.
+        """
+        locker = QtCore.QMutexLocker(self._mutex)
+        snapshot = self._snapshot
+        self._snapshot = None
+        return snapshot
+
+
+    def _next_generation(self):
+
+        start = time.time()
+        self._engine.next_generation()
+        self._elapsed += time.time() - start
+        if self._profiler is not None:
+            self._profiler.update(self._engine.gen_nr)
+
+        if self._engine.score_changed:
+            self._dirty = True
+            locker = QtCore.QMutexLocker(self._mutex)
+            self._score_history.append((self._elapsed, self._engine.score))
+            del locker
+
+        if self._dirty and (self._last_publish is None or
+                            self._elapsed - self._last_publish >= self._min_publish_interval):
+            self._publish()
+
+
+    def _publish(self):
+        """ Stores a snapshot of the engine and notifies the GUI if it has no pending snapshot.
+        """
+        engine = self._engine
+        individual_image = engine.individual.render_image()
+        fitness_image = engine.fitness_image.copy() # detach from the engine's buffer
+
+        locker = QtCore.QMutexLocker(self._mutex)
+        notify = self._snapshot is None
+        if self._snapshot is None:
+            score_history = self._score_history
+        else:
+            score_history = self._snapshot.score_history + self._score_history
+        self._score_history = []
+
+        self._snapshot = EngineSnapshot(engine.gen_nr, engine.score, self._elapsed,
+                                        individual_image, fitness_image, score_history)
+        del locker
+
+        self._last_publish = self._elapsed
+        self._dirty = False
+        if notify:
+            self.sig_snapshot_ready.emit()
+
@@ -11,13 +11,24 @@ import logging
 logger = logging.getLogger(__name__)
 
 import sys
+import numpy as np
 
-from PySide import QtCore, QtGui
+from lazymodule import QtCore, QtGui
 
 from chromosomes import QtGsPolyChromosome
+from shapes import SHAPE_CHROMOSOMES
 from individuals import QtGsIndividual
+from genlog import GenerationLogWriter
+from rngstreams import create_rng
+from fitnesscache import scoring_digest
+from sampling import PixelSampler
+from bandscore import BandScorer
+from errormap import ErrorMap
+from rasterizer import render_triangles
+from renderquality import get_render_quality, RENDER_QUALITIES
 from libimg import (qt_image_to_array, array_to_qt_image, image_array_abs_diff, 
-                    score_rgb, max_score_rgb, addr)  
+                    score_rgb, max_score_rgb, addr, get_image_rectangle,
+                    QT_DEPTH_R, QT_DEPTH_G, QT_DEPTH_B)  
 
         
 def log_array_info(name, arr):
@@ -29,47 +40,301 @@ def log_array_info(name, arr):
 
 class Engine(object):
 
-    def __init__(self, target_image):
+    def __init__(self, target_image, gen_log_file_name = None, rng = None, 
+                 fitness_cache = None, sample_fraction = None, resample_every = 1,
+                 band_height = None, renderer = 'qt', error_tile_size = None,
+                 reseed_probability = 0.1, search_quality = None, verify_quality = None,
+                 n_polygons = 100, shapes = None):
         """ Engine that executes the evolution
+        
+            All random numbers are drawn from rng, which can be a numpy.random.Generator or 
+            a seed (see rngstreams.create_rng). Use rngstreams.spawn_rngs to create 
+            independent streams for engines that run in parallel.
 
+            If gen_log_file_name is set, every accepted individual is appended to a
+            generation log (see genlog.py) so that the run can be replayed afterwards.
+            
+            If fitness_cache is a FitnessCache, candidates whose genes have been scored 
+            before aren't rendered again unless they beat the current individual.
+            
+            If sample_fraction is set, the score of a candidate is first estimated from that 
+            fraction of the pixels (see sampling.PixelSampler). Only candidates whose estimate
+            beats the current score are scored exactly, so accepted scores are always exact.
+            A new sample is drawn every resample_every generations (0: use a fixed sample).
+            
+            If band_height is set, candidates are rendered and scored in horizontal bands of 
+            that many rows through reused buffers (see bandscore.BandScorer), so that the 
+            memory use per candidate doesn't depend on the image height. The comparison 
+            image is then only computed for accepted individuals, in a single reused array.
+            This can't be combined with sample_fraction.
+            
+            The renderer can be 'qt' (QGraphicsScene) or 'numpy' (front-to-back compositing 
+            that skips pixels that are already opaque, see rasterizer.py). The 'numpy' 
+            renderer can't be combined with band_height. The 'triangles' renderer is a 
+            faster variant of 'numpy' that only supports triangles; it computes the 
+            spans of all triangles at once (see rasterizer.render_triangles). 
+            
+            If error_tile_size is set, the difference of the best individual with the target
+            is kept in an ErrorMap of tiles of that many pixels. Each generation a tile is 
+            drawn with a probability proportional to its error and only the polygons that 
+            overlap the tile are mutated. With probability reseed_probability a polygon 
+            that covers little error is moved to the tile instead, with the mean target 
+            color of the tile. This is only used by the hill climbing next_generation().
+            
+            The candidates are rendered with the search_quality profile, a RenderQuality or 
+            one of the names in renderquality.RENDER_QUALITIES (None: 'default'). If 
+            verify_quality is set, accepted individuals are scored again with that profile.
+            The score of the engine stays the search score, so that candidates are always 
+            compared under the same profile, but the verified score and the drift between
+            the two are tracked (see verified_score and quality_stats_str).
+            
+            The initial individual has a chromosome of n_polygons triangles (none if it is
+            0) and, if shapes is given, a chromosome per shape type. shapes must be a dict 
+            that maps names in shapes.SHAPE_CHROMOSOMES to counts, e.g. {'ellipse': 50}.
+            Shapes can't be combined with the 'triangles' renderer or a generation log. With
+            error_tile_size, the shapes that overlap the tile are mutated but, unlike 
+            polygons, never reseeded, so tiles without overlapping shapes are left alone.
         """
+        assert renderer in ('qt', 'numpy', 'triangles'), "Unknown renderer: {!r}".format(renderer)
+        assert renderer == 'qt' or band_height is None, "band_height requires the 'qt' renderer"
+        assert not shapes or renderer != 'triangles', "shapes require the 'qt' or 'numpy' renderer"
+        assert not shapes or gen_log_file_name is None, "shapes can't be written to a generation log"
+        self._renderer = renderer
+        self._search_quality = get_render_quality('default' if search_quality is None 
+                                                  else search_quality)
+        self._verify_quality = (None if verify_quality is None 
+                                else get_render_quality(verify_quality))
+        self._verified_score = None
+        self._n_verified = 0
+        self._drift_sum = 0.0      # sum of the verified minus the search scores
+        self._drift_abs_max = 0.0
         self._max_alpha = 100
+        self._rng = create_rng(rng)
+        self._clone_kwargs = dict(sigma_vertex = 5.0,
+                                  sigma_color  = 2.0,
+                                  sigma_z      = 1.0,
+                                  min_z        = 0,
+                                  max_z        = 1023, 
+                                  min_alpha    = 0,
+                                  max_alpha    = self._max_alpha)
         
         self._gen_nr = 0
+        self._n_evaluations = 0  # number of candidates that have been scored
         self._target_image = target_image
         self._target_arr = qt_image_to_array(target_image)
         self._max_score_rgb = max_score_rgb(self._target_arr)
-        self._individual = self._create_initial_individual(n_poly=100) 
+        self._fitness_cache = fitness_cache
+        if fitness_cache is None:
+            self._target_digest = None
+        else:  # cached scores are only valid for the same renderer and search quality
+            self._target_digest = scoring_digest(self._target_arr, 
+                                                 (self._renderer, repr(self._search_quality)))
+        
+        if band_height is None:
+            self._band_scorer = None
+            self._band_fitness_arr = None
+        else:
+            assert sample_fraction is None, "band_height and sample_fraction can't be combined"
+            self._band_scorer = BandScorer(self._target_arr, band_height = band_height)
+            self._band_fitness_arr = np.empty_like(self._target_arr)
+            
+        if sample_fraction is None:
+            self._sampler = None
+        else:
+            self._sampler = PixelSampler(self._target_arr, self._rng, fraction = sample_fraction)
+        self._resample_every = resample_every
+        self._n_estimates = 0   # number of candidates whose score was estimated
+        self._n_rechecks = 0    # number of estimated candidates that were scored exactly
+        
+        self._individual = self._create_initial_individual(n_poly=n_polygons, shapes=shapes) 
         self._indiv_score, self._fitness_image = self.score_individual(self._individual)
+        if self._verify_quality is not None:
+            self._fitness_image = self._verify(self._indiv_score)
         self._score_changed = True
         
+        if error_tile_size is None:
+            self._error_map = None
+        else:
+            self._error_map = ErrorMap(self._target_arr.shape[1], self._target_arr.shape[0],
+                                       tile_size = error_tile_size)
+            self._error_map.update(qt_image_to_array(self._fitness_image))
+        self._reseed_probability = reseed_probability
+        
+        if gen_log_file_name is None:
+            self._gen_log = None
+        else:
+            logger.info("Writing generation log: {}".format(gen_log_file_name))
+            self._gen_log = GenerationLogWriter(gen_log_file_name, self._individual)
+            self._gen_log.append(self._gen_nr, self._indiv_score, self._individual)
+            
+            
+    def close(self):
+        """ Closes the generation log (if any)
+        """
+        if self._gen_log is not None:
+            self._gen_log.close()
+            
+    def sampling_stats_str(self):
+        " Returns a string with the number of estimated and re-checked candidates"
+        if self._n_estimates == 0:
+            return "no estimated scores"
+        return ("{} estimated scores, {} ({:.2%}) re-checked exactly"
+                .format(self._n_estimates, self._n_rechecks, 
+                        self._n_rechecks / self._n_estimates))
+        
+    def quality_stats_str(self):
+        " Returns a string with the drift between the verified and the search scores"
+        if self._n_verified == 0:
+            return "no verified scores"
+        return ("{} scores verified with render quality {!r}: mean drift {:+.6f}, "
+                "max abs drift {:.6f}".format(self._n_verified, self._verify_quality.name,
+                                              self._drift_sum / self._n_verified,
+                                              self._drift_abs_max))
+        
+        
+    @property
+    def gen_nr(self):
+        "The number of generations that have been evaluated so far"
+        return self._gen_nr
+        
+    @property
+    def n_evaluations(self):
+        "The number of candidate individuals that have been scored so far"
+        return self._n_evaluations
+        
+    @property
+    def individual(self):
+        "The best individual so far"
+        return self._individual
+        
+    @property
+    def score(self):
+        "The score of the best individual so far (between 0 and 1, lower is better)"
+        return self._indiv_score
+        
+    @property
+    def verified_score(self):
+        "The score of the best individual under verify_quality (None if it isn't set)"
+        return self._verified_score
+        
+    @property
+    def fitness_image(self):
+        "The comparison image of the best individual and the target image"
+        return self._fitness_image
         
-    def _create_initial_individual(self, n_poly):
+    @property
+    def error_map(self):
+        "The ErrorMap of the best individual (None if error_tile_size isn't set)"
+        return self._error_map
+        
+    @property
+    def score_changed(self):
+        "True if the last call to next_generation() has found a better individual"
+        return self._score_changed
+        
+        
+    def _create_initial_individual(self, n_poly, shapes = None):
         """ Creates a single individual to begin with 
         """
         rect = get_image_rectangle(self._target_image, margin_relative = 0.25)
         
         chromos = []
-        chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, 
-                                                         max_alpha = self._max_alpha) )
+        if n_poly > 0:
+            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, self._rng,
+                                                             max_alpha = self._max_alpha) )
+        for name, n_shapes in sorted((shapes or {}).items()):
+            chromos.append( SHAPE_CHROMOSOMES[name].create_random(n_shapes, rect, self._rng,
+                                                                  max_alpha = self._max_alpha) )
+        assert chromos, "the individual must have polygons or shapes"
         
         return QtGsIndividual(chromos, 
                               self._target_image.width(), 
                               self._target_image.height())
                 
     
-    def score_individual(self, individual):
+    def score_individual(self, individual, quality = None):
         """ Compares the individual with the target image and assigns a score.
         
-            The score is between 0 and 1, lower is better.
+            The score is between 0 and 1, lower is better. The individual is rendered 
+            with the quality profile (None: the search quality).
+            Returns: (score, comparison image) tuple.
+        """
+        if self._band_scorer is not None:
+            score = self._band_score(individual, quality, fitness_arr = self._band_fitness_arr)
+            return score, array_to_qt_image(self._band_fitness_arr)
+        
+        return self.score_array(self.render_individual(individual, quality))
+        
+        
+    def _band_score(self, individual, quality = None, fitness_arr = None):
+        "Scores the individual band by band, see bandscore.BandScorer"
+        if quality is None:
+            quality = self._search_quality
+        return self._band_scorer.score(individual, fitness_arr = fitness_arr,
+                                       antialiasing = quality.antialiasing)
+        
+        
+    def render_individual(self, individual, quality = None):
+        """ Renders the individual with the renderer of the engine.
+        
+            The quality profile defaults to the search quality.
+            Returns a (height, width, 4) uint8 array in Qt depth order.
+        """
+        if quality is None:
+            quality = self._search_quality
+        if self._renderer == 'numpy':
+            return individual.render_array(opaque_threshold = quality.opaque_threshold)
+        elif self._renderer == 'triangles':
+            return render_triangles(individual, opaque_threshold = quality.opaque_threshold)
+        else:
+            return qt_image_to_array(individual.render_image(antialiasing = quality.antialiasing))
+        
+    
+    def score_array(self, individual_arr):
+        """ Compares a rendered individual with the target image and assigns a score.
+        
             Returns: (score, comparison image) tuple.
         """
-        individual_arr = qt_image_to_array(individual.render_image())
         fitness_arr = image_array_abs_diff(self._target_arr, individual_arr)
         score = score_rgb(fitness_arr) / self._max_score_rgb
         fitness_image = array_to_qt_image(fitness_arr)
         return score, fitness_image
         
+        
+    def _score_candidate(self, individual, prev_score):
+        """ Scores a candidate individual, using the fitness cache and the pixel sampler 
+            if they are enabled.
+        
+            Returns: (score, comparison image) tuple. The comparison image may be None, 
+            in which case it must be computed with score_individual() if the candidate is 
+            accepted. The score is exact when it is lower than prev_score.
+        """
+        if self._fitness_cache is not None:
+            key = self._fitness_cache.key(self._target_digest, individual)
+            score = self._fitness_cache.get(key)
+            # A hit on a quantised key is the score of a similar individual. It is good 
+            # enough to reject the candidate, but it must be re-scored to be accepted.
+            if score is not None and (score >= prev_score or 
+                                      not self._fitness_cache.quantised_keys):
+                return score, None
+        
+        if self._band_scorer is not None:
+            score, fitness_image = self._band_score(individual), None
+        elif self._sampler is None:
+            score, fitness_image = self.score_individual(individual)
+        else:
+            individual_arr = self.render_individual(individual)
+            self._n_estimates += 1
+            estimate = self._sampler.estimate_score(individual_arr)
+            if estimate >= prev_score:
+                return estimate, None  # not cached because it's not exact
+            self._n_rechecks += 1
+            score, fitness_image = self.score_array(individual_arr)
+            
+        if self._fitness_cache is not None:
+            self._fitness_cache.put(key, score)
+        return score, fitness_image
+            
  
     def next_generation(self):
         
@@ -77,27 +342,137 @@ class Engine(object):
         #             .format(self._gen_nr, self._indiv_score))
         
         prev_score = self._indiv_score
-        cur_individual = self._individual.clone(sigma_vertex = 5.0,
-                                                sigma_color  = 2.0,
-                                                sigma_z      = 1.0,
-                                                min_z        = 0,
-                                                max_z        = 1023, 
-                                                min_alpha    = 0,
-                                                max_alpha    = self._max_alpha)
-        cur_score, cur_fitness_image = self.score_individual(cur_individual)
+        if (self._sampler is not None and self._resample_every > 0 and 
+                self._gen_nr % self._resample_every == 0):
+            self._sampler.resample()
+            
+        if self._error_map is None:
+            cur_individual = self._individual.clone(self._rng, **self._clone_kwargs)
+        else:
+            cur_individual = self._guided_clone()
+        cur_score, cur_fitness_image = self._score_candidate(cur_individual, prev_score)
         
         #logger.debug("prev_score {}, cur_score {}".format(prev_score, cur_score))
         
+        self._n_evaluations += 1
+        
         if cur_score < prev_score:
-            self._score_changed = True
-            self._indiv_score = cur_score
-            self._individual = cur_individual
-            self._fitness_image = cur_fitness_image
+            self._accept(cur_individual, cur_score, cur_fitness_image)
         else:
             self._score_changed = False
             pass
 
         self._gen_nr += 1
+        
+        
+    def _guided_clone(self):
+        """ Clones the best individual, mutating only polygons around a tile with high error.
+        
+            See the error_tile_size parameter of the constructor.
+        """
+        tile_y, tile_x = self._error_map.sample_tiles(self._rng)
+        rect = self._error_map.tile_rect(tile_y, tile_x)
+        
+        new_chromosomes = []
+        for chrom in self._individual.chromosomes:
+            polygons = chrom.polygons_overlapping(rect)
+            if not isinstance(chrom, QtGsPolyChromosome):
+                new_chromosomes.append(chrom.clone(self._rng, polygons = polygons, 
+                                                   **self._clone_kwargs))
+            elif len(polygons) == 0 or self._rng.random() < self._reseed_probability:
+                new_chromosomes.append(self._reseed_polygon(chrom, tile_y, tile_x))
+            else:
+                new_chromosomes.append(chrom.clone(self._rng, polygons = polygons, 
+                                                   **self._clone_kwargs))
+        return QtGsIndividual(new_chromosomes, self._individual.img_width, 
+                              self._individual.img_height)
+        
+        
+    def _reseed_polygon(self, chrom, tile_y, tile_x, n_candidates = 8):
+        """ Returns a copy of chrom in which a polygon is moved to a tile.
+        
+            Of n_candidates random polygons, the one whose bounding box covers the least 
+            error is replaced (polygons outside the image cover no error at all). The new 
+            polygon gets random vertices within the tile and the mean target color of the 
+            tile, with a random alpha.
+        """
+        candidates = self._rng.integers(0, chrom.n_polygons, size = n_candidates)
+        weights = self._error_map.polygon_weights(chrom.bounding_boxes[candidates])
+        idx = candidates[np.argmin(weights)]
+        
+        x_min, y_min, x_max, y_max = self._error_map.tile_rect(tile_y, tile_x)
+        poly_gene = self._rng.random((1, chrom.n_vertices, 2))
+        poly_gene[:, :, 0] = x_min + poly_gene[:, :, 0] * (x_max - x_min)
+        poly_gene[:, :, 1] = y_min + poly_gene[:, :, 1] * (y_max - y_min)
+        
+        rows, cols = self._error_map.tile_slices(tile_y, tile_x)
+        target_tile = self._target_arr[rows, cols]
+        color_gene = np.empty((1, 4), dtype = np.uint8)
+        for channel, depth in enumerate((QT_DEPTH_R, QT_DEPTH_G, QT_DEPTH_B)):
+            color_gene[0, channel] = np.rint(target_tile[:, :, depth].mean())
+        color_gene[0, chrom.ALPHA] = self._rng.integers(1, self._max_alpha + 1)
+        
+        return chrom.replace_polygons([idx], poly_gene, color_genes = color_gene)
+        
+        
+    def _accept(self, individual, score, fitness_image):
+        """ Makes individual the best individual so far.
+        
+            If fitness_image is None it is computed.
+        """
+        if self._verify_quality is not None:
+            fitness_image = self._verify(score, individual)
+        elif fitness_image is None:
+            _, fitness_image = self.score_individual(individual)
+        self._score_changed = True
+        self._indiv_score = score
+        self._individual = individual
+        self._fitness_image = fitness_image
+        if self._error_map is not None:
+            self._error_map.update(qt_image_to_array(fitness_image))
+        if self._gen_log is not None:
+            self._gen_log.append(self._gen_nr, score, individual)
+
+
+    def _verify(self, search_score, individual = None):
+        """ Scores the individual (default: the best individual) with the verify quality 
+            and records the drift with its search score. 
+            
+            Returns the comparison image of the verify quality.
+        """
+        if individual is None:
+            individual = self._individual
+        verified_score, fitness_image = self.score_individual(individual, 
+                                                              quality = self._verify_quality)
+        drift = verified_score - search_score
+        self._verified_score = verified_score
+        self._n_verified += 1
+        self._drift_sum += drift
+        self._drift_abs_max = max(self._drift_abs_max, abs(drift))
+        return fitness_image
+
+
+# Engine types of create_engine
+ENGINE_TYPES = ('hill', 'cmaes', 'pareto')
+
+
+def create_engine(target_image, engine_type = 'hill', **kwargs):
+    """ Creates an engine of one of the ENGINE_TYPES: 'hill' (Engine), 'cmaes' 
+        (esengines.SepCmaEsEngine) or 'pareto' (moengines.ParetoEngine).
+
+        The **kwargs are passed on to the engine constructor. Raises a ValueError for an
+        unknown engine type.
+    """
+    if engine_type == 'hill':
+        return Engine(target_image, **kwargs)
+    elif engine_type == 'cmaes':
+        from esengines import SepCmaEsEngine
+        return SepCmaEsEngine(target_image, **kwargs)
+    elif engine_type == 'pareto':
+        from moengines import ParetoEngine
+        return ParetoEngine(target_image, **kwargs)
+    else:
+        raise ValueError("Unknown engine type: {!r}".format(engine_type))
 
 
 #############
@@ -106,31 +481,54 @@ class Engine(object):
     
 if __name__ == '__main__':
 
-    import numpy.random
     import os.path
-    from libimg import get_image_rectangle
+    from exporters import save_svg, save_blob
+    from fitnesscache import FitnessCache
+    from sampleprof import GenerationProfiler
     
-    def run(target_image_name):
-        
-        numpy.random.seed(2)
+    def run(target_image_name, gen_log_file_name = None, save_png = True, seed = None,
+            fitness_cache_file_name = None, sample_fraction = None, band_height = None,
+            engine_type = 'hill', renderer = 'qt', error_tile_size = None,
+            search_quality = None, verify_quality = None, profile_generations = None,
+            profile_start = 0, n_polygons = 100, shapes = None):
         
         logger.info("Loading target image: {}".format(target_image_name))
         assert os.path.exists(target_image_name), "file not found: {}".format(target_image_name)
-        target_image = QtGui.QImage(target_image_name)
+        target_image = QtGui.QImage(target_image_name).convertToFormat(
+            QtGui.QImage.Format.Format_RGB32)
 
         output_dir = 'output'
         file_name = os.path.join(output_dir, 'engine.target.png')
         logger.info('Saving: {}'.format(file_name))
         target_image.save(file_name)
         
-        engine = Engine(target_image)
+        if fitness_cache_file_name is None:
+            fitness_cache = None
+        else:
+            fitness_cache = FitnessCache(file_name = fitness_cache_file_name)
+        
+        engine = create_engine(target_image, engine_type = engine_type,
+                               gen_log_file_name = gen_log_file_name, rng = seed, 
+                               fitness_cache = fitness_cache, sample_fraction = sample_fraction,
+                               band_height = band_height, renderer = renderer,
+                               error_tile_size = error_tile_size, 
+                               search_quality = search_quality, verify_quality = verify_quality,
+                               n_polygons = n_polygons, shapes = shapes)
 
+        if profile_generations is None:
+            profiler = None
+        else:
+            profiler = GenerationProfiler(profile_generations, first_generation = profile_start,
+                                          file_prefix = os.path.join(output_dir, 'engine.profile'))
+            
         n_generations = 100000
         for gen in range(n_generations):
             engine.next_generation()
+            if profiler is not None:
+                profiler.update(engine.gen_nr)
             
             #if gen % 125 == 0:
-            if engine._score_changed:
+            if save_png and engine._score_changed:
                 file_name = os.path.join(output_dir, 
                                         'engine.individual.gen_{:05d}.score_{:08.6f}.png'
                                         .format(gen, engine._indiv_score))
@@ -146,7 +544,48 @@ if __name__ == '__main__':
                 #logger.info('Saving: {}'.format(file_name))
                 fitness_image.save(file_name)
                 
+        engine.close()
+        if profiler is not None:
+            profiler.finish()
+        logger.info("{} evaluations, score: {:8.6f}".format(engine.n_evaluations, engine.score))
+        logger.info(engine.sampling_stats_str())
+        logger.info(engine.quality_stats_str())
+        if fitness_cache is not None:
+            logger.info(fitness_cache.stats_str())
+            fitness_cache.save()
+        
+        file_name = os.path.join(output_dir, 'engine.individual.final.svg')
+        logger.info('Saving: {}'.format(file_name))
+        save_svg(file_name, engine.individual)
+        
+        if not shapes:  # the binary format only has polygons
+            file_name = os.path.join(output_dir, 'engine.individual.final.bin')
+            logger.info('Saving: {}'.format(file_name))
+            save_blob(file_name, engine.individual)
+        
+        if engine_type == 'pareto':
+            logger.info(engine.archive.summary_str())
+            knee, objectives = engine.knee_individual()
+            logger.info("Knee point: error {:.6f}, {:.0f} polygons, {:.0f} vertices"
+                        .format(*objectives))
+            for extension, save_function in (('svg', save_svg), ('bin', save_blob)):
+                file_name = os.path.join(output_dir, 'engine.individual.knee.' + extension)
+                logger.info('Saving: {}'.format(file_name))
+                save_function(file_name, knee)
+                
         
+    def parse_shape_counts(text):
+        """ Parses a 'name:count,name:count' string into a {name: count} dict
+        """
+        import argparse
+        shapes = {}
+        for item in text.split(','):
+            name, _, count = item.partition(':')
+            if name not in SHAPE_CHROMOSOMES or not count.isdigit():
+                raise argparse.ArgumentTypeError("invalid shape count: {!r}".format(item))
+            shapes[name] = int(count)
+        return shapes
+    
     def main():
     
         import argparse
@@ -160,6 +599,72 @@ if __name__ == '__main__':
             help    = "Log level. Default: 'info'", 
             choices = ('debug', 'info', 'warn', 'error', 'critical'))
         
+        parser.add_argument('-g', '--gen-log', dest='gen_log', default = None, 
+            help    = "Append every accepted individual to this generation log file.")
+        
+        parser.add_argument('-s', '--seed', dest='seed', type=int, default = 2, 
+            help    = "Root seed of the random number generator. Default: 2")
+        
+        parser.add_argument('-c', '--fitness-cache', dest='fitness_cache', default = None, 
+            help    = "Use a fitness cache that is loaded from and saved to this file.")
+        
+        parser.add_argument('--sample-fraction', dest='sample_fraction', type=float, 
+            default = None, 
+            help    = "Estimate scores from this fraction of the pixels, e.g. 0.05. "
+                      "Improvements are always re-scored exactly. Default: score all pixels")
+        
+        parser.add_argument('--band-height', dest='band_height', type=int, default = None, 
+            help    = "Render and score in bands of this many rows to bound the memory use. "
+                      "Default: render the full image at once")
+        
+        parser.add_argument('-e', '--engine', dest='engine_type', default = 'hill', 
+            help    = "Engine type. 'hill': hill climbing with fixed step sizes, "
+                      "'cmaes': separable CMA-ES, 'pareto': multi-objective error versus "
+                      "polygon and vertex count. Default: 'hill'", 
+            choices = ENGINE_TYPES)
+        
+        parser.add_argument('-r', '--renderer', dest='renderer', default = 'qt', 
+            help    = "Renderer that is used for scoring. 'qt': QGraphicsScene, 'numpy': "
+                      "front-to-back compositing with early out, 'triangles': like 'numpy' "
+                      "with batched triangle rasterization. Default: 'qt'", 
+            choices = ('qt', 'numpy', 'triangles'))
+        
+        parser.add_argument('--error-tile-size', dest='error_tile_size', type=int, 
+            default = None, 
+            help    = "Only mutate the polygons around tiles of this many pixels, drawn "
+                      "with a probability proportional to their error. Default: mutate all "
+                      "polygons")
+        
+        parser.add_argument('-q', '--quality', dest='search_quality', default = 'default', 
+            help    = "Render quality of the candidates. 'fast': NumPy renderers skip pixels "
+                      "that are opaque at 5 bits, 'high': Qt anti-aliases. Default: 'default'", 
+            choices = sorted(RENDER_QUALITIES.keys()))
+        
+        parser.add_argument('--verify-quality', dest='verify_quality', default = None, 
+            help    = "Re-score accepted individuals with this render quality and report "
+                      "the score drift. Default: no verification", 
+            choices = sorted(RENDER_QUALITIES.keys()))
+        
+        parser.add_argument('--profile', dest='profile_generations', type=int, default = None, 
+            metavar = 'N_GENERATIONS',
+            help    = "Profile this many generations with a sampling profiler and write "
+                      "output/engine.profile.<pid>.collapsed and .summary.txt. "
+                      "Default: no profiling")
+        
+        parser.add_argument('--profile-start', dest='profile_start', type=int, default = 0, 
+            help    = "Generation at which profiling starts. Default: 0")
+        
+        parser.add_argument('-p', '--polygons', dest='n_polygons', type=int, default = 100, 
+            help    = "Number of triangles of the initial individual. Default: 100")
+        
+        parser.add_argument('--shapes', dest='shapes', type=parse_shape_counts, default = None, 
+            help    = "Add chromosomes of other shapes, e.g. 'ellipse:50,stroke:20'. The "
+                      "shapes are {}. Default: only triangles"
+                      .format(', '.join(sorted(SHAPE_CHROMOSOMES.keys()))))
+        
+        parser.add_argument('--no-png', dest='save_png', action = 'store_false', 
+            help    = "Don't save a PNG file of every accepted individual.")
+        
         args = parser.parse_args()    
             
         logging.basicConfig(level = args.log_level.upper(), stream = sys.stderr, 
@@ -167,7 +672,14 @@ if __name__ == '__main__':
             
         logger.info('Started...')
         app = QtGui.QApplication(sys.argv)
-        run(args.target_image)
+        run(args.target_image, gen_log_file_name = args.gen_log, save_png = args.save_png,
+            seed = args.seed, fitness_cache_file_name = args.fitness_cache,
+            sample_fraction = args.sample_fraction, band_height = args.band_height,
+            engine_type = args.engine_type, renderer = args.renderer,
+            error_tile_size = args.error_tile_size, search_quality = args.search_quality,
+            verify_quality = args.verify_quality, 
+            profile_generations = args.profile_generations, profile_start = args.profile_start,
+            n_polygons = args.n_polygons, shapes = args.shapes)
         logger.info('Done...')
         
 
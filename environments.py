@@ -12,12 +12,13 @@ logger = logging.getLogger(__name__)
 
 import sys
 
-from PySide import QtCore, QtGui
+from lazymodule import QtCore, QtGui
 
 from libimg import (qt_image_to_array, array_to_qt_image, 
                     image_array_abs_diff, score_rgb, max_score_rgb)
 from chromosomes import QtGsPolyChromosome
 from individuals import QtGsIndividual
+from fitnesscache import array_digest
 
 
 class Environment(object):  # Abstract base class
@@ -26,13 +27,17 @@ class Environment(object):  # Abstract base class
 
 class QtImgEnvironment(Environment):
 
-    def __init__(self, target_image):
+    def __init__(self, target_image, fitness_cache = None):
         """ Environment that contains one individual who will be compared with a target_image
         
             The target_image should be a QImage.
+            If fitness_cache is a FitnessCache, the fitness_score of individuals with genes 
+            that have been scored before is looked up instead of rendered.
         """
         self._target_image   = target_image
         self._target_arr     = None  # cache array of target image
+        self._target_digest  = None
+        self._fitness_cache  = fitness_cache
         self._individual     = None
         self._clear_cache()
         
@@ -40,6 +45,7 @@ class QtImgEnvironment(Environment):
         self._individual_arr = None  # cache array of image of indivual 
         self._fitness_arr    = None  # cache of fitness array
         self._max_score_rgb  = None
+        self._fitness_score  = None
         logger.debug("cache cleared")
 
     @property
@@ -59,9 +65,9 @@ class QtImgEnvironment(Environment):
     
     @property
     def individual_arr(self):
-        assert self.individual != None, "Individual not set"
-        if self._individual_arr == None:
-            self._individual_arr = qt_image_to_array(self.individual.image)
+        assert self.individual is not None, "Individual not set"
+        if self._individual_arr is None:
+            self._individual_arr = qt_image_to_array(self.individual.render_image())
             self._max_score_rgb = max_score_rgb(self._individual_arr)
         return self._individual_arr  
 
@@ -71,13 +77,13 @@ class QtImgEnvironment(Environment):
 
     @property
     def target_arr(self):
-        if self._target_arr == None:
+        if self._target_arr is None:
             self._target_arr = qt_image_to_array(self.target_image) 
         return self._target_arr  
         
     @property
     def fitness_arr(self):
-        if self._fitness_arr == None:
+        if self._fitness_arr is None:
             self._fitness_arr = image_array_abs_diff(self.target_arr, self.individual_arr)
         return self._fitness_arr 
         
@@ -92,6 +98,22 @@ class QtImgEnvironment(Environment):
         
             The score is normalized between 0 and 1. Lower is better.
         """
+        if self._fitness_score is not None:
+            return self._fitness_score
+        
+        if self._fitness_cache is None:
+            self._fitness_score = self._compute_fitness_score()
+        else:
+            if self._target_digest is None:
+                self._target_digest = array_digest(self.target_arr)
+            key = self._fitness_cache.key(self._target_digest, self.individual)
+            self._fitness_score = self._fitness_cache.get(key)
+            if self._fitness_score is None:
+                self._fitness_score = self._compute_fitness_score()
+                self._fitness_cache.put(key, self._fitness_score)
+        return self._fitness_score
+        
+    def _compute_fitness_score(self):
         return (score_rgb(self.fitness_arr) / self._max_score_rgb)
         
 
@@ -105,9 +127,11 @@ if __name__ == '__main__':
     import numpy as np
     
     from libimg import get_image_rectangle
+    from rngstreams import create_rng
     
     def test():
         
+        rng = create_rng(1)
         target_image = QtGui.QImage(sys.argv[1])
         environment = QtImgEnvironment(target_image)
         
@@ -124,7 +148,7 @@ if __name__ == '__main__':
         chromos = []
         if True:
             n_poly = 40
-            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect ) )
+            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, rng) )
         else:            
             margin = 80
             xmin = x+margin
@@ -147,7 +171,7 @@ if __name__ == '__main__':
         
         file_name = 'environment.individual.png'
         logger.info('saving: {}'.format(file_name))
-        environment.individual.image.save(file_name)
+        environment.individual.render_image().save(file_name)
         
         file_name = 'environment.fitness.png'
         logger.info('saving: {}'.format(file_name))
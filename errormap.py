@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Downsampled map of the difference between the best individual and the target.
+
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from libimg import QT_SLICE_RGB
+
+
+class ErrorMap(object):
+
+    def __init__(self, img_width, img_height, tile_size = 16):
+        """ Sum of the RGB differences per tile of tile_size x tile_size pixels.
+
+            The map is updated from the comparison array of the best individual (see
+            update). The tiles with the most error can then be drawn with sample_tiles
+            and the polygons can be weighted by the error under their bounding box with
+            polygon_weights. Tiles at the right and bottom edges may be smaller.
+        """
+        self._img_width = int(img_width)
+        self._img_height = int(img_height)
+        self._tile_size = int(tile_size)
+        self._row_starts = np.arange(0, self._img_height, self._tile_size)
+        self._col_starts = np.arange(0, self._img_width, self._tile_size)
+        self._errors = np.zeros((len(self._row_starts), len(self._col_starts)))
+        self._integral = np.zeros((self.n_tiles_y + 1, self.n_tiles_x + 1))
+
+        # Scene coordinates per pixel, see QtGsIndividual._create_graphics_scene
+        self._scale_x = (self._img_width + 1) / self._img_width
+        self._scale_y = (self._img_height + 1) / self._img_height
+
+    @property
+    def tile_size(self):
+        return self._tile_size
+
+    @property
+    def n_tiles_x(self):
+        return len(self._col_starts)
+
+    @property
+    def n_tiles_y(self):
+        return len(self._row_starts)
+
+    @property
+    def errors(self):
+        "(n_tiles_y, n_tiles_x) array with the summed RGB difference per tile"
+        return self._errors
+
+    def update(self, fitness_arr):
+        """ Recomputes the map from a (height, width, 4) uint8 comparison array in Qt
+            depth order (see Engine.score_array).
+        """
+        pixel_errors = fitness_arr[:, :, QT_SLICE_RGB].sum(axis = 2, dtype = np.int32)
+        row_sums = np.add.reduceat(pixel_errors, self._row_starts, axis = 0)
+        self._errors = np.add.reduceat(row_sums, self._col_starts, axis = 1).astype(np.float64)
+        self._integral[1:, 1:] = self._errors.cumsum(axis = 0).cumsum(axis = 1)
+
+    def sample_tiles(self, rng, size = None):
+        """ Draws tiles with a probability proportional to their error.
+
+            Returns the (tile_y, tile_x) indices, arrays if size is not None.
+            The tiles are drawn uniformly if the map is still empty.
+        """
+        total = self._integral[-1, -1]
+        n_tiles = self._errors.size
+        if total > 0:
+            flat = rng.choice(n_tiles, size = size, p = self._errors.ravel() / total)
+        else:
+            flat = rng.integers(0, n_tiles, size = size)
+        return np.unravel_index(flat, self._errors.shape)
+
+    def tile_rect(self, tile_y, tile_x):
+        """ Returns the (x_min, y_min, x_max, y_max) scene coordinates of a tile
+        """
+        size = self._tile_size
+        col_0, row_0 = tile_x * size, tile_y * size
+        col_1 = min(col_0 + size, self._img_width)
+        row_1 = min(row_0 + size, self._img_height)
+        return (col_0 * self._scale_x, row_0 * self._scale_y,
+                col_1 * self._scale_x, row_1 * self._scale_y)
+
+    def tile_slices(self, tile_y, tile_x):
+        """ Returns the (rows, cols) slices of the pixels of a tile
+        """
+        size = self._tile_size
+        return (slice(tile_y * size, (tile_y + 1) * size),
+                slice(tile_x * size, (tile_x + 1) * size))
+
+    def polygon_weights(self, bboxes):
+        """ Returns the summed error of the tiles that overlap each bounding box.
+
+            bboxes must be a (n, 4) array with (x_min, y_min, x_max, y_max) rows in scene
+            coordinates. Boxes outside the image get weight 0. Uses the integral image of
+            the map, so the cost doesn't depend on the size of the boxes.
+        """
+        size = self._tile_size
+        tile_x = bboxes[:, [0, 2]] / (self._scale_x * size)
+        tile_y = bboxes[:, [1, 3]] / (self._scale_y * size)
+        x_0 = np.clip(np.floor(tile_x[:, 0]), 0, self.n_tiles_x).astype(np.intp)
+        x_1 = np.clip(np.floor(tile_x[:, 1]) + 1, 0, self.n_tiles_x).astype(np.intp)
+        y_0 = np.clip(np.floor(tile_y[:, 0]), 0, self.n_tiles_y).astype(np.intp)
+        y_1 = np.clip(np.floor(tile_y[:, 1]) + 1, 0, self.n_tiles_y).astype(np.intp)
+        integral = self._integral
+        return integral[y_1, x_1] - integral[y_0, x_1] - integral[y_1, x_0] + integral[y_0, x_0]
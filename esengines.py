@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Evolution strategy engines that adapt their step sizes during the run.
+
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from chromosomes import QtGsPolyChromosome
+from individuals import QtGsIndividual
+from engines import Engine
+
+
+def individual_to_vector(individual):
+    """ Returns the genes of all chromosomes of an individual as one float64 vector
+    """
+    parts = []
+    for chrom in individual.chromosomes:
+        parts.extend([chrom.poly_genes.ravel(), chrom.color_genes.ravel(), chrom.z_genes.ravel()])
+    return np.concatenate(parts).astype(np.float64)
+
+
+def vector_to_individual(vector, template, min_z = 0, max_z = 1023, min_alpha = 0, max_alpha = 255):
+    """ Creates a QtGsIndividual with the layout of template and the genes in vector.
+
+        The colors and z-values are clipped to their valid ranges and the colors are rounded.
+    """
+    chromosomes = []
+    pos = 0
+    for chrom in template.chromosomes:
+        arrays = []
+        for arr in (chrom.poly_genes, chrom.color_genes, chrom.z_genes):
+            arrays.append(vector[pos:pos + arr.size].reshape(arr.shape))
+            pos += arr.size
+        poly_genes, color_genes, z_genes = arrays
+
+        color_genes = np.round(color_genes)
+        np.clip(color_genes[:, QtGsPolyChromosome.RGB], 0, 255,
+                out = color_genes[:, QtGsPolyChromosome.RGB])
+        np.clip(color_genes[:, QtGsPolyChromosome.ALPHA], min_alpha, max_alpha,
+                out = color_genes[:, QtGsPolyChromosome.ALPHA])
+        z_genes = np.clip(z_genes, min_z, max_z)
+        chromosomes.append(QtGsPolyChromosome(poly_genes.copy(), color_genes.astype(np.uint8),
+                                              z_genes))
+    assert pos == len(vector), "vector length doesn't match the template"
+    return QtGsIndividual(chromosomes, template.img_width, template.img_height)
+
+
+def individual_step_sizes(individual, sigma_vertex, sigma_color, sigma_z):
+    """ Returns a vector (in the layout of individual_to_vector) with the initial step sizes
+    """
+    parts = []
+    for chrom in individual.chromosomes:
+        parts.extend([np.full(chrom.poly_genes.size, sigma_vertex),
+                      np.full(chrom.color_genes.size, sigma_color),
+                      np.full(chrom.z_genes.size, sigma_z)])
+    return np.concatenate(parts)
+
+
+class SepCmaEsEngine(Engine):
+
+    def __init__(self, target_image, population_size = None,
+                 sigma_vertex = 5.0, sigma_color = 2.0, sigma_z = 1.0, **kwargs):
+        """ Engine that uses a separable CMA-ES (Ros & Hansen, 2008).
+
+            The genes of the individual are treated as one search vector. Every generation
+            population_size candidates are sampled from a normal distribution with a
+            diagonal covariance matrix, which is adapted together with the global step size
+            from the best half of the candidates. The sigma parameters are the initial step
+            sizes. The default population size is 4 + 3 * ln(n_genes).
+
+            One generation evaluates population_size candidates, see n_evaluations. The
+            individual property is the best candidate that has been found so far.
+            The **kwargs are passed on to the Engine constructor.
+        """
+        assert not kwargs.get('shapes'), "SepCmaEsEngine only supports polygon chromosomes"
+        super(SepCmaEsEngine, self).__init__(target_image, **kwargs)
+
+        self._mean = individual_to_vector(self._individual)
+        n = len(self._mean)
+        lam = population_size if population_size else 4 + int(3 * np.log(n))
+        mu = lam // 2
+        weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        weights /= weights.sum()
+        mueff = 1.0 / np.sum(weights ** 2)
+
+        self._lambda = lam
+        self._mu = mu
+        self._weights = weights
+        self._mueff = mueff
+
+        # Learning rates. The rank-one and rank-mu rates are larger than those of the full
+        # CMA-ES because only n instead of n^2 / 2 parameters are adapted.
+        self._cc = 4.0 / (n + 4.0)
+        self._cs = (mueff + 2.0) / (n + mueff + 5.0)
+        c1 = 2.0 / ((n + 1.3) ** 2 + mueff)
+        cmu = min(1.0 - c1, 2.0 * (mueff - 2.0 + 1.0 / mueff) / ((n + 2.0) ** 2 + mueff))
+        self._c1 = min(1.0, c1 * (n + 2.0) / 3.0)
+        self._cmu = min(1.0 - self._c1, cmu * (n + 2.0) / 3.0)
+        self._damps = 1.0 + 2.0 * max(0.0, np.sqrt((mueff - 1.0) / (n + 1.0)) - 1.0) + self._cs
+        self._chi_n = np.sqrt(n) * (1.0 - 1.0 / (4.0 * n) + 1.0 / (21.0 * n ** 2))
+
+        # The initial step sizes are absorbed in the diagonal covariance matrix.
+        self._sigma = 1.0
+        self._cov_diag = individual_step_sizes(self._individual, sigma_vertex,
+                                               sigma_color, sigma_z) ** 2
+        self._path_c = np.zeros(n)
+        self._path_s = np.zeros(n)
+        logger.info("SepCmaEsEngine: {} genes, population size {}, mu {}".format(n, lam, mu))
+
+    @property
+    def population_size(self):
+        return self._lambda
+
+    @property
+    def sigma(self):
+        "The global step size"
+        return self._sigma
+
+    def mean_step_sizes(self):
+        """ Returns the mean step size of the vertices, colors and z-values
+        """
+        steps = self._sigma * np.sqrt(self._cov_diag)
+        result = []
+        pos = 0
+        for chrom in self._individual.chromosomes:
+            for arr in (chrom.poly_genes, chrom.color_genes, chrom.z_genes):
+                result.append(steps[pos:pos + arr.size])
+                pos += arr.size
+        return tuple(np.concatenate(result[idx::3]).mean() for idx in range(3))
+
+    def next_generation(self):
+
+        if (self._sampler is not None and self._resample_every > 0 and
+                self._gen_nr % self._resample_every == 0):
+            self._sampler.resample()
+
+        n = len(self._mean)
+        std = np.sqrt(self._cov_diag)
+        z = self._rng.standard_normal((self._lambda, n))
+        y = z * std
+        x = self._mean + self._sigma * y
+
+        self._score_changed = False
+        scores = np.empty(self._lambda)
+        for idx in range(self._lambda):
+            candidate = vector_to_individual(x[idx], self._individual, max_alpha = self._max_alpha)
+            prev_score = self._indiv_score
+            score, fitness_image = self._score_candidate(candidate, prev_score)
+            self._n_evaluations += 1
+            scores[idx] = score
+            if score < prev_score:
+                self._accept(candidate, score, fitness_image)
+
+        # Recombination of the best mu candidates
+        order = np.argsort(scores, kind = 'stable')[:self._mu]
+        y_w = np.dot(self._weights, y[order])
+        z_w = np.dot(self._weights, z[order])
+        self._mean = self._mean + self._sigma * y_w
+
+        # Step size control
+        cs = self._cs
+        self._path_s = (1 - cs) * self._path_s + np.sqrt(cs * (2 - cs) * self._mueff) * z_w
+        norm_ps = np.linalg.norm(self._path_s)
+        self._sigma *= np.exp((cs / self._damps) * (norm_ps / self._chi_n - 1))
+
+        # Covariance adaptation
+        cc = self._cc
+        n_gens = self._gen_nr + 1
+        h_sig = (norm_ps / np.sqrt(1 - (1 - cs) ** (2 * n_gens)) <
+                 (1.4 + 2.0 / (n + 1)) * self._chi_n)
+        self._path_c = ((1 - cc) * self._path_c +
+                        h_sig * np.sqrt(cc * (2 - cc) * self._mueff) * y_w)
+        rank_one = self._path_c ** 2 + (1 - h_sig) * cc * (2 - cc) * self._cov_diag
+        rank_mu = np.dot(self._weights, y[order] ** 2)
+        self._cov_diag = ((1 - self._c1 - self._cmu) * self._cov_diag +
+                          self._c1 * rank_one + self._cmu * rank_mu)
+
+        self._gen_nr += 1
+
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Resolution independent export of individuals.
+
+    An individual is written as SVG or as a compact binary blob with quantised genes (the
+    encoding of genecodec, which is also used for transfer between processes). Both can be
+    rendered at any resolution without re-running the evolution.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from chromosomes import QtGsPolyChromosome
+from individuals import QtGsIndividual, BACKGROUND_RGB
+from genecodec import encode_individual, decode_individual
+
+
+def _z_ranks(individual):
+    """ Returns a list with for each chromosome the dense rank of its z-genes.
+
+        Only the order of the z-values matters when painting. Polygons with equal z-values
+        get equal ranks, so that ties are resolved in insertion order just like Qt does.
+    """
+    all_z = np.concatenate([chrom.z_genes for chrom in individual.chromosomes])
+    _, ranks = np.unique(all_z, return_inverse=True)
+
+    result = []
+    start = 0
+    for chrom in individual.chromosomes:
+        stop = start + len(chrom.z_genes)
+        result.append(ranks[start:stop])
+        start = stop
+    return result
+
+
+def _painting_order(individual):
+    """ Returns a list of (chromosome, polygon_index) tuples in the order they are painted.
+    """
+    items = []
+    ranks = _z_ranks(individual)
+    for chrom, chrom_ranks in zip(individual.chromosomes, ranks):
+        for idx in range(chrom.n_polygons):
+            rank = chrom_ranks[0] if len(chrom_ranks) == 1 else chrom_ranks[idx]
+            items.append((rank, len(items), chrom, idx))
+    items.sort(key = lambda item: item[:2]) # stable: ties are painted in insertion order
+    return [(chrom, idx) for _, _, chrom, idx in items]
+
+
+def individual_to_svg(individual, precision = 1):
+    """ Returns a compact SVG document (unicode string) of a QtGsIndividual.
+
+        The coordinates are rounded to precision decimals.
+    """
+    # The scene rectangle is one larger than the image, see QtGsIndividual.__init__
+    width = individual.img_width
+    height = individual.img_height
+    lines = []
+    lines.append(u'<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" '
+                 u'viewBox="0 0 {2} {3}" preserveAspectRatio="none">'
+                 .format(width, height, width + 1, height + 1))
+    lines.append(u'<rect width="100%" height="100%" fill="#{:02x}{:02x}{:02x}"/>'
+                 .format(*BACKGROUND_RGB))
+
+    coord_fmt = u'{{:.{}f}},{{:.{}f}}'.format(precision, precision)
+    for chrom, idx in _painting_order(individual):
+        if not isinstance(chrom, QtGsPolyChromosome):
+            lines.append(chrom.svg_element(idx, precision = precision))
+            continue
+        color = chrom.color_genes[0] if chrom.n_colors == 1 else chrom.color_genes[idx]
+        points = u' '.join(coord_fmt.format(x, y) for x, y in chrom.poly_genes[idx])
+        lines.append(u'<polygon points="{}" fill="#{:02x}{:02x}{:02x}" fill-opacity="{:.3g}"/>'
+                     .format(points, color[0], color[1], color[2], color[3] / 255))
+
+    lines.append(u'</svg>')
+    return u'\n'.join(lines)
+
+
+def save_svg(file_name, individual, precision = 1):
+    """ Writes a QtGsIndividual to an SVG file.
+    """
+    svg = individual_to_svg(individual, precision = precision)
+    with open(file_name, 'wb') as file:
+        file.write(svg.encode('utf-8'))
+
+
+def individual_to_blob(individual):
+    """ Returns a compact binary representation (bytes) of a QtGsIndividual.
+
+        This is the fixed-point encoding of genecodec.encode_individual: vertices in units
+        of 1/genecodec.VERTEX_SCALE pixel as int16 (int32 if they don't fit), colors as
+        uint8 and z-values as uint16.
+    """
+    for chrom in individual.chromosomes:
+        assert isinstance(chrom, QtGsPolyChromosome), \
+            "Only QtGsPolyChromosomes can be exported, got: {}".format(type(chrom))
+    return encode_individual(individual)
+
+
+def blob_to_individual(blob):
+    """ Creates a QtGsIndividual from a blob that was created with individual_to_blob()
+    """
+    return decode_individual(blob)
+
+
+def save_blob(file_name, individual):
+    """ Writes a QtGsIndividual to a binary file
+    """
+    with open(file_name, 'wb') as file:
+        file.write(individual_to_blob(individual))
+
+
+def load_blob(file_name):
+    """ Reads a QtGsIndividual from a binary file that was written with save_blob()
+    """
+    with open(file_name, 'rb') as file:
+        return blob_to_individual(file.read())
+
+
+#############
+## Testing ##
+#############
+
+if __name__ == '__main__':
+
+    import sys
+    from PySide import QtGui
+    from rngstreams import create_rng
+
+    def test():
+
+        img_width = 300
+        img_height = 300
+        rect = (-75, -75, 450, 450)
+        chromos = [QtGsPolyChromosome.create_random(100, 3, rect, create_rng(1), 
+                                                    max_alpha = 100)]
+        individual = QtGsIndividual(chromos, img_width, img_height)
+
+        file_name = 'exporters.individual.svg'
+        logger.info('saving: {}'.format(file_name))
+        save_svg(file_name, individual)
+
+        file_name = 'exporters.individual.bin'
+        logger.info('saving: {}'.format(file_name))
+        save_blob(file_name, individual)
+
+        restored = load_blob(file_name)
+        file_name = 'exporters.restored.png'
+        logger.info('saving: {}'.format(file_name))
+        restored.render_image().save(file_name)
+
+
+    def main():
+
+        logging.basicConfig(level = 'DEBUG',
+            format='%(asctime)s: %(filename)20s:%(lineno)-4d : %(levelname)-6s: %(message)s')
+
+        logger.info('Started...')
+        app = QtGui.QApplication(sys.argv)
+        test()
+        logger.info('Done...')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Cache of fitness scores, keyed by a hash of the genes and of the target image.
+
+    Identical individuals (e.g. after migration or a restart) are then only scored once.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import collections
+import hashlib
+import os
+import pickle
+import numpy as np
+
+_DIGEST_SIZE = 16
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size = _DIGEST_SIZE)
+
+
+def _update_hash(hasher, arr):
+    " Adds the contents, shape and dtype of an array to the hash"
+    arr = np.ascontiguousarray(arr)
+    hasher.update(str((arr.shape, arr.dtype.str)).encode('ascii'))
+    hasher.update(arr.view(np.uint8).ravel())
+
+
+def array_digest(arr):
+    """ Returns a digest (bytes) of the contents, shape and dtype of an array
+    """
+    hasher = _new_hash()
+    _update_hash(hasher, arr)
+    return hasher.digest()
+
+
+def scoring_digest(target_arr, settings = ()):
+    """ Returns a digest (bytes) of a target array and of the settings that affect the
+        scores, e.g. the renderer. The settings must be a sequence of strings.
+
+        Use it as the target digest of FitnessCache.key(), so that a persisted cache can't
+        return scores that were computed with other settings.
+    """
+    hasher = _new_hash()
+    _update_hash(hasher, target_arr)
+    for setting in settings:
+        hasher.update(setting.encode('utf-8') + b'\0')
+    return hasher.digest()
+
+
+def gene_digest(individual):
+    """ Returns a digest (bytes) of the genes of all chromosomes of an individual.
+    """
+    hasher = _new_hash()
+    for chrom in individual.chromosomes:
+        if hasattr(chrom, 'shape_genes'):
+            # Shape chromosomes (see shapes.py) with the same genes can be different shapes
+            hasher.update(type(chrom).__name__.encode('ascii'))
+            genes = chrom.shape_genes
+        else:
+            genes = chrom.poly_genes
+        for arr in (genes, chrom.color_genes, chrom.z_genes):
+            _update_hash(hasher, arr)
+    return hasher.digest()
+
+
+def quantised_gene_digest(individual):
+    """ Returns a digest (bytes) of the fixed-point encoding of the genes (see genecodec).
+
+        Individuals whose genes differ less than the quantisation step get the same digest.
+    """
+    from genecodec import encode_chromosome
+    hasher = _new_hash()
+    for chrom in individual.chromosomes:
+        assert not hasattr(chrom, 'shape_genes'), \
+            "Quantised digests only support polygon chromosomes, got: {}".format(type(chrom))
+        for arr in encode_chromosome(chrom):
+            _update_hash(hasher, arr)
+    return hasher.digest()
+
+
+class FitnessCache(object):
+
+    def __init__(self, max_size = 100000, file_name = None, quantised_keys = False):
+        """ Bounded least-recently-used cache of fitness scores.
+
+            The keys are (target_digest, gene_digest) tuples, see key(). If quantised_keys 
+            is True, the genes are quantised before hashing (see quantised_gene_digest), so 
+            that individuals that only differ by a fraction of a pixel share an entry. A hit 
+            then returns the score of a similar individual, which is not exact.
+            If file_name is given and the file exists, the cache is loaded from it. 
+            Call save() to write it back.
+        """
+        assert max_size > 0, "max_size must be > 0"
+        self._quantised_keys = quantised_keys
+        self._gene_digest = quantised_gene_digest if quantised_keys else gene_digest
+        self._max_size = max_size
+        self._file_name = file_name
+        self._scores = collections.OrderedDict()
+        self.reset_stats()
+
+        if file_name is not None and os.path.exists(file_name):
+            self.load(file_name)
+
+    def reset_stats(self):
+        self._n_hits = 0
+        self._n_misses = 0
+        self._n_evictions = 0
+
+    def __len__(self):
+        return len(self._scores)
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @property
+    def quantised_keys(self):
+        "True if individuals that only differ by a fraction of a pixel share an entry"
+        return self._quantised_keys
+
+    @property
+    def n_hits(self):
+        return self._n_hits
+
+    @property
+    def n_misses(self):
+        return self._n_misses
+
+    @property
+    def hit_rate(self):
+        "Fraction of the lookups that were a hit (0 if there were no lookups)"
+        n_lookups = self._n_hits + self._n_misses
+        return self._n_hits / n_lookups if n_lookups else 0.0
+
+    def stats_str(self):
+        return ("fitness cache: {} entries, {} hits, {} misses, hit rate {:.1%}, {} evictions"
+                .format(len(self), self._n_hits, self._n_misses, self.hit_rate,
+                        self._n_evictions))
+
+    def key(self, target_digest, individual):
+        """ Returns the key of an individual that is compared with the target with the 
+            given digest (see array_digest and scoring_digest).
+        """
+        return (target_digest, self._gene_digest(individual))
+
+    def get(self, key):
+        """ Returns the score that is stored under key or None if it is not present.
+        """
+        score = self._scores.pop(key, None)
+        if score is None:
+            self._n_misses += 1
+        else:
+            self._scores[key] = score # re-insert as most recently used
+            self._n_hits += 1
+        return score
+
+    def put(self, key, score):
+        """ Stores the score under key, evicting the least recently used entry if needed.
+        """
+        self._scores.pop(key, None)
+        self._scores[key] = score
+        while len(self._scores) > self._max_size:
+            self._scores.popitem(last = False)
+            self._n_evictions += 1
+
+    def save(self, file_name = None):
+        """ Writes the cache to file_name (default: the file name given in the constructor)
+        """
+        file_name = self._file_name if file_name is None else file_name
+        assert file_name is not None, "No file name given"
+        logger.info("Saving {} to: {}".format(self.stats_str(), file_name))
+        with open(file_name, 'wb') as file:
+            pickle.dump(list(self._scores.items()), file, protocol = 2)
+
+    def load(self, file_name):
+        """ Adds the entries that are stored in file_name to the cache
+        """
+        with open(file_name, 'rb') as file:
+            items = pickle.load(file)
+        for key, score in items:
+            self.put(key, score)
+        logger.info("Loaded {} fitness cache entries from: {}".format(len(items), file_name))
+
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Compact fixed-point encoding of genes for transfer between processes, checkpoints and
+    the binary export of individuals (exporters.save_blob).
+
+    Vertex coordinates are stored in units of 1/VERTEX_SCALE pixel as int16 (or int32 when
+    the coordinates don't fit), z-values as uint16 over the range [min_z, max_z] and colors
+    as uint8. This is about 4 times smaller than the float64 genes. Encoding and decoding
+    are vectorized.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import struct
+import numpy as np
+
+# Number of fixed-point units per pixel of the vertex coordinates.
+VERTEX_SCALE = 16
+
+Z_LEVELS = np.iinfo(np.uint16).max
+
+CODEC_MAGIC = b'PYMQ'
+CODEC_VERSION = 2
+
+_HEADER = struct.Struct('<4sBHHH')       # magic, version, width, height, n_chromosomes
+_CHROMOSOME = struct.Struct('<HHHHcdd')  # n_polygons, n_vertices, n_colors, n_z_values,
+                                         # vertex dtype char, min_z, max_z
+
+
+def quantise_vertices(poly_genes, scale = VERTEX_SCALE, dtype = None):
+    """ Returns the vertices in fixed-point units of 1/scale pixel.
+
+        If dtype is None, int16 is used if all coordinates fit, int32 otherwise.
+        If dtype is given, all coordinates must fit in it.
+    """
+    fixed = np.rint(poly_genes * scale)
+
+    def fits(dtype):
+        info = np.iinfo(dtype)
+        return fixed.size == 0 or (fixed.min() >= info.min and fixed.max() <= info.max)
+
+    if dtype is None:
+        dtype = np.int16 if fits(np.int16) else np.int32
+    assert fits(dtype), "Vertices don't fit in {} at scale {}".format(np.dtype(dtype), scale)
+    return fixed.astype(dtype)
+
+
+def dequantise_vertices(fixed, scale = VERTEX_SCALE):
+    "Returns the float64 vertices of quantise_vertices() output"
+    return fixed.astype(np.float64) / scale
+
+
+def quantise_z(z_genes, min_z, max_z):
+    "Returns the z-values as uint16 over the range [min_z, max_z]"
+    fixed = np.rint((np.asarray(z_genes, dtype = np.float64) - min_z) * (Z_LEVELS / (max_z - min_z)))
+    return np.clip(fixed, 0, Z_LEVELS).astype(np.uint16)
+
+
+def dequantise_z(fixed, min_z, max_z):
+    "Returns the float64 z-values of quantise_z() output"
+    return fixed.astype(np.float64) * ((max_z - min_z) / Z_LEVELS) + min_z
+
+
+def encode_chromosome(chrom, min_z = 0, max_z = 1023):
+    """ Returns the (vertices, colors, z-values) of a QtGsPolyChromosome as fixed-point arrays.
+    """
+    return (quantise_vertices(chrom.poly_genes), chrom.color_genes.astype(np.uint8),
+            quantise_z(chrom.z_genes, min_z, max_z))
+
+
+def decode_chromosome(fixed_vertices, colors, fixed_z, min_z = 0, max_z = 1023):
+    """ Creates a QtGsPolyChromosome from the output of encode_chromosome()
+    """
+    from chromosomes import QtGsPolyChromosome
+    return QtGsPolyChromosome(dequantise_vertices(fixed_vertices), colors.copy(),
+                              dequantise_z(fixed_z, min_z, max_z))
+
+
+def encode_individual(individual, min_z = 0, max_z = 1023):
+    """ Returns the fixed-point encoding of a QtGsIndividual as bytes.
+    """
+    chromosomes = individual.chromosomes
+    parts = [_HEADER.pack(CODEC_MAGIC, CODEC_VERSION, individual.img_width,
+                          individual.img_height, len(chromosomes))]
+    for chrom in chromosomes:
+        vertices, colors, z_values = encode_chromosome(chrom, min_z = min_z, max_z = max_z)
+        parts.append(_CHROMOSOME.pack(chrom.n_polygons, chrom.n_vertices, chrom.n_colors,
+                                      len(z_values), vertices.dtype.char.encode('ascii'),
+                                      min_z, max_z))
+        parts.append(vertices.astype(vertices.dtype.newbyteorder('<')).tobytes())
+        parts.append(colors.tobytes())
+        parts.append(z_values.astype('<u2').tobytes())
+    return b''.join(parts)
+
+
+def decode_individual(data):
+    """ Creates a QtGsIndividual from the output of encode_individual()
+    """
+    from individuals import QtGsIndividual
+    magic, version, width, height, n_chromosomes = _HEADER.unpack_from(data, 0)
+    assert magic == CODEC_MAGIC, "Not a PyMona quantised gene encoding: {!r}".format(magic)
+    assert version == CODEC_VERSION, "Unsupported encoding version: {}".format(version)
+    pos = _HEADER.size
+
+    chromosomes = []
+    for _ in range(n_chromosomes):
+        (n_polygons, n_vertices, n_colors, n_z_values, vertex_char,
+         min_z, max_z) = _CHROMOSOME.unpack_from(data, pos)
+        pos += _CHROMOSOME.size
+
+        vertex_dtype = np.dtype(vertex_char.decode('ascii')).newbyteorder('<')
+        vertices = np.frombuffer(data, dtype = vertex_dtype, offset = pos,
+                                 count = n_polygons * n_vertices * 2)
+        pos += vertices.nbytes
+        colors = np.frombuffer(data, dtype = np.uint8, offset = pos, count = n_colors * 4)
+        pos += colors.nbytes
+        z_values = np.frombuffer(data, dtype = '<u2', offset = pos, count = n_z_values)
+        pos += z_values.nbytes
+
+        chromosomes.append(decode_chromosome(vertices.reshape(n_polygons, n_vertices, 2),
+                                             colors.reshape(n_colors, 4), z_values,
+                                             min_z = min_z, max_z = max_z))
+
+    assert pos == len(data), "Encoding has {} trailing bytes".format(len(data) - pos)
+    return QtGsIndividual(chromosomes, width, height)
+
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Append-only binary log of the accepted individuals of an evolution run.
+
+    The log starts with a header that describes the layout of the chromosomes. Then
+    follows one record per accepted individual. Most records contain the genes XOR-ed
+    with those of the previous record. Genes that didn't change (colors and z-values that
+    got no or too little noise, and polygons that weren't mutated) XOR to zero bytes, and
+    for a perturbed float the sign, exponent and leading mantissa bytes usually stay the
+    same, so only its low-order bytes are non-zero. The runs of zero bytes compress well,
+    the perturbed low-order bytes hardly compress at all. Every keyframe_interval
+    records a keyframe with the full genes is written so that a reader can seek to any
+    generation by replaying at most keyframe_interval records. When the layout changes
+    (e.g. an individual gains or loses polygons), a layout record with the new layout
+    and the full genes is written; it acts as a keyframe.
+
+    The reconstruction is bit-exact.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import struct
+import zlib
+import numpy as np
+
+GENLOG_MAGIC = b'PYML'
+GENLOG_VERSION = 3
+
+RECORD_KEYFRAME = 0
+RECORD_DELTA = 1
+RECORD_LAYOUT = 2   # keyframe that is preceded by a new layout
+
+_HEADER = struct.Struct('<4sBHHH')      # magic, version, width, height, n_chromosomes
+_CHROMOSOME = struct.Struct('<HHHH')    # n_polygons, n_vertices, n_colors, n_z_values
+_RECORD = struct.Struct('<BIdI')        # kind, gen_nr, score, payload length
+_LAYOUT = struct.Struct('<H')           # n_chromosomes, followed by a _CHROMOSOME each
+
+# Gene arrays per chromosome and the dtypes with which they are stored.
+_GENE_DTYPES = ('<f8', 'u1', '<f8')     # poly_genes, color_genes, z_genes
+
+
+def _chromosome_genes(chrom):
+    "Returns the gene arrays of a chromosome in the order in which they are stored."
+    return (chrom.poly_genes, chrom.color_genes, chrom.z_genes)
+
+
+def _layout(individual):
+    "Returns the (n_polygons, n_vertices, n_colors, n_z_values) tuple of each chromosome."
+    return tuple((chrom.n_polygons, chrom.n_vertices, chrom.n_colors, len(chrom.z_genes))
+                 for chrom in individual.chromosomes)
+
+
+def _pack_chromosome_layouts(layout):
+    return b''.join(_CHROMOSOME.pack(*chrom_layout) for chrom_layout in layout)
+
+
+def _unpack_chromosome_layouts(data, pos, n_chromosomes):
+    " Returns the (layout, new_pos) of n_chromosomes _CHROMOSOME structs at pos"
+    layout = []
+    for _ in range(n_chromosomes):
+        layout.append(_CHROMOSOME.unpack_from(data, pos))
+        pos += _CHROMOSOME.size
+    return tuple(layout), pos
+
+
+def _genes_to_bytes(individual):
+    "Returns the raw (native) bytes of all gene arrays of an individual as one uint8 array."
+    parts = []
+    for chrom in individual.chromosomes:
+        for arr, dtype in zip(_chromosome_genes(chrom), _GENE_DTYPES):
+            parts.append(np.ascontiguousarray(arr, dtype = dtype).view(np.uint8).ravel())
+    return np.concatenate(parts)
+
+
+class GenerationLogWriter(object):
+
+    def __init__(self, file_name, individual, keyframe_interval = 100, compress_level = 6):
+        """ Creates a new generation log.
+
+            The layout of the chromosomes is taken from individual. If an individual that
+            is appended later has another layout, a layout record is written.
+        """
+        self._file_name = file_name
+        self._keyframe_interval = keyframe_interval
+        self._compress_level = compress_level
+        self._n_records = 0
+        self._prev_bytes = None
+
+        self._layout = _layout(individual)
+
+        self._file = open(file_name, 'wb')
+        self._file.write(_HEADER.pack(GENLOG_MAGIC, GENLOG_VERSION, individual.img_width,
+                                      individual.img_height, len(self._layout)))
+        self._file.write(_pack_chromosome_layouts(self._layout))
+
+    @property
+    def file_name(self):
+        return self._file_name
+
+    @property
+    def n_records(self):
+        return self._n_records
+
+    def append(self, gen_nr, score, individual, flush = True):
+        """ Appends an accepted individual to the log.
+        """
+        cur_bytes = _genes_to_bytes(individual)
+        layout = _layout(individual)
+        if layout != self._layout:
+            kind = RECORD_LAYOUT
+            data = cur_bytes
+            self._layout = layout
+        elif self._prev_bytes is None or self._n_records % self._keyframe_interval == 0:
+            kind = RECORD_KEYFRAME
+            data = cur_bytes
+        else:
+            kind = RECORD_DELTA
+            data = np.bitwise_xor(cur_bytes, self._prev_bytes)
+
+        payload = zlib.compress(data.tobytes(), self._compress_level)
+        self._file.write(_RECORD.pack(kind, gen_nr, score, len(payload)))
+        if kind == RECORD_LAYOUT:
+            self._file.write(_LAYOUT.pack(len(layout)))
+            self._file.write(_pack_chromosome_layouts(layout))
+        self._file.write(payload)
+        if flush:
+            self._file.flush()
+
+        self._prev_bytes = cur_bytes
+        self._n_records += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class GenerationLogReader(object):
+
+    def __init__(self, file_name):
+        """ Reads a log that was written by a GenerationLogWriter.
+
+            The file is scanned once to build an index of the records. A log of a run that
+            is still in progress can be read; a truncated last record is ignored.
+        """
+        self._file_name = file_name
+        with open(file_name, 'rb') as file:
+            self._data = file.read()
+
+        magic, version, width, height, n_chromosomes = _HEADER.unpack_from(self._data, 0)
+        assert magic == GENLOG_MAGIC, "Not a PyMona generation log: {!r}".format(magic)
+        assert version == GENLOG_VERSION, "Unsupported log version: {}".format(version)
+        self._img_width = width
+        self._img_height = height
+
+        layout, pos = _unpack_chromosome_layouts(self._data, _HEADER.size, n_chromosomes)
+        self._layouts = [layout]  # the (n_polygons, n_vertices, n_colors, n_z_values) tuples
+
+        self._gen_nrs = []
+        self._scores = []
+        self._index = []   # list of (kind, payload_offset, payload_length, layout_idx) tuples
+        while pos + _RECORD.size <= len(self._data):
+            kind, gen_nr, score, length = _RECORD.unpack_from(self._data, pos)
+            pos += _RECORD.size
+            if kind == RECORD_LAYOUT:
+                if pos + _LAYOUT.size > len(self._data):
+                    break
+                n_chromosomes, = _LAYOUT.unpack_from(self._data, pos)
+                if pos + _LAYOUT.size + n_chromosomes * _CHROMOSOME.size > len(self._data):
+                    break
+                layout, pos = _unpack_chromosome_layouts(self._data, pos + _LAYOUT.size,
+                                                         n_chromosomes)
+                self._layouts.append(layout)
+            if pos + length > len(self._data):
+                logger.warning("Ignoring truncated record of generation {}".format(gen_nr))
+                break
+            self._gen_nrs.append(gen_nr)
+            self._scores.append(score)
+            self._index.append((kind, pos, length, len(self._layouts) - 1))
+            pos += length
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def img_width(self):
+        return self._img_width
+
+    @property
+    def img_height(self):
+        return self._img_height
+
+    @property
+    def gen_nrs(self):
+        "List with the generation number of each record"
+        return self._gen_nrs
+
+    @property
+    def scores(self):
+        "List with the score of each record"
+        return self._scores
+
+    def _payload(self, record_idx):
+        _, offset, length, _ = self._index[record_idx]
+        return np.frombuffer(zlib.decompress(self._data[offset:offset + length]), dtype = np.uint8)
+
+    def _split_genes(self, raw_bytes, record_idx):
+        """ Splits the raw bytes of a record into a list of (poly_genes, color_genes, 
+            z_genes) tuples
+        """
+        genes = []
+        pos = 0
+        layout = self._layouts[self._index[record_idx][3]]
+        for n_polygons, n_vertices, n_colors, n_z_values in layout:
+            shapes = ((n_polygons, n_vertices, 2), (n_colors, 4), (n_z_values, ))
+            arrays = []
+            for shape, dtype in zip(shapes, _GENE_DTYPES):
+                dtype = np.dtype(dtype)
+                n_bytes = int(np.prod(shape)) * dtype.itemsize
+                arr = raw_bytes[pos:pos + n_bytes].view(dtype).reshape(shape)
+                arrays.append(arr.astype(dtype.newbyteorder('=')))
+                pos += n_bytes
+            genes.append(tuple(arrays))
+        return genes
+
+    def _record_idx(self, gen_nr):
+        " Returns the index of the last record with a generation number <= gen_nr"
+        idx = int(np.searchsorted(self._gen_nrs, gen_nr, side = 'right')) - 1
+        assert idx >= 0, "No individual recorded at or before generation {}".format(gen_nr)
+        return idx
+
+    def _raw_bytes_at(self, record_idx):
+        " Reconstructs the raw gene bytes of a record, starting at the preceding keyframe"
+        start = record_idx
+        while self._index[start][0] == RECORD_DELTA:
+            start -= 1
+        raw_bytes = self._payload(start).copy()
+        for idx in range(start + 1, record_idx + 1):
+            np.bitwise_xor(raw_bytes, self._payload(idx), out = raw_bytes)
+        return raw_bytes
+
+    def genes_at(self, gen_nr):
+        """ Returns the genes of the best individual at generation gen_nr.
+
+            Returns a list with a (poly_genes, color_genes, z_genes) tuple per chromosome.
+        """
+        record_idx = self._record_idx(gen_nr)
+        return self._split_genes(self._raw_bytes_at(record_idx), record_idx)
+
+    def individual_at(self, gen_nr):
+        """ Returns the best individual at generation gen_nr as a QtGsIndividual
+        """
+        return self._make_individual(self.genes_at(gen_nr))
+
+    def replay(self, step = 1):
+        """ Generator that yields a (gen_nr, score, genes) tuple for every step-th record.
+
+            The genes are in the format returned by genes_at().
+        """
+        raw_bytes = None
+        for idx, (kind, _, _, _) in enumerate(self._index):
+            if kind != RECORD_DELTA:
+                raw_bytes = self._payload(idx).copy()
+            else:
+                np.bitwise_xor(raw_bytes, self._payload(idx), out = raw_bytes)
+            if idx % step == 0 or idx == len(self._index) - 1:
+                yield self._gen_nrs[idx], self._scores[idx], self._split_genes(raw_bytes, idx)
+
+    def _make_individual(self, genes):
+        from chromosomes import QtGsPolyChromosome
+        from individuals import QtGsIndividual
+        chromosomes = [QtGsPolyChromosome(*chrom_genes) for chrom_genes in genes]
+        return QtGsIndividual(chromosomes, self._img_width, self._img_height)
+
+
+#############
+## Testing ##
+#############
+
+if __name__ == '__main__':
+
+    import sys
+    import os.path
+
+    def render_animation(log_file_name, output_dir, step):
+        """ Renders a PNG file for every step-th record of the log
+        """
+        reader = GenerationLogReader(log_file_name)
+        logger.info("{} records, generations {} - {}"
+                    .format(len(reader), reader.gen_nrs[0], reader.gen_nrs[-1]))
+
+        for gen_nr, score, genes in reader.replay(step = step):
+            file_name = os.path.join(output_dir, 'genlog.gen_{:05d}.score_{:08.6f}.png'
+                                     .format(gen_nr, score))
+            logger.info('Saving: {}'.format(file_name))
+            reader._make_individual(genes).render_image().save(file_name)
+
+
+    def main():
+
+        import argparse
+        from PySide import QtGui
+
+        parser = argparse.ArgumentParser(description='Renders the frames of a generation log.')
+        parser.add_argument('log_file', metavar='LOG_FILE', help='The generation log')
+        parser.add_argument('-o', '--output-dir', dest='output_dir', default = 'output',
+                            help = "Directory where the frames are written. Default: 'output'")
+        parser.add_argument('-s', '--step', dest='step', type=int, default = 1,
+                            help = "Render every step-th record. Default: 1")
+        args = parser.parse_args()
+
+        logging.basicConfig(level = 'INFO', stream = sys.stderr,
+            format='%(asctime)s: %(filename)16s:%(lineno)-4d : %(levelname)-6s: %(message)s')
+
+        logger.info('Started...')
+        app = QtGui.QApplication(sys.argv)
+        render_animation(args.log_file, args.output_dir, args.step)
+        logger.info('Done...')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,12 +10,16 @@ from __future__ import division
 import logging
 logger = logging.getLogger(__name__)
 
-from PySide import QtCore, QtGui
-from PySide.QtCore import Qt
+import heapq
+
+from lazymodule import QtCore, QtGui
 
 from libimg import render_qgraphics_scene
 from chromosomes import QtGsPolyChromosome
 
+# Color of the scene behind the polygons (r, g, b)
+BACKGROUND_RGB = (0, 255, 0)
+
 
 class Individual(object):  # Abstract base class
     pass
@@ -34,7 +38,11 @@ class QtGsIndividual(Individual):
         """
         self._img_width = int(img_width)
         self._img_height = int(img_height)
+        self._chromosomes = chromosomes
+        self._graphics_scene = None # created on first use, renderers without Qt don't need it
         
+        
+    def _create_graphics_scene(self):
         # The scene rectangle is one larger than the image size in pixels. 
         # Single pixel goes from coordinage 0.0 up to 1.0, two pixels from 0.0 to 2.0, etc.
         # Just like we need 5 poles to make a fence of 4 meters.
@@ -42,32 +50,77 @@ class QtGsIndividual(Individual):
         self._graphics_scene = QtGui.QGraphicsScene(scene_rect)
         #self._graphics_scene.setBackgroundBrush(Qt.ligthGray)
         #self._graphics_scene.setBackgroundBrush(QtGui.QColor(127, 127, 127))
-        self._graphics_scene.setBackgroundBrush(QtGui.QColor(0, 255, 0))
-        
-        self._chromosomes = chromosomes
+        self._graphics_scene.setBackgroundBrush(QtGui.QColor(*BACKGROUND_RGB))
         self._add_chromosomes_to_scene()
 
         
-    def clone(self, **kwargs):
+    def clone(self, rng, **kwargs):
         """ Clones a chromosome and adds normal distributed noise.
         
-            The **kwargs are passed on to the chromosome.clone() method.
+            The rng (numpy.random.Generator) and **kwargs are passed on to the 
+            chromosome.clone() method.
+        """
+        new_chromosomes = [chrom.clone(rng, **kwargs) for chrom in self._chromosomes]
+        return QtGsIndividual(new_chromosomes, self._img_width, self._img_height)
+        
+        
+    def crossover(self, other, rng, method = 'uniform', **kwargs):
+        """ Creates a child that combines the chromosomes of self (parent A) and other.
+        
+            The chromosomes are paired by position and must be of the same type (polygon 
+            or shape chromosomes). The method can be 'uniform', 'z_order' or 'region' 
+            (see the crossover module); the **kwargs are passed on to it.
         """
-        new_chromosomes = [chrom.clone(**kwargs) for chrom in self._chromosomes]
+        from crossover import CROSSOVER_OPERATORS
+        assert len(self._chromosomes) == len(other.chromosomes), \
+            "parents must have the same number of chromosomes"
+        operator = CROSSOVER_OPERATORS[method]
+        new_chromosomes = [operator(chrom_a, chrom_b, rng, **kwargs) for chrom_a, chrom_b 
+                           in zip(self._chromosomes, other.chromosomes)]
         return QtGsIndividual(new_chromosomes, self._img_width, self._img_height)
         
 
-    def render_image(self):
-        return render_qgraphics_scene(self.graphics_scene, self._img_width, self._img_height)
+    def render_image(self, antialiasing = False):
+        return render_qgraphics_scene(self.graphics_scene, self._img_width, self._img_height,
+                                      antialiasing = antialiasing)
+        
+    @property
+    def chromosomes(self):
+        return self._chromosomes
+        
+    @property
+    def img_width(self):
+        return self._img_width
+        
+    @property
+    def img_height(self):
+        return self._img_height
+        
+    def render_array(self, **kwargs):
+        """ Renders the individual with NumPy (front-to-back, see rasterizer.py).
+        
+            The **kwargs are passed on to rasterizer.render_front_to_back().
+            Returns a (height, width, 4) uint8 array in Qt depth order.
+        """
+        from rasterizer import render_front_to_back
+        return render_front_to_back(self, **kwargs)
         
     @property
     def graphics_scene(self):
+        if self._graphics_scene is None:
+            self._create_graphics_scene()
         return self._graphics_scene
         
     def _add_chromosomes_to_scene(self):
-        for chromosome in self._chromosomes:
-            for qitem in chromosome.get_graphic_items():
-                self._graphics_scene.addItem(qitem)
+        # Polygons that are hidden within the scene rectangle are not added.
+        # The items all have the default z-value and are added in painting order, which the
+        # scene keeps for equal z-values, so it doesn't sort them by depth on every render.
+        # The merge is stable: equal z-values are painted in the order of the chromosomes.
+        canvas_rect = (0, 0, self._img_width + 1, self._img_height + 1)
+        per_chromosome = [chromosome.z_ordered_graphic_items(canvas_rect = canvas_rect)
+                          for chromosome in self._chromosomes]
+        for _, qitem in heapq.merge(*per_chromosome, key = lambda item: item[0]):
+            self._graphics_scene.addItem(qitem)
             
             
 
@@ -79,9 +132,11 @@ class QtGsIndividual(Individual):
 if __name__ == '__main__':
 
     import sys
+    from rngstreams import create_rng
 
     def test():
     
+        rng = create_rng(1)
         img_width = 400
         img_height = 300
         
@@ -104,15 +159,15 @@ if __name__ == '__main__':
             n_poly = 200
             alpha = 15
             chromos = []
-            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, color = (255, 0, 0, alpha)) )
-            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, color = (0, 255, 0, alpha)) )
-            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, color = (0, 0, 255, alpha)) )
+            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, rng, color = (255, 0, 0, alpha)) )
+            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, rng, color = (0, 255, 0, alpha)) )
+            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, rng, color = (0, 0, 255, alpha)) )
         if alt == 1:
             n_poly = 2
             alpha = 255
-            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, color = (0, 0, 0, alpha)) )
+            chromos.append( QtGsPolyChromosome.create_random(n_poly, 3, rect, rng, color = (0, 0, 0, alpha)) )
         elif alt == 2:
-            chromos.append( QtGsPolyChromosome.create_random(4, 150, rect) )
+            chromos.append( QtGsPolyChromosome.create_random(4, 150, rect, rng) )
         else:
             assert False, "invalid alternative"
         
@@ -0,0 +1,616 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Local job server that runs evolution jobs in a pool of worker processes.
+
+    Clients connect to a Unix socket (or a TCP port on localhost) and send requests as
+    JSON objects, one per line. Every request gets one reply line, except 'subscribe',
+    which streams the events of a job until it has finished. The requests are:
+
+        {"cmd": "submit", "target": "images/mona.png", "n_generations": 10000,
+         "priority": 0, "params": {"engine_type": "hill", "renderer": "numpy", ...},
+         "output_dir": "output/job", "profile": {"n_generations": 500,
+         "first_generation": 100}}                        -> {"job_id": 1}
+        {"cmd": "status"} or {"cmd": "status", "job_id": 1} -> {"jobs": [...]}
+        {"cmd": "cancel", "job_id": 1}                    -> {"job_id": 1, "state": ...}
+        {"cmd": "subscribe", "job_id": 1}                 -> status, then events
+
+    Jobs with a higher priority are started first, equal priorities in order of
+    submission. The events are {"event": "progress", "job_id", "gen_nr", "score",
+    "gens_per_sec"} and finally one of "done", "cancelled" or "failed". Errors are
+    replied as {"error": message}.
+
+    A job with a "profile" is profiled with a sampling profiler during that window of
+    generations, see sampleprof.GenerationProfiler. The profile is written to the output
+    directory (default: the working directory of the server) as job<job_id>.profile.<pid>.*
+
+    The worker processes are started once and create their QApplication once, so they
+    stay warm between jobs.
+
+    If the server has a seed, a job without an "rng" parameter gets the random stream
+    with its job_id from rngstreams.spawn_rngs(seed, ...), so a job's run only depends on
+    the seed and its job_id, not on the worker that runs it. Without a seed, such jobs
+    use fresh entropy.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import asyncio
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+FINAL_STATES = (DONE, CANCELLED, FAILED)
+
+DEFAULT_SOCKET = 'pymona.sock'
+
+
+def _run_job(conn, job, progress_interval):
+    """ Runs a job in a worker process, sending its events over conn.
+
+        Between generations the connection is polled for a cancel message.
+    """
+    from lazymodule import QtGui
+    from engines import create_engine
+    from exporters import save_svg, save_blob
+    from sampleprof import GenerationProfiler
+    from rngstreams import spawn_rngs
+
+    job_id = job['job_id']
+    output_dir = job.get('output_dir')
+    if not os.path.exists(job['target']):
+        raise IOError("file not found: {}".format(job['target']))
+    target_image = QtGui.QImage(job['target']).convertToFormat(QtGui.QImage.Format.Format_RGB32)
+    params = dict(job['params'])
+    if 'rng' not in params and job.get('seed') is not None:
+        params['rng'] = spawn_rngs(job['seed'], job_id)[job_id - 1]  # job ids start at 1
+    engine = create_engine(target_image, **params)
+
+    profile = job.get('profile')
+    if profile is None:
+        profiler = None
+    else:
+        profiler = GenerationProfiler(
+            profile['n_generations'], first_generation = profile.get('first_generation', 0),
+            file_prefix = os.path.join(output_dir or '.', 'job{}.profile'.format(job_id)))
+    try:
+        last_time = time.time()
+        last_gen_nr = 0
+        for _ in range(job['n_generations']):
+            engine.next_generation()
+            if profiler is not None:
+                profiler.update(engine.gen_nr)
+
+            if conn.poll():
+                msg = conn.recv()
+                if msg['cmd'] in ('cancel', 'stop'):
+                    conn.send({'event': CANCELLED, 'job_id': job_id, 'gen_nr': engine.gen_nr,
+                               'score': engine.score})
+                    return msg['cmd'] == 'stop'
+
+            now = time.time()
+            if now - last_time >= progress_interval:
+                conn.send({'event': 'progress', 'job_id': job_id, 'gen_nr': engine.gen_nr,
+                           'score': engine.score,
+                           'gens_per_sec': (engine.gen_nr - last_gen_nr) / (now - last_time)})
+                last_time, last_gen_nr = now, engine.gen_nr
+    finally:
+        engine.close()
+        if profiler is not None:
+            profiler.finish()
+
+    if output_dir:
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        save_svg(os.path.join(output_dir, 'individual.svg'), engine.individual)
+        if not job['params'].get('shapes'):  # the binary format only has polygons
+            save_blob(os.path.join(output_dir, 'individual.bin'), engine.individual)
+    conn.send({'event': DONE, 'job_id': job_id, 'gen_nr': engine.gen_nr, 'score': engine.score,
+               'n_evaluations': engine.n_evaluations})
+    return False
+
+
+def _worker_main(conn, progress_interval):
+    """ Main function of a worker process. Runs jobs until it receives a stop message.
+    """
+    from lazymodule import QtGui
+    app = QtGui.QApplication.instance() or QtGui.QApplication([])
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break  # the server has gone
+        if msg['cmd'] == 'stop':
+            break
+        elif msg['cmd'] == 'run':
+            try:
+                if _run_job(conn, msg['job'], progress_interval):
+                    break
+            except Exception as ex:
+                logger.exception("Job {} failed".format(msg['job']['job_id']))
+                conn.send({'event': FAILED, 'job_id': msg['job']['job_id'], 'error': repr(ex)})
+        # A cancel message for a job that has finished already is ignored.
+    conn.close()
+
+
+class Job(object):
+
+    def __init__(self, job_id, target, params, n_generations, priority, output_dir,
+                 profile = None, seed = None):
+        """ A job of the server, with its latest state and progress.
+
+            seed is the seed of the server from which the random stream of the job is
+            derived if params has no 'rng'.
+        """
+        self.job_id = job_id
+        self.target = target
+        self.params = params
+        self.n_generations = n_generations
+        self.priority = priority
+        self.output_dir = output_dir
+        self.profile = profile
+        self.seed = seed
+        self.state = QUEUED
+        self.gen_nr = 0
+        self.score = None
+        self.gens_per_sec = None
+        self.error = None
+        self.subscribers = []  # asyncio.Queue per subscribed client
+
+    def to_message(self):
+        "Returns the job definition that is sent to a worker"
+        return {'job_id': self.job_id, 'target': self.target, 'params': self.params,
+                'n_generations': self.n_generations, 'output_dir': self.output_dir,
+                'profile': self.profile, 'seed': self.seed}
+
+    def status(self):
+        "Returns the state and progress of the job as a dictionary"
+        return {'job_id': self.job_id, 'target': self.target, 'priority': self.priority,
+                'state': self.state, 'gen_nr': self.gen_nr,
+                'n_generations': self.n_generations, 'score': self.score,
+                'gens_per_sec': self.gens_per_sec, 'error': self.error}
+
+
+class _Worker(object):
+
+    def __init__(self, context, progress_interval):
+        "A worker process and the server end of its pipe"
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target = _worker_main,
+                                       args = (child_conn, progress_interval))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.job = None
+
+
+class JobServer(object):
+
+    def __init__(self, n_workers = 2, progress_interval = 1.0, seed = None):
+        """ Schedules jobs on n_workers worker processes.
+
+            The workers send a progress event at most every progress_interval seconds.
+            If seed (an int) is given, the random streams of the jobs are derived from it.
+            Use start() to start the workers and listen for clients.
+        """
+        assert n_workers > 0, "n_workers must be > 0"
+        self._n_workers = n_workers
+        self._progress_interval = progress_interval
+        self._seed = seed
+        self._context = multiprocessing.get_context('spawn')  # don't fork the event loop
+        self._workers = []
+        self._jobs = {}
+        self._queue = []       # heap of (-priority, job_id)
+        self._job_ids = itertools.count(1)
+        self._server = None
+        self._loop = None
+
+    @property
+    def jobs(self):
+        "Dictionary with all jobs by job_id"
+        return self._jobs
+
+    async def start(self, socket_path = None, port = None):
+        """ Starts the workers and listens on a Unix socket or, if port is given, on a TCP
+            port of localhost.
+        """
+        self._loop = asyncio.get_event_loop()
+        for _ in range(self._n_workers):
+            self._add_worker()
+
+        if port is not None:
+            self._server = await asyncio.start_server(self._handle_client, '127.0.0.1', port)
+            logger.info("Job server listening on 127.0.0.1:{}".format(port))
+        else:
+            socket_path = DEFAULT_SOCKET if socket_path is None else socket_path
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            self._server = await asyncio.start_unix_server(self._handle_client, socket_path)
+            logger.info("Job server listening on {}".format(socket_path))
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        """ Stops listening and stops the workers. Running jobs are cancelled.
+        """
+        if self._server is not None:
+            self._server.close()
+        for worker in self._workers:
+            self._loop.remove_reader(worker.conn.fileno())
+            try:
+                worker.conn.send({'cmd': 'stop'})
+            except (OSError, EOFError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout = 5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._workers = []
+
+    def _add_worker(self):
+        worker = _Worker(self._context, self._progress_interval)
+        self._workers.append(worker)
+        self._loop.add_reader(worker.conn.fileno(), self._on_worker_readable, worker)
+        return worker
+
+    #
+    # Scheduling
+    #
+
+    def submit(self, target, params = None, n_generations = 1000, priority = 0,
+               output_dir = None, profile = None):
+        """ Queues a new job and returns it.
+        
+            profile may be a dictionary with the n_generations and (optionally) the 
+            first_generation that are profiled. Raises a ValueError for invalid arguments.
+        """
+        from engines import ENGINE_TYPES
+        if int(n_generations) <= 0:
+            raise ValueError("n_generations must be > 0")
+        if profile is not None and 'n_generations' not in profile:
+            raise ValueError("profile needs n_generations")
+        engine_type = (params or {}).get('engine_type', 'hill')
+        if engine_type not in ENGINE_TYPES:
+            raise ValueError("Unknown engine type: {!r}".format(engine_type))
+        job = Job(next(self._job_ids), target, dict(params or {}), int(n_generations),
+                  int(priority), output_dir, profile = profile, seed = self._seed)
+        self._jobs[job.job_id] = job
+        heapq.heappush(self._queue, (-job.priority, job.job_id))
+        logger.info("Job {} submitted: {} (priority {})".format(job.job_id, target, priority))
+        self._dispatch()
+        return job
+
+    def cancel(self, job_id):
+        """ Cancels a queued or running job. Returns the job.
+
+            A queued job is cancelled at once, a running job when its worker has handled
+            the cancel message.
+        """
+        job = self._get_job(job_id)
+        if job.state == QUEUED:
+            self._finish(job, {'event': CANCELLED, 'job_id': job.job_id})
+        elif job.state == RUNNING:
+            for worker in self._workers:
+                if worker.job is job:
+                    worker.conn.send({'cmd': 'cancel'})
+        return job
+
+    def subscribe(self, job_id):
+        """ Returns an asyncio.Queue that receives the events of the job.
+
+            The queue receives nothing if the job has finished already.
+        """
+        job = self._get_job(job_id)
+        queue = asyncio.Queue()
+        if job.state not in FINAL_STATES:
+            job.subscribers.append(queue)
+        return queue
+
+    def _get_job(self, job_id):
+        if job_id not in self._jobs:
+            raise ValueError("Unknown job: {!r}".format(job_id))
+        return self._jobs[job_id]
+
+    def _dispatch(self):
+        "Starts queued jobs on idle workers, highest priority first"
+        for worker in self._workers:
+            if worker.job is not None:
+                continue
+            job = None
+            while self._queue and job is None:
+                _, job_id = heapq.heappop(self._queue)
+                if self._jobs[job_id].state == QUEUED:  # skip cancelled jobs
+                    job = self._jobs[job_id]
+            if job is None:
+                return
+            job.state = RUNNING
+            worker.job = job
+            worker.conn.send({'cmd': 'run', 'job': job.to_message()})
+            logger.info("Job {} started".format(job.job_id))
+
+    def _on_worker_readable(self, worker):
+        try:
+            while worker.conn.poll():
+                self._on_event(worker, worker.conn.recv())
+        except (EOFError, OSError):
+            self._on_worker_died(worker)
+
+    def _on_event(self, worker, event):
+        job = worker.job
+        if job is None or event.get('job_id') != job.job_id:
+            return
+        job.gen_nr = event.get('gen_nr', job.gen_nr)
+        job.score = event.get('score', job.score)
+        job.gens_per_sec = event.get('gens_per_sec', job.gens_per_sec)
+        if event['event'] in FINAL_STATES:
+            worker.job = None
+            self._finish(job, event)
+            self._dispatch()
+        else:
+            self._publish(job, event)
+
+    def _on_worker_died(self, worker):
+        """ A worker that dies during a job (e.g. a crash in Qt) is replaced. A worker that 
+            dies while idle (e.g. because Qt can't be imported) isn't, to prevent a restart loop.
+        """
+        logger.warning("Worker process {} died".format(worker.process.pid))
+        self._loop.remove_reader(worker.conn.fileno())
+        self._workers.remove(worker)
+        if worker.job is not None:
+            self._finish(worker.job, {'event': FAILED, 'job_id': worker.job.job_id,
+                                      'error': 'worker process died'})
+            self._add_worker()
+        elif not self._workers:
+            logger.error("No worker processes left")
+            for job in self._jobs.values():
+                if job.state == QUEUED:
+                    self._finish(job, {'event': FAILED, 'job_id': job.job_id,
+                                       'error': 'no worker processes'})
+        self._dispatch()
+
+    def _finish(self, job, event):
+        job.state = event['event']
+        job.error = event.get('error')
+        logger.info("Job {} {}".format(job.job_id, job.state))
+        self._publish(job, event)
+        job.subscribers = []
+
+    def _publish(self, job, event):
+        for queue in job.subscribers:
+            queue.put_nowait(event)
+
+    #
+    # Client connections
+    #
+
+    def handle_request(self, request):
+        """ Handles a request other than subscribe. Returns the reply.
+        """
+        cmd = request.get('cmd')
+        if cmd == 'submit':
+            job = self.submit(request['target'], params = request.get('params'),
+                              n_generations = request.get('n_generations', 1000),
+                              priority = request.get('priority', 0),
+                              output_dir = request.get('output_dir'),
+                              profile = request.get('profile'))
+            return {'job_id': job.job_id}
+        elif cmd == 'status':
+            if 'job_id' in request:
+                return {'jobs': [self._get_job(request['job_id']).status()]}
+            return {'jobs': [job.status() for job in self._jobs.values()]}
+        elif cmd == 'cancel':
+            job = self.cancel(request['job_id'])
+            return {'job_id': job.job_id, 'state': job.state}
+        else:
+            raise ValueError("Unknown command: {!r}".format(cmd))
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                    if request.get('cmd') == 'subscribe':
+                        await self._stream_events(request['job_id'], writer)
+                        continue
+                    reply = self.handle_request(request)
+                except (KeyError, TypeError, ValueError) as ex:
+                    reply = {'error': str(ex)}
+                await _write_message(writer, reply)
+        except ConnectionError:
+            pass  # the client has gone
+        finally:
+            writer.close()
+
+    async def _stream_events(self, job_id, writer):
+        job = self._get_job(job_id)
+        queue = self.subscribe(job_id)
+        await _write_message(writer, {'event': 'status', 'job': job.status()})
+        while job.state not in FINAL_STATES or not queue.empty():
+            event = await queue.get()
+            await _write_message(writer, event)
+
+
+async def _write_message(writer, message):
+    writer.write(json.dumps(message).encode('utf-8') + b'\n')
+    await writer.drain()
+
+
+async def _open_connection(socket_path = None, port = None):
+    if port is not None:
+        return await asyncio.open_connection('127.0.0.1', port)
+    return await asyncio.open_unix_connection(DEFAULT_SOCKET if socket_path is None
+                                              else socket_path)
+
+
+async def send_request(request, socket_path = None, port = None):
+    """ Sends a request to a job server and returns the reply
+    """
+    reader, writer = await _open_connection(socket_path, port)
+    try:
+        await _write_message(writer, request)
+        return json.loads((await reader.readline()).decode('utf-8'))
+    finally:
+        writer.close()
+
+
+async def watch_job(job_id, callback, socket_path = None, port = None):
+    """ Subscribes to a job and calls callback(event) for each event until the job has
+        finished. Returns the final event.
+    """
+    reader, writer = await _open_connection(socket_path, port)
+    try:
+        await _write_message(writer, {'cmd': 'subscribe', 'job_id': job_id})
+        while True:
+            line = await reader.readline()
+            if not line:
+                return None
+            event = json.loads(line.decode('utf-8'))
+            callback(event)
+            if event.get('event') in FINAL_STATES or 'error' in event:
+                return event
+            if event.get('event') == 'status' and event['job']['state'] in FINAL_STATES:
+                return event
+    finally:
+        writer.close()
+
+
+#############
+## Testing ##
+#############
+
+if __name__ == '__main__':
+
+    def print_event(event):
+        print(json.dumps(event))
+
+    def main():
+
+        import argparse
+
+        parser = argparse.ArgumentParser(description='Local PyMona job server and client.')
+        parser.add_argument('-l', '--log-level', dest='log_level', default = 'info',
+            help    = "Log level. Default: 'info'",
+            choices = ('debug', 'info', 'warn', 'error', 'critical'))
+        parser.add_argument('--socket', dest='socket_path', default = None,
+            help    = "Unix socket of the server. Default: '{}'".format(DEFAULT_SOCKET))
+        parser.add_argument('--port', dest='port', type=int, default = None,
+            help    = "Use this TCP port on localhost instead of a Unix socket.")
+        subparsers = parser.add_subparsers(dest = 'command')
+
+        serve_parser = subparsers.add_parser('serve', help = 'Run the job server')
+        serve_parser.add_argument('-n', '--workers', dest='n_workers', type=int, default = 2,
+            help    = "Number of worker processes. Default: 2")
+        serve_parser.add_argument('--progress-interval', dest='progress_interval',
+            type=float, default = 1.0,
+            help    = "Seconds between progress events. Default: 1.0")
+        serve_parser.add_argument('--seed', dest='seed', type=int, default = None,
+            help    = "Seed from which the random stream of each job is derived by its job "
+                      "id, unless the job has an rng parameter. Default: fresh entropy")
+
+        submit_parser = subparsers.add_parser('submit', help = 'Submit a job')
+        submit_parser.add_argument('target', metavar='TARGET_IMAGE')
+        submit_parser.add_argument('-g', '--generations', dest='n_generations', type=int,
+            default = 1000, help = "Number of generations. Default: 1000")
+        submit_parser.add_argument('-p', '--priority', dest='priority', type=int, default = 0,
+            help    = "Jobs with a higher priority are started first. Default: 0")
+        submit_parser.add_argument('-o', '--output-dir', dest='output_dir', default = None,
+            help    = "Save the final individual (SVG and blob) in this directory.")
+        submit_parser.add_argument('--param', dest='params', action='append', default = [],
+            metavar = 'NAME=JSON_VALUE',
+            help    = "Engine parameter, e.g. --param renderer='\"numpy\"' or --param rng=3")
+        submit_parser.add_argument('--profile', dest='profile_generations', type=int,
+            default = None, metavar = 'N_GENERATIONS',
+            help    = "Profile this many generations in the worker. Default: no profiling")
+        submit_parser.add_argument('--profile-start', dest='profile_start', type=int,
+            default = 0, help = "Generation at which profiling starts. Default: 0")
+        submit_parser.add_argument('-w', '--watch', dest='watch', action='store_true',
+            help    = "Print the progress events until the job has finished.")
+
+        for name, help_text in (('watch', 'Print the events of a job'),
+                                ('cancel', 'Cancel a job')):
+            sub_parser = subparsers.add_parser(name, help = help_text)
+            sub_parser.add_argument('job_id', type=int)
+
+        status_parser = subparsers.add_parser('status', help = 'Print the status of jobs')
+        status_parser.add_argument('job_id', type=int, nargs='?', default = None)
+
+        args = parser.parse_args()
+        logging.basicConfig(level = args.log_level.upper(), stream = sys.stderr,
+            format='%(asctime)s: %(filename)16s:%(lineno)-4d : %(levelname)-6s: %(message)s')
+        address = dict(socket_path = args.socket_path, port = args.port)
+
+        if args.command == 'serve':
+            server = JobServer(n_workers = args.n_workers,
+                               progress_interval = args.progress_interval,
+                               seed = args.seed)
+
+            async def serve():
+                await server.start(**address)
+                try:
+                    await server.serve_forever()
+                finally:
+                    server.close()
+            try:
+                asyncio.run(serve())
+            except KeyboardInterrupt:
+                pass
+
+        elif args.command == 'submit':
+            params = {}
+            for param in args.params:
+                name, _, value = param.partition('=')
+                params[name] = json.loads(value)
+            if args.profile_generations is None:
+                profile = None
+            else:
+                profile = {'n_generations': args.profile_generations,
+                           'first_generation': args.profile_start}
+            reply = asyncio.run(send_request(
+                {'cmd': 'submit', 'target': os.path.abspath(args.target), 'params': params,
+                 'n_generations': args.n_generations, 'priority': args.priority,
+                 'output_dir': args.output_dir and os.path.abspath(args.output_dir),
+                 'profile': profile},
+                **address))
+            print_event(reply)
+            if args.watch and 'job_id' in reply:
+                asyncio.run(watch_job(reply['job_id'], print_event, **address))
+
+        elif args.command == 'watch':
+            asyncio.run(watch_job(args.job_id, print_event, **address))
+
+        elif args.command == 'cancel':
+            print_event(asyncio.run(send_request({'cmd': 'cancel', 'job_id': args.job_id},
+                                                 **address)))
+
+        elif args.command == 'status':
+            request = {'cmd': 'status'}
+            if args.job_id is not None:
+                request['job_id'] = args.job_id
+            for status in asyncio.run(send_request(request, **address)).get('jobs', []):
+                print_event(status)
+
+        else:
+            parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
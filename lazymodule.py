@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Deferred importing of heavy modules.
+
+    The numeric core of PyMona (chromosomes, individuals, engines, libimg) only uses Qt
+    inside functions. By referring to Qt through a LazyModule the import of PySide is
+    postponed until the first attribute is accessed, so that short-lived workers that
+    never render don't pay for it.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import importlib
+import logging
+logger = logging.getLogger(__name__)
+
+
+class LazyModule(object):
+
+    def __init__(self, module_name):
+        """ Proxy of a module that is imported on first attribute access
+        """
+        self._lazy_module_name = module_name
+        self._lazy_module = None
+
+    def __getattr__(self, attr_name):
+        # Only called for attributes that aren't found the normal way.
+        if self._lazy_module is None:
+            logger.debug("Importing {}".format(self._lazy_module_name))
+            self._lazy_module = importlib.import_module(self._lazy_module_name)
+        return getattr(self._lazy_module, attr_name)
+
+    def __repr__(self):
+        status = 'not loaded' if self._lazy_module is None else 'loaded'
+        return "<LazyModule {!r} ({})>".format(self._lazy_module_name, status)
+
+
+QtCore = LazyModule('PySide.QtCore')
+QtGui = LazyModule('PySide.QtGui')
+
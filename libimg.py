@@ -4,18 +4,15 @@
 """ Functions that work on images.
 
     The matplotlib functionality is purely for debugging puproses.
-
+    Qt and matplotlib are imported on first use.
 """
 from __future__ import print_function
 from __future__ import division
 
-from PySide import QtCore, QtGui
-
 import copy, logging
 import numpy as np
-import matplotlib.image as mpimg
 
-from bufimage import BufRefImage
+from lazymodule import QtCore, QtGui
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +42,9 @@ MPL_DEPTH_G = 1
 MPL_DEPTH_B = 2
 MPL_DEPTH_A = 3
 
+# Index array that permutes the depth dimension from Qt order to MatPlotLib order
+QT_TO_MPL_PERM = np.array([QT_DEPTH_R, QT_DEPTH_G, QT_DEPTH_B, QT_DEPTH_A], dtype=np.intp)
+
 def share_data(arr1, arr2):
     """ Returns True if arr1 and arr2 share a data buffer"""
     return addr(arr1) == addr(arr2)
@@ -120,6 +120,8 @@ def array_to_qt_image(arr, share_memory=True, format = None):
     
         If format is not set it will default to QtGui.QImage.Format.Format_RGB32
     """
+    from bufimage import BufRefImage # subclasses QImage, so it imports Qt
+    
     assert type(arr) == np.ndarray, "arr must be a numpy array"
     if format == None:
         format = QtGui.QImage.Format.Format_RGB32
@@ -142,30 +144,45 @@ def array_to_qt_image(arr, share_memory=True, format = None):
 
 
 
-def qt_arr_to_mpl_arr(arr_qt):
-    """ Converts array originating from a QT image to an image to use in matplotlib.imsave()
+def qt_arr_rgb_view(arr_qt):
+    """ Returns a view with the depth dimension of a (h,w,d=4) Qt array in RGB order.
     
-        Permutates the depth dimension of a (w,h,d=4) array from ARGB/BGRA to RGBA
+        No data is copied; the view has a negative stride in the depth dimension.
+        The alpha channel is not included.
     """
+    assert arr_qt.ndim == 3, "arr_qt should be 3 dimensional"
+    if QT_LITTLE_ENDIAN_MODE:
+        return arr_qt[:, :, QT_DEPTH_R::-1]  # BGRA -> RGB
+    else:
+        return arr_qt[:, :, QT_SLICE_RGB]    # ARGB -> RGB
+        
+
+def qt_arr_to_mpl_arr(arr_qt, out = None):
+    """ Converts array originating from a QT image to an image to use in matplotlib.imsave()
     
-    """ Saves a (width x height x depth) array to file
+        Permutates the depth dimension of a (h,w,d=4) array from ARGB/BGRA to RGBA in a
+        single pass. If out is given the result is written into that (h,w,4) uint8 array 
+        instead of allocating a new one. The out array may not overlap with arr_qt.
     """
     assert arr_qt.ndim == 3, "arr_qt should be 3 dimensional"
     assert arr_qt.shape[2] == 4, "arr_qt shape should be (width, height, 4)"
     assert arr_qt.dtype == np.uint8, "arr_qt should be of type np.uint8"
-    arr_mpl = np.ndarray(shape = arr_qt.shape, dtype = np.uint8)
-    
-    arr_mpl[:,:,MPL_DEPTH_R] = arr_qt[:,:,QT_DEPTH_R]
-    arr_mpl[:,:,MPL_DEPTH_G] = arr_qt[:,:,QT_DEPTH_G]
-    arr_mpl[:,:,MPL_DEPTH_B] = arr_qt[:,:,QT_DEPTH_B]
-    arr_mpl[:,:,MPL_DEPTH_A] = arr_qt[:,:,QT_DEPTH_A]
-    
-    return arr_mpl
+    if out is not None:
+        assert out.shape == arr_qt.shape, "out shape should be {}".format(arr_qt.shape)
+        assert out.dtype == np.uint8, "out should be of type np.uint8"
+        assert not np.may_share_memory(out, arr_qt), "out and arr_qt may not overlap"
+
+    # mode='clip' prevents numpy from buffering the output (the indices are always valid)
+    return np.take(arr_qt, QT_TO_MPL_PERM, axis = 2, out = out, mode = 'clip')
     
 
 def save_qt_img_array_fo_file(file_name, arr_qt):
     """ Saves (w,h,d=4) array (with depth in Qt order) to a file
+    
+        Matplotlib is only imported when this function is called because it is only used 
+        for debugging and is slow to import.
     """
+    import matplotlib.image as mpimg
     arr_mpl = qt_arr_to_mpl_arr(arr_qt)
     mpimg.imsave(file_name, arr_mpl, vmin=0, vmax=255)        
     
@@ -222,19 +239,45 @@ def max_score_rgb(arr):
     return arr[:,:,QT_SLICE_RGB].size * 255
     
     
-def render_qgraphics_scene(qgraphics_scene, width, height, format = None):
+def render_qgraphics_scene(qgraphics_scene, width, height, format = None, antialiasing = False):
     """ Renders a graphics scene to an qimage of width by height
+    
+        If antialiasing is True, the edges of the items are anti-aliased.
     """
     if format is None:
         format = QtGui.QImage.Format.Format_RGB32  # ARGB32 is slow!
         
     image = QtGui.QImage(width, height, format)        
     painter = QtGui.QPainter(image)
+    painter.setRenderHint(QtGui.QPainter.Antialiasing, antialiasing)
     qgraphics_scene.render(painter, aspectRatioMode = QtCore.Qt.IgnoreAspectRatio)
     painter.end() # make sure the painter is inactive before it is destroyed
     return image
     
     
+def render_qgraphics_scene_band(qgraphics_scene, image, y_offset, n_rows, width, height,
+                                antialiasing = False):
+    """ Renders a horizontal band of a graphics scene into an existing image.
+    
+        The band consists of the rows y_offset up to y_offset + n_rows of the image that 
+        render_qgraphics_scene(qgraphics_scene, width, height) would produce. It is drawn in 
+        the top n_rows of image, which must be width pixels wide and at least n_rows high.
+        If antialiasing is True, the edges of the items are anti-aliased.
+    """
+    assert image.width() == width, "image width should be {}".format(width)
+    assert image.height() >= n_rows, "image height should be >= {}".format(n_rows)
+    scene_rect = qgraphics_scene.sceneRect()
+    scale_y = scene_rect.height() / height
+    source = QtCore.QRectF(scene_rect.x(), scene_rect.y() + y_offset * scale_y, 
+                           scene_rect.width(), n_rows * scale_y)
+    target = QtCore.QRectF(0, 0, width, n_rows)
+    
+    painter = QtGui.QPainter(image)
+    painter.setRenderHint(QtGui.QPainter.Antialiasing, antialiasing)
+    qgraphics_scene.render(painter, target, source, aspectRatioMode = QtCore.Qt.IgnoreAspectRatio)
+    painter.end() # make sure the painter is inactive before it is destroyed
+    
+    
 def get_image_rectangle(image, margin_relative = 0.0):
     """ Gets the image rectangle as a (x, y, width, height) tuple.
         
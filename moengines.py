@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Multi-objective engine that trades image error against polygon and vertex count.
+
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from chromosomes import QtGsPolyChromosome
+from individuals import QtGsIndividual
+from engines import Engine
+from libimg import get_image_rectangle
+from pareto import (ParetoArchive, individual_objectives, select_by_rank, tournament_select,
+                    OBJ_ERROR)
+
+
+class ParetoEngine(Engine):
+
+    def __init__(self, target_image, population_size = 20, n_offspring = None,
+                 p_remove = 0.1, p_add = 0.1, min_polygons = 1, archive_size = 200,
+                 **kwargs):
+        """ Engine with the objectives (image error, polygon count, vertex count).
+
+            A population of population_size individuals is evolved with the NSGA-II
+            selection scheme: parents are chosen by binary tournaments on non-dominated
+            rank and crowding distance, and the next population is selected from the
+            parents and the offspring by non-dominated sorting. Besides the usual noise,
+            an offspring loses a random polygon with probability p_remove (keeping at
+            least min_polygons per chromosome) and gets a new random polygon with
+            probability p_add.
+
+            All non-dominated individuals that are found are kept in a ParetoArchive, see
+            the archive property and knee_individual(). The individual and score properties
+            are those of the individual with the lowest error.
+
+            One generation evaluates n_offspring candidates (default: population_size).
+            Every candidate is scored exactly, so sample_fraction saves no work here.
+            The **kwargs are passed on to the Engine constructor.
+        """
+        assert not kwargs.get('shapes'), "ParetoEngine only supports polygon chromosomes"
+        super(ParetoEngine, self).__init__(target_image, **kwargs)
+        self._population_size = population_size
+        self._n_offspring = population_size if n_offspring is None else n_offspring
+        self._p_remove = p_remove
+        self._p_add = p_add
+        self._min_polygons = min_polygons
+        self._new_polygon_rect = get_image_rectangle(self._target_image, margin_relative = 0.25)
+
+        self._archive = ParetoArchive(max_size = archive_size)
+        objectives = individual_objectives(self._individual, self._indiv_score)
+        self._population = [self._individual]
+        self._population_objectives = objectives[np.newaxis, :]
+        self._archive.add(self._individual, objectives)
+
+    @property
+    def population_size(self):
+        return self._population_size
+
+    @property
+    def archive(self):
+        "ParetoArchive with the non-dominated individuals found so far"
+        return self._archive
+
+    def knee_individual(self):
+        """ Returns the (individual, objectives) at the knee point of the Pareto archive
+        """
+        return self._archive.knee_individual()
+
+    def _mutate(self, parent):
+        """ Returns a mutated clone of parent that may have lost or gained polygons
+        """
+        child = parent.clone(self._rng, **self._clone_kwargs)
+        chromosomes = list(child.chromosomes)
+        for idx, chrom in enumerate(chromosomes):
+            if chrom.n_polygons > self._min_polygons and self._rng.random() < self._p_remove:
+                chrom = chrom.remove_polygons([self._rng.integers(0, chrom.n_polygons)])
+            if self._rng.random() < self._p_add:
+                new_poly = QtGsPolyChromosome.create_random(
+                    1, chrom.n_vertices, self._new_polygon_rect, self._rng,
+                    max_alpha = self._max_alpha)
+                chrom = chrom.add_polygons(new_poly.poly_genes, new_poly.color_genes,
+                                           new_poly.z_genes)
+            chromosomes[idx] = chrom
+        return QtGsIndividual(chromosomes, child.img_width, child.img_height)
+
+    def next_generation(self):
+
+        if (self._sampler is not None and self._resample_every > 0 and
+                self._gen_nr % self._resample_every == 0):
+            self._sampler.resample()
+
+        self._score_changed = False
+        parents = tournament_select(self._population_objectives, self._rng, self._n_offspring)
+        offspring = []
+        offspring_objectives = []
+        for parent_idx in parents:
+            candidate = self._mutate(self._population[parent_idx])
+            # An infinite previous score makes the score exact (see _score_candidate).
+            score, fitness_image = self._score_candidate(candidate, np.inf)
+            self._n_evaluations += 1
+            objectives = individual_objectives(candidate, score)
+            offspring.append(candidate)
+            offspring_objectives.append(objectives)
+            self._archive.add(candidate, objectives)
+            if score < self._indiv_score:
+                self._accept(candidate, score, fitness_image)
+
+        candidates = self._population + offspring
+        objectives = np.vstack((self._population_objectives, offspring_objectives))
+        selected = select_by_rank(objectives, self._population_size)
+        self._population = [candidates[idx] for idx in selected]
+        self._population_objectives = objectives[selected]
+
+        self._gen_nr += 1
+        if self._gen_nr % 100 == 0:
+            logger.debug("Generation {}: {}, lowest error in population {:.6f}".format(
+                self._gen_nr, self._archive.summary_str(),
+                self._population_objectives[:, OBJ_ERROR].min()))
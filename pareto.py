@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Non-dominated sorting and an archive of Pareto-optimal individuals.
+
+    All objectives are minimised. Objectives are given as (n_points, n_objectives) arrays.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+# Columns of the objectives of an individual, see individual_objectives
+OBJ_ERROR = 0
+OBJ_POLYGONS = 1
+OBJ_VERTICES = 2
+
+
+def individual_objectives(individual, score):
+    """ Returns the (error, polygon count, vertex count) objectives of an individual
+    """
+    n_polygons = sum(chrom.n_polygons for chrom in individual.chromosomes)
+    n_vertices = sum(chrom.n_polygons * chrom.n_vertices for chrom in individual.chromosomes)
+    return np.array([score, n_polygons, n_vertices], dtype = np.float64)
+
+
+def domination_matrix(objectives):
+    """ Returns a boolean (n, n) matrix that is True at [i, j] if point i dominates point j.
+
+        A point dominates another if it is not worse in any objective and better in at
+        least one.
+    """
+    obj = np.asarray(objectives, dtype = np.float64)
+    not_worse = np.all(obj[:, np.newaxis, :] <= obj[np.newaxis, :, :], axis = 2)
+    better = np.any(obj[:, np.newaxis, :] < obj[np.newaxis, :, :], axis = 2)
+    return not_worse & better
+
+
+def non_dominated_sort(objectives):
+    """ Sorts points in fronts of non-dominated points (Deb et al., 2002).
+
+        Returns a list of index arrays. The first front contains the points that aren't
+        dominated, the second those that are only dominated by points of the first front,
+        etc.
+    """
+    dominates = domination_matrix(objectives)
+    n_dominators = dominates.sum(axis = 0)
+    fronts = []
+    current = np.flatnonzero(n_dominators == 0)
+    while len(current) > 0:
+        fronts.append(current)
+        n_dominators -= dominates[current].sum(axis = 0)
+        n_dominators[current] = -1  # sorted already
+        current = np.flatnonzero(n_dominators == 0)
+    return fronts
+
+
+def crowding_distances(objectives):
+    """ Returns the crowding distance of each point of a front.
+
+        That is the sum over the objectives of the distance between the two neighbours of
+        the point, relative to the range of the objective. The extreme points get an
+        infinite distance so that they are always kept.
+    """
+    obj = np.asarray(objectives, dtype = np.float64)
+    n_points, n_objectives = obj.shape
+    distances = np.zeros(n_points)
+    if n_points <= 2:
+        distances[:] = np.inf
+        return distances
+    for col in range(n_objectives):
+        order = np.argsort(obj[:, col], kind = 'stable')
+        values = obj[order, col]
+        distances[order[0]] = distances[order[-1]] = np.inf
+        value_range = values[-1] - values[0]
+        if value_range > 0:
+            distances[order[1:-1]] += (values[2:] - values[:-2]) / value_range
+    return distances
+
+
+def knee_point(objectives):
+    """ Returns the index of the knee point of a front.
+
+        The objectives are normalised to [0, 1] over the front and the point that is
+        closest to the ideal point (all zeros) is taken. This is the point where improving
+        any objective costs relatively much in the other ones.
+    """
+    obj = np.asarray(objectives, dtype = np.float64)
+    lowest = obj.min(axis = 0)
+    value_range = obj.max(axis = 0) - lowest
+    value_range[value_range == 0] = 1.0
+    normalised = (obj - lowest) / value_range
+    return int(np.argmin(np.sum(normalised ** 2, axis = 1)))
+
+
+def select_by_rank(objectives, n_selected):
+    """ Returns the indices of the n_selected best points (NSGA-II environmental selection).
+
+        Whole fronts are taken as long as they fit. The front that doesn't fit completely
+        is truncated to the points with the largest crowding distance.
+    """
+    selected = []
+    for front in non_dominated_sort(objectives):
+        n_left = n_selected - len(selected)
+        if len(front) <= n_left:
+            selected.extend(front)
+        else:
+            distances = crowding_distances(np.asarray(objectives)[front])
+            order = np.argsort(-distances, kind = 'stable')
+            selected.extend(front[order[:n_left]])
+        if len(selected) >= n_selected:
+            break
+    return np.array(selected, dtype = np.intp)
+
+
+def rank_and_crowding(objectives):
+    """ Returns the (rank, crowding distance) arrays of all points.
+
+        The rank is the index of the front of the point, see non_dominated_sort.
+    """
+    obj = np.asarray(objectives, dtype = np.float64)
+    ranks = np.empty(len(obj), dtype = np.intp)
+    distances = np.empty(len(obj))
+    for rank, front in enumerate(non_dominated_sort(obj)):
+        ranks[front] = rank
+        distances[front] = crowding_distances(obj[front])
+    return ranks, distances
+
+
+def tournament_select(objectives, rng, n_selected):
+    """ Returns the indices of n_selected points chosen by binary tournaments.
+
+        The point with the lower rank wins; with equal ranks the one with the larger
+        crowding distance wins.
+    """
+    ranks, distances = rank_and_crowding(objectives)
+    first = rng.integers(0, len(ranks), size = n_selected)
+    second = rng.integers(0, len(ranks), size = n_selected)
+    first_wins = ((ranks[first] < ranks[second]) |
+                  ((ranks[first] == ranks[second]) & (distances[first] >= distances[second])))
+    return np.where(first_wins, first, second)
+
+
+class ParetoArchive(object):
+
+    def __init__(self, max_size = 200):
+        """ Archive of the non-dominated individuals that have been found.
+
+            An individual is only added if no archived individual dominates it or has the
+            same objectives. Archived individuals that it dominates are removed. If there
+            are more than max_size individuals, the one with the smallest crowding
+            distance is removed.
+        """
+        self._max_size = max_size
+        self._individuals = []
+        self._objectives = np.empty((0, 3))
+
+    def __len__(self):
+        return len(self._individuals)
+
+    @property
+    def individuals(self):
+        return self._individuals
+
+    @property
+    def objectives(self):
+        "(n, n_objectives) array with the objectives of the archived individuals"
+        return self._objectives
+
+    def add(self, individual, objectives):
+        """ Adds the individual if it isn't dominated. Returns True if it was added.
+        """
+        objectives = np.asarray(objectives, dtype = np.float64)
+        if len(self._individuals) > 0:
+            archived = self._objectives
+            not_worse = np.all(archived <= objectives, axis = 1)
+            if np.any(not_worse):  # dominated or equal
+                return False
+            dominated = np.all(objectives <= archived, axis = 1)
+            keep = np.flatnonzero(~dominated)
+            self._individuals = [self._individuals[idx] for idx in keep]
+            self._objectives = archived[keep]
+
+        self._individuals.append(individual)
+        self._objectives = np.vstack((self._objectives.reshape(-1, len(objectives)),
+                                      objectives))
+        if len(self._individuals) > self._max_size:
+            idx = int(np.argmin(crowding_distances(self._objectives)))
+            del self._individuals[idx]
+            self._objectives = np.delete(self._objectives, idx, axis = 0)
+        return True
+
+    def knee_individual(self):
+        """ Returns the (individual, objectives) of the knee point of the archive
+        """
+        assert len(self._individuals) > 0, "archive is empty"
+        idx = knee_point(self._objectives)
+        return self._individuals[idx], self._objectives[idx]
+
+    def summary_str(self):
+        " Returns a string with the size and the objective ranges of the archive"
+        if len(self._individuals) == 0:
+            return "empty Pareto archive"
+        lowest = self._objectives.min(axis = 0)
+        highest = self._objectives.max(axis = 0)
+        return ("{} non-dominated individuals, error {:.6f}-{:.6f}, polygons {:.0f}-{:.0f}, "
+                "vertices {:.0f}-{:.0f}".format(
+                    len(self._individuals), lowest[OBJ_ERROR], highest[OBJ_ERROR],
+                    lowest[OBJ_POLYGONS], highest[OBJ_POLYGONS],
+                    lowest[OBJ_VERTICES], highest[OBJ_VERTICES]))
@@ -20,6 +20,11 @@ import sys
 import logging
 logger = logging.getLogger(__name__)
 
+from engines import Engine
+from engine_worker import EngineWorker
+from sampleprof import GenerationProfiler
+from widgets import ImageWidget, ScorePlotWidget
+
 
 COL_ID        = 0
 COL_NUM_GENES = 1
@@ -28,13 +33,25 @@ COL_NUM_GENES = 1
 
 class MainWindow(QtGui.QMainWindow):
 
-    def __init__(self, parent = None, target_image = None):
+    sig_start = QtCore.Signal()
+    sig_step = QtCore.Signal()
+
+    def __init__(self, parent = None, target_image = None, max_fps = 10.0, seed = None,
+                 profile_generations = None, profile_start = 0):
     
         super(MainWindow, self).__init__(parent=parent)
 
+        self._engine_thread = None
+        self._engine_worker = None
+        
         self._setup_menu()
         self._setup_models()
         self._setup_views()
+        
+        if target_image is not None:
+            self.load_target(target_image, max_fps = max_fps, seed = seed,
+                             profile_generations = profile_generations, 
+                             profile_start = profile_start)
 
         self.setWindowTitle("PyMona")
         self.setGeometry(50, 50, 800, 600)
@@ -49,15 +66,22 @@ class MainWindow(QtGui.QMainWindow):
         file_menu = QtGui.QMenu("&File", self)
         #open_action = file_menu.addAction("&Open...", self.openFiles)
         #open_action.setShortcut("Ctrl+O")
-        open_action = file_menu.addAction("&Test...", self.test)
-        open_action.setShortcut("Ctrl+T")
         quit_action = file_menu.addAction("E&xit", self.quit_application)
         quit_action.setShortcut("Ctrl+Q")
         
         help_menu = QtGui.QMenu('&Help', self)
         help_menu.addAction('&About', self.about)
 
+        run_menu = QtGui.QMenu("&Run", self)
+        self.start_action = run_menu.addAction("&Start", self.start_evolution)
+        self.start_action.setShortcut("Ctrl+R")
+        self.pause_action = run_menu.addAction("&Pause", self.pause_evolution)
+        self.pause_action.setShortcut("Ctrl+P")
+        self.step_action = run_menu.addAction("S&tep", self.step_evolution)
+        self.step_action.setShortcut("Ctrl+T")
+
         self.menuBar().addMenu(file_menu)
+        self.menuBar().addMenu(run_menu)
         self.menuBar().addSeparator()
         self.menuBar().addMenu(help_menu)
 
@@ -86,6 +110,24 @@ class MainWindow(QtGui.QMainWindow):
         controls_group_box = QtGui.QGroupBox("Controls")
         controls_layout.addWidget(controls_group_box)
         
+        group_layout = QtGui.QVBoxLayout()
+        controls_group_box.setLayout(group_layout)
+        
+        for action in (self.start_action, self.pause_action, self.step_action):
+            button = QtGui.QToolButton()
+            button.setDefaultAction(action)
+            button.setToolButtonStyle(Qt.ToolButtonTextOnly)
+            button.setSizePolicy(QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Fixed)
+            group_layout.addWidget(button)
+            
+        self.gen_label = QtGui.QLabel("Generation: -")
+        group_layout.addWidget(self.gen_label)
+        self.score_label = QtGui.QLabel("Score: -")
+        group_layout.addWidget(self.score_label)
+        self.speed_label = QtGui.QLabel("Speed: -")
+        group_layout.addWidget(self.speed_label)
+        group_layout.addStretch()
+        
         # -- results --
 
         results_widget = QtGui.QWidget()
@@ -97,10 +139,117 @@ class MainWindow(QtGui.QMainWindow):
         results_group_box = QtGui.QGroupBox("Results")
         results_layout.addWidget(results_group_box)
 
+        group_layout = QtGui.QVBoxLayout()
+        results_group_box.setLayout(group_layout)
+        
+        images_layout = QtGui.QHBoxLayout()
+        group_layout.addLayout(images_layout, stretch = 2)
+        
+        self.target_view = ImageWidget()
+        images_layout.addWidget(self.target_view)
+        self.individual_view = ImageWidget()
+        images_layout.addWidget(self.individual_view)
+        self.fitness_view = ImageWidget()
+        images_layout.addWidget(self.fitness_view)
+        
+        self.score_plot = ScorePlotWidget()
+        group_layout.addWidget(self.score_plot, stretch = 1)
+        
+        self._update_actions()
 
-        #self.graphics_view = QtGui.QGraphicsView(self.graphics_scene)
-        #results_layout.addWidget(self.graphics_view)
-
+        
+    def load_target(self, file_name, max_fps = 10.0, seed = None, 
+                    profile_generations = None, profile_start = 0):
+        """ Creates an engine for the target image and moves it to a worker thread.
+        
+            The seed of the random number generator may be None for a non-reproducible run.
+            If profile_generations is set, that many generations are profiled from 
+            generation profile_start on (see sampleprof.GenerationProfiler).
+        """
+        logger.info("Loading target image: {}".format(file_name))
+        assert os.path.exists(file_name), "file not found: {}".format(file_name)
+        target_image = QtGui.QImage(file_name).convertToFormat(QtGui.QImage.Format.Format_RGB32)
+        
+        self._stop_engine_thread()
+        self.target_view.set_image(target_image)
+        self.score_plot.clear()
+        
+        engine = Engine(target_image, rng = seed)
+        if profile_generations is None:
+            profiler = None
+        else:
+            profiler = GenerationProfiler(profile_generations, first_generation = profile_start,
+                                          file_prefix = 'pymona.profile')
+        self._engine_worker = EngineWorker(engine, max_fps = max_fps, profiler = profiler)
+        self._engine_thread = QtCore.QThread()
+        self._engine_worker.moveToThread(self._engine_thread)
+        
+        # Cross-thread connections are queued. The GUI only fetches the latest snapshot.
+        self.sig_start.connect(self._engine_worker.run)
+        self.sig_step.connect(self._engine_worker.step)
+        self._engine_worker.sig_snapshot_ready.connect(self._update_snapshot)
+        self._engine_thread.start()
+        
+        self.individual_view.set_image(engine.individual.render_image())
+        self.fitness_view.set_image(engine.fitness_image)
+        self._update_actions()
+        
+        
+    def _stop_engine_thread(self):
+        if self._engine_thread is None:
+            return
+        self._engine_worker.pause()
+        self._engine_thread.quit()
+        self._engine_thread.wait()
+        if self._engine_worker.profiler is not None:
+            self._engine_worker.profiler.finish()  # write a profile that was cut short
+        self._engine_thread = None
+        self._engine_worker = None
+        
+        
+    def start_evolution(self):
+        if self._engine_worker is None or self._engine_worker.is_running:
+            return
+        self.sig_start.emit()
+        self._update_actions(running = True)
+        
+    def pause_evolution(self):
+        if self._engine_worker is None:
+            return
+        self._engine_worker.pause()
+        self._update_actions(running = False)
+        
+    def step_evolution(self):
+        if self._engine_worker is None:
+            return
+        self.sig_step.emit()
+        
+        
+    def _update_actions(self, running = False):
+        has_engine = self._engine_worker is not None
+        self.start_action.setEnabled(has_engine and not running)
+        self.pause_action.setEnabled(has_engine and running)
+        self.step_action.setEnabled(has_engine and not running)
+        
+        
+    @QtCore.Slot()
+    def _update_snapshot(self):
+        """ Shows the latest snapshot of the engine. 
+        """
+        if self._engine_worker is None:
+            return
+        snapshot = self._engine_worker.take_snapshot()
+        if snapshot is None:
+            return
+        
+        self.individual_view.set_image(snapshot.individual_image)
+        self.fitness_view.set_image(snapshot.fitness_image)
+        self.score_plot.add_points(snapshot.score_history)
+        
+        self.gen_label.setText("Generation: {:d}".format(snapshot.gen_nr))
+        self.score_label.setText("Score: {:8.6f}".format(snapshot.score))
+        if snapshot.elapsed > 0:
+            self.speed_label.setText("Speed: {:.1f} gen/s".format(snapshot.gen_nr / snapshot.elapsed))
         
 
         
@@ -124,12 +273,10 @@ class MainWindow(QtGui.QMainWindow):
 
     def quit_application(self):
         self.close()
-
-    def test(self):
-        """ Simple function used to test stuff during run-time
-        """
-        logger.info('self.test()')
-        logger.info('self.test() done...')
+        
+    def closeEvent(self, event):
+        self._stop_engine_thread()
+        super(MainWindow, self).closeEvent(event)
         
 
         
@@ -147,6 +294,16 @@ def main():
     parser.add_argument('-l', '--log-level', dest='log_level', default = 'debug', 
         help    = "Log level. Only log messages with a level higher or equal than this will be printed. Default: 'warn'", 
         choices = ('debug', 'info', 'warn', 'error', 'critical'))
+    parser.add_argument('-s', '--seed', dest='seed', type=int, default = None, 
+        help    = "Seed of the random number generator. Default: no seed (not reproducible)")
+    parser.add_argument('--max-fps', dest='max_fps', type=float, default = 10.0, 
+        help    = "Maximum number of display updates per second. Default: 10")
+    parser.add_argument('--profile', dest='profile_generations', type=int, default = None, 
+        metavar = 'N_GENERATIONS',
+        help    = "Profile this many generations with a sampling profiler and write "
+                  "pymona.profile.<pid>.collapsed and .summary.txt. Default: no profiling")
+    parser.add_argument('--profile-start', dest='profile_start', type=int, default = 0, 
+        help    = "Generation at which profiling starts. Default: 0")
     
     args = parser.parse_args()
 
@@ -154,7 +311,9 @@ def main():
         format='%(asctime)s: %(filename)20s:%(lineno)-4d : %(levelname)-6s: %(message)s')
 
     logger.info('Started {}'.format(PROGRAM_NAME))
-    window = MainWindow(target_image = args.target_image)
+    window = MainWindow(target_image = args.target_image, max_fps = args.max_fps,
+                        seed = args.seed, profile_generations = args.profile_generations,
+                        profile_start = args.profile_start)
     window.show()
     exit_code = app.exec_()
     logger.info('Done {}'.format(PROGRAM_NAME))
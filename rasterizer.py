@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Rendering of individuals with NumPy, without Qt.
+
+    The polygons are composited front-to-back. An accumulated transmittance buffer records
+    how much of the polygons behind can still be seen per pixel. Pixels that have become
+    (practically) opaque are skipped for all remaining polygons, and polygons whose
+    bounding box only covers opaque pixels are skipped altogether.
+
+    Shape chromosomes (see shapes.py) are composited in the same way; their coverage is
+    computed analytically by the chromosome.
+
+    render_triangles is a fast path for individuals that only have triangles. The inside
+    of a triangle is one span of pixels per row, so it computes the spans of all rows of
+    all triangles at once from their edge functions and composites with dense arithmetic
+    over the bounding boxes. On a 300x300 image with 100 triangles (alpha at most 100) it
+    took about 18 ms per render, against 61 ms for render_front_to_back (bench_render.py,
+    which also times Qt when PySide is available).
+
+    The result is an (height, width, 4) uint8 array in Qt depth order, like the array of
+    an image that is rendered by QtGsIndividual.render_image(). Like the default (aliased)
+    QPainter, the coverage is sampled at the pixel centers, but there are small differences
+    with Qt: Qt rounds the vertices to its fixed-point grid and has its own rule for pixel
+    centers that lie exactly on an edge, and it blends every polygon into the 8-bit image,
+    rounding each time, whereas these renderers composite in float32 and round once.
+    Pixels behind (practically) opaque pixels are skipped, see opaque_threshold. Only
+    when Qt renders with antialiasing (see RenderQuality) does it also anti-alias the edges.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from libimg import QT_DEPTH_R, QT_DEPTH_G, QT_DEPTH_B, QT_DEPTH_A
+from chromosomes import QtGsPolyChromosome
+
+# Pixels with a transmittance below this value don't change visibly (at 8 bits per channel)
+OPAQUE_THRESHOLD = 1.0 / 512
+
+
+def painting_order(individual):
+    """ Returns the polygons of all chromosomes of an individual in painting order.
+
+        Returns a list of (chromosome, polygon_index) tuples. Like Qt, polygons with equal
+        z-values are painted in the order in which they were added to the scene.
+    """
+    chromosomes = individual.chromosomes
+    if len(chromosomes) == 1 and chromosomes[0].is_z_sorted:
+        return [(chromosomes[0], idx) for idx in range(chromosomes[0].n_polygons)]
+
+    all_z = np.concatenate([chrom.expanded_z_genes() for chrom in chromosomes])
+    items = [(chrom, idx) for chrom in chromosomes for idx in range(chrom.n_polygons)]
+    return [items[idx] for idx in np.argsort(all_z, kind = 'stable')]
+
+
+def painting_order_genes(individual):
+    """ Returns the (poly_genes, color_genes) of all chromosomes in painting order.
+
+        The color genes are expanded to a (n_poly, 4) array. The polygons of all
+        chromosomes must have the same number of vertices.
+    """
+    chromosomes = individual.chromosomes
+    if len(chromosomes) == 1 and chromosomes[0].is_z_sorted:
+        return chromosomes[0].poly_genes, chromosomes[0].expanded_color_genes()
+
+    all_z = np.concatenate([chrom.expanded_z_genes() for chrom in chromosomes])
+    order = np.argsort(all_z, kind = 'stable')
+    poly_genes = np.concatenate([chrom.poly_genes for chrom in chromosomes])
+    color_genes = np.concatenate([chrom.expanded_color_genes() for chrom in chromosomes])
+    return poly_genes[order], color_genes[order]
+
+
+def polygon_coverage(polygon, pixel_x, pixel_y):
+    """ Returns a boolean mask of the pixel centers that are inside the polygon.
+
+        Uses the odd-even fill rule, like QGraphicsPolygonItem.
+        :param polygon: (n_vertices, 2) array in scene coordinates
+        :param pixel_x: (1, n_cols) array with the scene x-coordinates of the pixel centers
+        :param pixel_y: (n_rows, 1) array with the scene y-coordinates of the pixel centers
+    """
+    inside = np.zeros((pixel_y.shape[0], pixel_x.shape[1]), dtype = bool)
+    x_prev, y_prev = polygon[-1]
+    for x_cur, y_cur in polygon:
+        if y_cur != y_prev:
+            crosses = (y_cur > pixel_y) != (y_prev > pixel_y)
+            x_cross = x_cur + (pixel_y - y_cur) * ((x_prev - x_cur) / (y_prev - y_cur))
+            inside ^= crosses & (pixel_x < x_cross)
+        x_prev, y_prev = x_cur, y_cur
+    return inside
+
+
+def triangle_edge_functions(triangles):
+    """ Returns the coefficients of the edge functions of triangles.
+
+        Returns (a, b, c) arrays with shape (n_triangles, 3). A point (x, y) lies inside
+        triangle i if a[i, e] * x + b[i, e] * y + c[i, e] >= 0 for all three edges e.
+        The signs are flipped for clockwise triangles. Degenerate triangles get all zero
+        coefficients and should be skipped, like Qt doesn't paint them.
+        :param triangles: (n_triangles, 3, 2) array in scene coordinates
+    """
+    x = triangles[:, :, 0]
+    y = triangles[:, :, 1]
+    x_next = np.roll(x, -1, axis = 1)
+    y_next = np.roll(y, -1, axis = 1)
+    a = y_next - y
+    b = x - x_next
+    c = -a * x - b * y
+    orientation = np.sign(c.sum(axis = 1))[:, np.newaxis]  # sum of c is twice the area
+    return a * orientation, b * orientation, c * orientation
+
+
+def triangle_spans(a, b, c, pixel_y, scale_x, col_0, col_1):
+    """ Returns the (lo, hi) arrays with the columns of the pixel centers that are inside
+        a triangle on a row: the pixels lo <= col < hi. Empty spans have lo == hi.
+
+        :param a, b, c: (n_rows, 3) edge function coefficients of the triangle of each
+            row, see triangle_edge_functions
+        :param pixel_y: (n_rows, ) array with the scene y-coordinates of the rows
+        :param scale_x: width of a pixel in scene coordinates
+        :param col_0, col_1: (n_rows, ) arrays with the pixel range of the bounding boxes
+    """
+    # On a row, edge e is a * x + rest >= 0, which bounds x from below if a > 0 and from
+    # above if a < 0. Horizontal edges (a == 0) either contain the whole row or nothing.
+    lo = col_0.astype(np.float64)
+    hi = col_1.astype(np.float64)
+    for edge in range(3):
+        edge_a = a[:, edge]
+        rest = b[:, edge] * pixel_y + c[:, edge]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            bound = -rest / edge_a / scale_x - 0.5  # in columns of pixel centers
+        lo = np.where(edge_a > 0, np.maximum(lo, np.ceil(bound)), lo)
+        hi = np.where(edge_a < 0, np.minimum(hi, np.floor(bound) + 1), hi)
+        hi = np.where((edge_a == 0) & (rest < 0), lo, hi)
+    return lo.astype(np.intp), np.maximum(lo, hi).astype(np.intp)
+
+
+def _pixel_ranges(bboxes, scale_x, scale_y, width, height):
+    """ Returns the (col_0, col_1, row_0, row_1) arrays with the pixels whose centers
+        may lie inside the (n, 4) bounding boxes in scene coordinates.
+    """
+    col_0 = np.maximum(0, np.ceil(bboxes[:, 0] / scale_x - 0.5)).astype(np.intp)
+    row_0 = np.maximum(0, np.ceil(bboxes[:, 1] / scale_y - 0.5)).astype(np.intp)
+    col_1 = np.minimum(width, np.floor(bboxes[:, 2] / scale_x - 0.5) + 1).astype(np.intp)
+    row_1 = np.minimum(height, np.floor(bboxes[:, 3] / scale_y - 0.5) + 1).astype(np.intp)
+    return col_0, col_1, row_0, row_1
+
+
+def _finish_array(color_acc, transmittance, background_rgb):
+    """ Adds the background and returns the accumulated colors as a Qt depth order array
+    """
+    color_acc += transmittance[:, :, np.newaxis] * np.array(background_rgb, dtype = np.float32)
+
+    height, width = transmittance.shape
+    arr = np.empty((height, width, 4), dtype = np.uint8)
+    rgb = np.clip(np.rint(color_acc), 0, 255).astype(np.uint8)
+    arr[:, :, QT_DEPTH_R] = rgb[:, :, 0]
+    arr[:, :, QT_DEPTH_G] = rgb[:, :, 1]
+    arr[:, :, QT_DEPTH_B] = rgb[:, :, 2]
+    arr[:, :, QT_DEPTH_A] = 255
+    return arr
+
+
+def render_front_to_back(individual, background_rgb = None,
+                         opaque_threshold = OPAQUE_THRESHOLD):
+    """ Renders an individual to an (height, width, 4) uint8 array in Qt depth order.
+
+        The background defaults to that of QtGsIndividual.
+    """
+    if background_rgb is None:
+        from individuals import BACKGROUND_RGB
+        background_rgb = BACKGROUND_RGB
+
+    width = individual.img_width
+    height = individual.img_height
+
+    # Like QtGsIndividual.render_image(), the scene rectangle of (width + 1) x (height + 1)
+    # is scaled to the image.
+    scale_x = (width + 1) / width
+    scale_y = (height + 1) / height
+    center_x = ((np.arange(width) + 0.5) * scale_x)[np.newaxis, :]
+    center_y = ((np.arange(height) + 0.5) * scale_y)[:, np.newaxis]
+
+    color_acc = np.zeros((height, width, 3), dtype = np.float32)
+    transmittance = np.ones((height, width), dtype = np.float32)
+
+    n_skipped = 0
+    for chrom, idx in reversed(painting_order(individual)):
+        color = chrom.color_genes[0] if chrom.n_colors == 1 else chrom.color_genes[idx]
+        alpha = color[chrom.ALPHA] / 255.0
+        if alpha == 0:
+            continue
+
+        # Bounding box in pixels (the pixels whose centers may be inside the polygon)
+        x_min, y_min, x_max, y_max = chrom.bounding_boxes[idx]
+        col_0 = max(0, int(np.ceil(x_min / scale_x - 0.5)))
+        col_1 = min(width, int(np.floor(x_max / scale_x - 0.5)) + 1)
+        row_0 = max(0, int(np.ceil(y_min / scale_y - 0.5)))
+        row_1 = min(height, int(np.floor(y_max / scale_y - 0.5)) + 1)
+        if col_0 >= col_1 or row_0 >= row_1:
+            continue
+
+        trans_box = transmittance[row_0:row_1, col_0:col_1]
+        visible = trans_box > opaque_threshold
+        if not visible.any():
+            n_skipped += 1   # early out: everything behind this box is hidden already
+            continue
+
+        if isinstance(chrom, QtGsPolyChromosome):
+            mask = polygon_coverage(chrom.poly_genes[idx], center_x[:, col_0:col_1],
+                                    center_y[row_0:row_1, :])
+        else:  # shape chromosomes (see shapes.py) compute their own coverage
+            mask = chrom.coverage(idx, center_x[:, col_0:col_1], center_y[row_0:row_1, :])
+        mask &= visible
+        weight = trans_box[mask] * alpha
+        color_box = color_acc[row_0:row_1, col_0:col_1]
+        color_box[mask] += weight[:, np.newaxis] * color[chrom.RGB].astype(np.float32)
+        trans_box[mask] *= (1.0 - alpha)
+
+    logger.debug("render_front_to_back: skipped {} fully hidden polygons".format(n_skipped))
+    return _finish_array(color_acc, transmittance, background_rgb)
+
+
+def render_triangles(individual, background_rgb = None, opaque_threshold = OPAQUE_THRESHOLD):
+    """ Renders an individual that only has triangles to a (height, width, 4) uint8 array
+        in Qt depth order.
+
+        Like render_front_to_back, the triangles are composited front-to-back and pixels
+        that have become opaque are skipped. The coverage of a triangle is built from its
+        spans per row (see triangle_spans), which are computed for all triangles at once.
+    """
+    if background_rgb is None:
+        from individuals import BACKGROUND_RGB
+        background_rgb = BACKGROUND_RGB
+
+    for chrom in individual.chromosomes:
+        assert isinstance(chrom, QtGsPolyChromosome) and chrom.n_vertices == 3, \
+            "render_triangles requires chromosomes of triangles"
+
+    width = individual.img_width
+    height = individual.img_height
+    scale_x = (width + 1) / width
+    scale_y = (height + 1) / height
+
+    # Front-most triangle first
+    triangles, colors = painting_order_genes(individual)
+    triangles = triangles[::-1]
+    colors = colors[::-1]
+    alphas = (colors[:, QtGsPolyChromosome.ALPHA] / 255.0).astype(np.float32)
+    rgbs = colors[:, QtGsPolyChromosome.RGB].astype(np.float32)
+
+    bboxes = np.concatenate((triangles.min(axis = 1), triangles.max(axis = 1)), axis = 1)
+    col_0, col_1, row_0, row_1 = _pixel_ranges(bboxes, scale_x, scale_y, width, height)
+    n_rows = row_1 - row_0
+    edge_a, edge_b, edge_c = triangle_edge_functions(triangles)
+    visible = (col_1 > col_0) & (n_rows > 0) & (alphas > 0) & np.any(edge_c != 0, axis = 1)
+    indices = np.flatnonzero(visible)
+
+    # The spans of all rows of the bounding boxes of the visible triangles, one triangle
+    # after the other.
+    row_counts = n_rows[indices]
+    row_starts = np.cumsum(row_counts) - row_counts
+    row_triangles = np.repeat(indices, row_counts)
+    rows = row_0[row_triangles] + np.arange(len(row_triangles)) - np.repeat(row_starts, row_counts)
+    span_lo, span_hi = triangle_spans(edge_a[row_triangles], edge_b[row_triangles],
+                                      edge_c[row_triangles], (rows + 0.5) * scale_y, scale_x,
+                                      col_0[row_triangles], col_1[row_triangles])
+
+    # The colors are accumulated per channel so that the boxes of a channel are contiguous
+    color_acc = np.zeros((3, height, width), dtype = np.float32)
+    transmittance = np.ones((height, width), dtype = np.float32)
+    all_cols = np.arange(width)
+
+    n_skipped = 0
+    for idx, row_start, row_count in zip(indices, row_starts, row_counts):
+        spans = slice(row_start, row_start + row_count)
+        rows = slice(row_0[idx], row_1[idx])
+        cols = all_cols[col_0[idx]:col_1[idx]]
+        trans_box = transmittance[rows, col_0[idx]:col_1[idx]]
+        mask = (cols >= span_lo[spans, np.newaxis]) & (cols < span_hi[spans, np.newaxis])
+        mask &= trans_box > opaque_threshold
+        if not mask.any():
+            n_skipped += 1  # early out: everything behind this triangle is hidden already
+            continue
+        # Dense arithmetic over the box is faster than boolean indexing.
+        weight = trans_box * alphas[idx]
+        weight *= mask
+        for channel in range(3):
+            color_box = color_acc[channel, rows, col_0[idx]:col_1[idx]]
+            color_box += weight * rgbs[idx, channel]
+        trans_box -= weight
+
+    logger.debug("render_triangles: skipped {} hidden triangles".format(n_skipped))
+    return _finish_array(np.moveaxis(color_acc, 0, 2), transmittance, background_rgb)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Render-quality profiles.
+
+    The engine can render the many candidates that are thrown away with a cheap profile and
+    re-verify the accepted individuals with a high-quality profile (see Engine).
+
+    A profile only changes the rendering where the renderer supports it: antialiasing
+    only affects Qt, the blend precision only the NumPy renderers. So with the Qt renderer
+    'fast' is the same as 'default', and with the NumPy renderers 'high' is the same as
+    'default'.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class RenderQuality(object):
+
+    def __init__(self, name, antialiasing = False, blend_bits = 8):
+        """ Settings that trade rendering speed for accuracy.
+
+            :param antialiasing: if True, Qt anti-aliases the polygon edges. The NumPy
+                renderers always sample the pixel centers and ignore this setting.
+            :param blend_bits: early-out precision of the NumPy renderers. A pixel whose 
+                transmittance is below half a step of blend_bits bits is considered opaque,
+                so the polygons behind it are skipped. The blending itself stays in float32.
+                Qt ignores this setting.
+        """
+        assert 1 <= blend_bits <= 8, "blend_bits must be between 1 and 8"
+        self._name = name
+        self._antialiasing = antialiasing
+        self._blend_bits = blend_bits
+
+    def __repr__(self):
+        return ("RenderQuality({!r}, antialiasing = {}, blend_bits = {})"
+                .format(self._name, self._antialiasing, self._blend_bits))
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def antialiasing(self):
+        return self._antialiasing
+
+    @property
+    def blend_bits(self):
+        return self._blend_bits
+
+    @property
+    def opaque_threshold(self):
+        "Transmittance below which the NumPy renderers consider a pixel opaque"
+        return 1.0 / 2 ** (self._blend_bits + 1)
+
+
+# Cheap profile for the search (earlier early-out of the NumPy renderers), the default 
+# (Qt's default painter settings) and a high-quality profile for the final output.
+RENDER_QUALITIES = {
+    'fast': RenderQuality('fast', antialiasing = False, blend_bits = 5),
+    'default': RenderQuality('default', antialiasing = False, blend_bits = 8),
+    'high': RenderQuality('high', antialiasing = True, blend_bits = 8),
+}
+
+
+def get_render_quality(quality):
+    """ Returns the RenderQuality with that name, or quality itself if it is a RenderQuality
+    """
+    if isinstance(quality, RenderQuality):
+        return quality
+    assert quality in RENDER_QUALITIES, "Unknown render quality: {!r}".format(quality)
+    return RENDER_QUALITIES[quality]
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Independent random number streams.
+
+    All randomness in PyMona comes from explicitly passed numpy.random.Generator objects.
+    The streams of the engines, populations and workers of a run are all spawned from a
+    single root seed, so that a parallel run is reproducible bit-for-bit, independent of
+    the order in which the workers are scheduled.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+
+def create_rng(seed = None):
+    """ Returns a numpy.random.Generator.
+
+        The seed may be None (fresh entropy), an int, a numpy.random.SeedSequence or a
+        Generator (which is returned as is).
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def spawn_rngs(seed, n_streams):
+    """ Returns a list of n_streams statistically independent Generators.
+
+        For an int seed, stream i only depends on the seed and on i, so worker i gets the 
+        same stream regardless of the total number of workers. The seed may also be None, 
+        a SeedSequence or a Generator (from which the root entropy is then drawn).
+    """
+    if isinstance(seed, np.random.Generator):
+        seed_seq = np.random.SeedSequence(int(seed.integers(2**63)))
+    elif isinstance(seed, np.random.SeedSequence):
+        seed_seq = seed
+    else:
+        seed_seq = np.random.SeedSequence(seed)
+
+    if seed is None:
+        logger.info("Root entropy of random streams: {}".format(seed_seq.entropy))
+    return [np.random.default_rng(child) for child in seed_seq.spawn(n_streams)]
+
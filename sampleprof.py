@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Low-overhead sampling profiler.
+
+    A background thread periodically records the call stack of the profiled thread. The
+    result can be written as collapsed stacks (one 'caller;callee weight' line per stack,
+    the input format of flamegraph.pl and speedscope) and as a per-function summary.
+
+    The sampler is a Python thread, so it can only take a sample when it gets the GIL.
+    While the profiled thread runs Python code or C code that holds the GIL (e.g. building
+    a Qt scene), that happens about once per switch interval (sys.getswitchinterval(),
+    5 ms by default); during C code that releases the GIL (e.g. many NumPy operations) it
+    happens every interval. Each sample is therefore weighted by the wall time since the
+    previous sample, so that both kinds of code get their share of the time. Time in C
+    code is attributed to the Python function that called it.
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler(object):
+
+    def __init__(self, interval = 0.002):
+        """ Samples the call stack of the thread that calls start() every interval seconds.
+        """
+        self._interval = interval
+        self._counts = Counter()   # stack (tuple of labels, outermost first) -> n_samples
+        self._times = Counter()    # stack -> seconds (the wall time that the samples cover)
+        self._labels = {}          # code object -> label
+        self._thread_id = None
+        self._sampler = None
+        self._stop_event = threading.Event()
+        self._duration = 0.0
+        self._start_time = None
+
+    @property
+    def n_samples(self):
+        return sum(self._counts.values())
+
+    @property
+    def sampled_time(self):
+        "The wall time in seconds that the samples cover"
+        return sum(self._times.values())
+
+    @property
+    def is_running(self):
+        return self._sampler is not None
+
+    def start(self):
+        """ Starts sampling the calling thread.
+        """
+        assert not self.is_running, "profiler is running already"
+        self._thread_id = threading.current_thread().ident
+        self._stop_event.clear()
+        self._start_time = time.time()
+        self._sampler = threading.Thread(target = self._sample_loop, name = 'SamplingProfiler')
+        self._sampler.daemon = True
+        self._sampler.start()
+
+    def stop(self):
+        """ Stops sampling. Sampling can be resumed with start().
+        """
+        if not self.is_running:
+            return
+        self._stop_event.set()
+        self._sampler.join()
+        self._sampler = None
+        self._duration += time.time() - self._start_time
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = "{}:{}".format(module, code.co_name)
+            self._labels[code] = label
+        return label
+
+    def _sample_loop(self):
+        last_time = time.perf_counter()
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break  # the profiled thread has ended
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack = tuple(reversed(stack))
+            self._counts[stack] += 1
+            self._times[stack] += now - last_time
+            last_time = now
+
+    def collapsed_lines(self):
+        """ Returns the collapsed stacks as a list of 'outer;...;inner weight' strings.
+
+            The weight is the sampled time of the stack in microseconds.
+        """
+        return ["{} {}".format(';'.join(stack), int(round(seconds * 1e6)))
+                for stack, seconds in sorted(self._times.items())]
+
+    def write_collapsed(self, file_name):
+        "Writes the collapsed stacks, e.g. for flamegraph.pl, to a file"
+        with open(file_name, 'w') as file:
+            for line in self.collapsed_lines():
+                file.write(line + '\n')
+
+    def function_stats(self):
+        """ Returns a list of (label, self time, total time) tuples in seconds, sorted by 
+            the self time.
+
+            The self time is that of the samples in which the function was executing, the
+            total time that of the samples in which it was on the stack.
+        """
+        self_times = Counter()
+        total_times = Counter()
+        for stack, seconds in self._times.items():
+            self_times[stack[-1]] += seconds
+            for label in set(stack):
+                total_times[label] += seconds
+        return sorted(((label, self_times[label], total) for label, total
+                       in total_times.items()), key = lambda stats: (-stats[1], -stats[2]))
+
+    def summary_str(self, n_functions = 30):
+        " Returns the per-function summary of the n_functions with the most self time"
+        sampled_time = self.sampled_time or 1.0
+        lines = ["{} samples covering {:.2f} s of {:.2f} s (interval {:.1f} ms)".format(
+                    self.n_samples, self.sampled_time, self._duration, self._interval * 1000),
+                 "{:>7s} {:>7s}  {}".format('self', 'total', 'function')]
+        for label, self_time, total_time in self.function_stats()[:n_functions]:
+            lines.append("{:7.2%} {:7.2%}  {}".format(self_time / sampled_time,
+                                                      total_time / sampled_time, label))
+        return '\n'.join(lines)
+
+    def write_summary(self, file_name, n_functions = 100):
+        "Writes the per-function summary to a file"
+        with open(file_name, 'w') as file:
+            file.write(self.summary_str(n_functions = n_functions) + '\n')
+
+
+class GenerationProfiler(object):
+
+    def __init__(self, n_generations, first_generation = 0, file_prefix = 'profile',
+                 interval = 0.002):
+        """ Profiles a window of n_generations generations, starting at first_generation.
+
+            update() must be called after every generation, from the thread that runs the
+            engine. When the window has passed, the collapsed stacks and the summary are
+            written to <file_prefix>.<pid>.collapsed and <file_prefix>.<pid>.summary.txt,
+            so that several worker processes can profile at the same time.
+        """
+        self._first_generation = first_generation
+        self._last_generation = first_generation + n_generations
+        self._file_prefix = "{}.{}".format(file_prefix, os.getpid())
+        self._profiler = SamplingProfiler(interval = interval)
+        self._finished = False
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    def update(self, gen_nr):
+        """ Starts or stops the profiler depending on the number of generations done.
+        """
+        if self._finished:
+            return
+        if gen_nr >= self._last_generation:
+            self.finish()
+        elif gen_nr >= self._first_generation and not self._profiler.is_running:
+            logger.info("Profiling generations {} to {}".format(gen_nr, self._last_generation))
+            self._profiler.start()
+
+    def finish(self):
+        """ Stops the profiler and writes the results (if anything was sampled).
+        """
+        if self._finished:
+            return
+        self._finished = True
+        self._profiler.stop()
+        if self._profiler.n_samples == 0:
+            logger.warning("Profiler has no samples, nothing written")
+            return
+        directory = os.path.dirname(self._file_prefix)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        collapsed_file = self._file_prefix + '.collapsed'
+        summary_file = self._file_prefix + '.summary.txt'
+        self._profiler.write_collapsed(collapsed_file)
+        self._profiler.write_summary(summary_file)
+        logger.info("Profile written to {} and {}\n{}".format(
+            collapsed_file, summary_file, self._profiler.summary_str(n_functions = 10)))
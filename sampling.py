@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Estimation of the fitness score from a random sample of pixels.
+
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from libimg import QT_SLICE_RGB
+
+
+class PixelSampler(object):
+
+    def __init__(self, target_arr, rng, fraction = 0.1, tile_size = 16, min_weight = 0.1):
+        """ Estimates score_rgb of the difference with the target from a sample of pixels.
+
+            The image is divided in tiles of tile_size x tile_size pixels. The samples are
+            stratified over the tiles: each tile gets a number of samples proportional to the
+            standard deviation of the target within the tile (plus min_weight times the
+            average standard deviation, so that flat tiles are also sampled). Within a
+            tile the pixels are drawn uniformly, with replacement. Each sample is weighted
+            by the tile area divided by the number of samples in the tile, so that the
+            estimate is unbiased.
+
+            :param target_arr: (height, width, 4) uint8 array in Qt depth order
+            :param rng: numpy.random.Generator that is used to draw the samples
+            :param fraction: number of samples relative to the number of pixels
+        """
+        assert 0 < fraction <= 1, "fraction must be > 0 and <= 1"
+        height, width, _ = target_arr.shape
+        self._rng = rng
+        self._n_pixels = height * width
+        self._max_score_rgb = self._n_pixels * 3 * 255
+
+        # Tile index of every pixel
+        n_tiles_x = (width + tile_size - 1) // tile_size
+        tile_y = np.arange(height) // tile_size
+        tile_x = np.arange(width) // tile_size
+        pixel_tiles = (tile_y[:, np.newaxis] * n_tiles_x + tile_x[np.newaxis, :]).ravel()
+
+        # Pixels sorted by tile, so that the pixels of tile t are found at
+        # self._pixels_by_tile[self._tile_start[t] : self._tile_start[t] + self._tile_area[t]]
+        self._pixels_by_tile = np.argsort(pixel_tiles, kind = 'stable')
+        n_tiles = pixel_tiles[-1] + 1
+        self._tile_area = np.bincount(pixel_tiles, minlength = n_tiles)
+        self._tile_start = np.concatenate(([0], np.cumsum(self._tile_area)[:-1]))
+
+        # Standard deviation of the target per tile
+        target_rgb = target_arr[:, :, QT_SLICE_RGB].reshape(-1, 3).astype(np.float64)
+        luminance = target_rgb.mean(axis = 1)
+        tile_mean = np.bincount(pixel_tiles, luminance, n_tiles) / self._tile_area
+        tile_mean_sq = np.bincount(pixel_tiles, luminance ** 2, n_tiles) / self._tile_area
+        tile_std = np.sqrt(np.maximum(tile_mean_sq - tile_mean ** 2, 0))
+
+        weight = (tile_std + min_weight * max(tile_std.mean(), 1.0)) * self._tile_area
+        n_samples = fraction * self._n_pixels
+        self._tile_n_samples = np.clip(np.round(n_samples * weight / weight.sum()),
+                                       1, None).astype(np.intp)
+
+        self._sample_tiles = np.repeat(np.arange(n_tiles), self._tile_n_samples)
+        self._sample_weights = (self._tile_area / self._tile_n_samples)[self._sample_tiles]
+        self._target_flat = target_arr.reshape(-1, 4)
+        self.resample()
+        logger.debug("PixelSampler: {} samples in {} tiles ({:.1%} of the pixels)"
+                     .format(self.n_samples, n_tiles, self.n_samples / self._n_pixels))
+
+    @property
+    def n_samples(self):
+        return len(self._sample_tiles)
+
+    def resample(self):
+        """ Draws a new set of sample pixels (with the same number of samples per tile)
+        """
+        tiles = self._sample_tiles
+        offsets = (self._rng.random(len(tiles)) * self._tile_area[tiles]).astype(np.intp)
+        self._sample_pixels = self._pixels_by_tile[self._tile_start[tiles] + offsets]
+        self._target_samples = self._target_flat[self._sample_pixels, QT_SLICE_RGB].astype(np.int16)
+
+    def estimate_score(self, individual_arr):
+        """ Returns an estimate of score_rgb(abs_diff(target, individual)) / max_score_rgb
+
+            individual_arr must be a (height, width, 4) uint8 array in Qt depth order.
+        """
+        # Only the sampled pixels are gathered, the individual array is not copied.
+        samples = individual_arr.reshape(-1, 4)[self._sample_pixels, QT_SLICE_RGB]
+        diff = np.abs(samples.astype(np.int16) - self._target_samples).sum(axis = 1)
+        return np.dot(self._sample_weights, diff) / self._max_score_rgb
+
@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Chromosomes of simple shapes: ellipses, rotated rectangles and brush strokes.
+
+    Each shape is stored as a row of N_PARAMS floats, so the genes of a chromosome are
+    one (n_shapes, N_PARAMS) array besides the (n_shapes, 4) colors and the z-values.
+    The coverage of a shape can be computed analytically, which the NumPy renderers use.
+    Shape chromosomes can be mixed with QtGsPolyChromosomes in one QtGsIndividual and
+    are painted in z-order together with the polygons.
+
+    Angles are in radians, clockwise because the y-axis points down (like Qt and SVG).
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from lazymodule import QtCore, QtGui
+from chromosomes import QtGsChromosome, no_pen
+from spatialindex import GridIndex, boxes_overlap
+
+# Sizes (radii, half widths) don't shrink below this many pixels
+MIN_SIZE = 0.5
+
+
+class QtGsShapeChromosome(QtGsChromosome):
+    """ Abstract base class of chromosomes whose genes are shapes with an analytic coverage.
+
+        Descendants define the columns of the shape genes and implement _random_shape_genes,
+        _compute_bounding_boxes, coverage, create_graphic_item and svg_element.
+    """
+    RGB = slice(0, 3)
+    ALPHA = 3
+
+    N_PARAMS = 5
+    SIZE_COLUMNS = ()   # columns that are kept >= MIN_SIZE
+    ANGLE_COLUMNS = ()  # columns with angles, their noise is scaled by the shape size
+
+    def __init__(self, shape_genes, color_genes, z_genes, sort_z = True):
+        """ Chromosome of shapes.
+
+            shape_genes must be a float array with shape (n_shapes, N_PARAMS)
+            color_genes must be a uint8 array with shape (n_shapes, 4)
+            z_genes must be a 1D array with length n_shapes
+
+            Unlike QtGsPolyChromosome, the colors and z-values can't be shared. If sort_z
+            is True, the genes are stored in painting order.
+        """
+        assert shape_genes.ndim == 2 and shape_genes.shape[1] == self.N_PARAMS, \
+            "shape_genes must be a (n_shapes, {}) array".format(self.N_PARAMS)
+        assert color_genes.dtype == np.uint8, "Color genes must be of type np.uint8"
+        assert color_genes.shape == (len(shape_genes), 4), "color_genes shape must be (n_shapes, 4)"
+        assert z_genes.shape == (len(shape_genes), ), "z_genes length must be n_shapes"
+
+        if sort_z and np.any(z_genes[1:] < z_genes[:-1]):
+            order = np.argsort(z_genes, kind = 'stable')
+            shape_genes, color_genes, z_genes = shape_genes[order], color_genes[order], z_genes[order]
+
+        self._shape_genes = shape_genes
+        self._color_genes = color_genes
+        self._z_genes = z_genes
+        self._bounding_boxes = None  # created on first use
+        self._spatial_index = None   # created on first use
+        self._base_index = None      # index of the chromosome this one was derived from
+
+    @property
+    def shape_genes(self):
+        "2D float array with shape (n_shapes, N_PARAMS)"
+        return self._shape_genes
+
+    @property
+    def color_genes(self):
+        "2D uint8 array with shape (n_shapes, 4) containing the RGBA colors"
+        return self._color_genes
+
+    @property
+    def z_genes(self):
+        "1D float array with length n_shapes containing the depths"
+        return self._z_genes
+
+    @property
+    def n_polygons(self):
+        "The number of shapes (named like in QtGsPolyChromosome so that renderers can mix them)"
+        return self._shape_genes.shape[0]
+
+    @property
+    def n_colors(self):
+        return self._color_genes.shape[0]
+
+    @property
+    def is_z_sorted(self):
+        "True if the genes are stored in painting order"
+        return not np.any(self._z_genes[1:] < self._z_genes[:-1])
+
+    def painting_order(self):
+        "Returns the indices of the shapes in the order in which they are painted"
+        if self.is_z_sorted:
+            return np.arange(self.n_polygons)
+        return np.argsort(self._z_genes, kind = 'stable')
+
+    def expanded_color_genes(self):
+        return self._color_genes
+
+    def expanded_z_genes(self):
+        return self._z_genes
+
+    @property
+    def bounding_boxes(self):
+        "(n_shapes, 4) array with the (x_min, y_min, x_max, y_max) of each shape"
+        if self._bounding_boxes is None:
+            self._bounding_boxes = self._compute_bounding_boxes()
+        return self._bounding_boxes
+
+    @property
+    def spatial_index(self):
+        "GridIndex of the bounding boxes of the shapes"
+        if self._spatial_index is None:
+            if self._base_index is None:
+                self._spatial_index = GridIndex(self.bounding_boxes)
+            else:
+                # Only the boxes that moved to other grid cells are re-registered.
+                self._spatial_index = self._base_index.copy()
+                self._spatial_index.update(np.arange(self.n_polygons), self.bounding_boxes)
+                self._base_index = None
+        return self._spatial_index
+
+    def polygons_overlapping(self, rect):
+        """ Returns a sorted array with the indices of the shapes whose bounding box
+            overlaps with rect, a (x_min, y_min, x_max, y_max) tuple.
+        """
+        return self.spatial_index.query(rect)
+
+    def hidden_mask(self, canvas_rect, occlusion = False):
+        """ Returns a boolean mask of the shapes that lie completely outside canvas_rect.
+
+            Shapes aren't tested for occlusion, the occlusion parameter only exists for
+            compatibility with QtGsPolyChromosome.hidden_mask.
+        """
+        return ~boxes_overlap(self.bounding_boxes, canvas_rect)
+
+    def z_ordered_graphic_items(self, canvas_rect = None):
+        """ Returns a list of (z_value, QGraphicItem) tuples in painting order, like
+            QtGsPolyChromosome.z_ordered_graphic_items.
+
+            If canvas_rect, a (x_min, y_min, x_max, y_max) tuple, is given, no items are
+            created for the shapes outside it.
+        """
+        if canvas_rect is None:
+            hidden = np.zeros(self.n_polygons, dtype = bool)
+        else:
+            hidden = self.hidden_mask(canvas_rect)
+
+        items = []
+        for idx in self.painting_order():
+            if not hidden[idx]:
+                qitem = self.create_graphic_item(idx, QtGui.QColor(*self._color_genes[idx]))
+                items.append((self._z_genes[idx], qitem))
+        return items
+
+    def get_graphic_items(self, canvas_rect = None):
+        """ Returns a list with the QGraphicItem representation of each gene in painting
+            order
+        """
+        return [qitem for _, qitem in self.z_ordered_graphic_items(canvas_rect = canvas_rect)]
+
+    def clone(self, rng,
+              sigma_vertex = 0.0,
+              sigma_color  = 0.0,
+              sigma_z      = 0.0,
+              min_z        = 0,
+              max_z        = 1023,
+              min_alpha    = 0,
+              max_alpha    = 255,
+              n_layer_swaps = 0,
+              polygons     = None):
+        """ Clones a chromosome and adds normal distributed noise.
+
+            Takes the same parameters as QtGsPolyChromosome.clone. The positions and sizes
+            get noise with standard deviation sigma_vertex (in pixels). The noise of an
+            angle is sigma_vertex divided by the size of the shape, so that its outline
+            moves about sigma_vertex pixels.
+        """
+        assert min_alpha >=0, "min_alpha should be >= 0"
+        assert max_alpha <=255, "max_alpha should be <= 255"
+
+        selected = np.arange(self.n_polygons) if polygons is None else np.asarray(polygons)
+        n_selected = len(selected)
+        new_shape_genes = self._shape_genes.copy()
+        new_color_genes = self._color_genes.astype(np.float64)
+        new_z_genes = self._z_genes.copy()
+
+        noise_shape = sigma_vertex * rng.standard_normal((n_selected, self.N_PARAMS))
+        if self.ANGLE_COLUMNS:
+            sizes = self._shape_genes[selected][:, self.SIZE_COLUMNS].max(axis = 1)
+            for col in self.ANGLE_COLUMNS:
+                noise_shape[:, col] /= np.maximum(sizes, 1.0)
+        new_shape_genes[selected] += noise_shape
+        new_color_genes[selected] += sigma_color * rng.standard_normal((n_selected, 4))
+        new_z_genes[selected] += sigma_z * rng.standard_normal(n_selected)
+
+        for col in self.SIZE_COLUMNS:
+            np.maximum(new_shape_genes[:, col], MIN_SIZE, out = new_shape_genes[:, col])
+        for col in self.ANGLE_COLUMNS:
+            np.mod(new_shape_genes[:, col], np.pi, out = new_shape_genes[:, col])
+        np.clip(new_color_genes[:,self.RGB], 0, 255, out = new_color_genes[:,self.RGB])
+        np.clip(new_color_genes[:,self.ALPHA], min_alpha, max_alpha, out = new_color_genes[:,self.ALPHA])
+        np.clip(new_z_genes, min_z, max_z, out = new_z_genes)
+        new_color_genes = new_color_genes.astype(np.uint8)
+
+        clone = type(self)(new_shape_genes, new_color_genes, new_z_genes)
+        if n_layer_swaps > 0 and clone.n_polygons > 1:
+            # Swap shapes that are adjacent in painting order, the z-values stay in place.
+            for idx in rng.integers(0, clone.n_polygons - 1, size = n_layer_swaps):
+                swap = [idx + 1, idx]
+                clone._shape_genes[[idx, idx + 1]] = clone._shape_genes[swap]
+                clone._color_genes[[idx, idx + 1]] = clone._color_genes[swap]
+
+        # The clone derives its spatial index from this one when it is first used
+        if self._spatial_index is not None:
+            clone._base_index = self._spatial_index
+        else:
+            clone._base_index = self._base_index
+        return clone
+
+    @classmethod
+    def create_random(cls, n_shapes, rectangle, rng, min_z = 0, max_z = 1023,
+                      min_alpha = 0, max_alpha = 255, max_size = 0.25):
+        """ Creates a chromosome with random shapes.
+
+            rectangle should be a (x, y, width, height) tuple. The shapes lie around that
+            rectangle and are at most max_size times its smallest side large.
+        """
+        shape_genes = cls._random_shape_genes(n_shapes, rectangle, rng, max_size)
+        color_genes = rng.integers(0, 256, size = (n_shapes, 4), dtype = np.uint8)
+        color_genes[:, cls.ALPHA] = np.clip(color_genes[:, cls.ALPHA], min_alpha, max_alpha)
+        z_genes = (max_z - min_z) * rng.random(n_shapes) + min_z
+        return cls(shape_genes, color_genes, z_genes)
+
+    @staticmethod
+    def _random_shape_genes(n_shapes, rectangle, rng, max_size):
+        assert False, "Abstract method. Please instantiate from a descendant class."
+
+    def _compute_bounding_boxes(self):
+        assert False, "Abstract method. Please instantiate from a descendant class."
+
+    def coverage(self, idx, pixel_x, pixel_y):
+        """ Returns a boolean mask of the pixel centers that are inside shape idx.
+
+            :param pixel_x: (1, n_cols) array with the scene x-coordinates of the pixel centers
+            :param pixel_y: (n_rows, 1) array with the scene y-coordinates of the pixel centers
+        """
+        assert False, "Abstract method. Please instantiate from a descendant class."
+
+    def create_graphic_item(self, idx, qcolor):
+        "Returns a QGraphicsItem of shape idx in the color qcolor"
+        assert False, "Abstract method. Please instantiate from a descendant class."
+
+    def svg_element(self, idx, precision = 1):
+        "Returns the SVG element (unicode string) of shape idx"
+        assert False, "Abstract method. Please instantiate from a descendant class."
+
+    def _svg_fill(self, idx):
+        color = self._color_genes[idx]
+        return u'fill="#{:02x}{:02x}{:02x}" fill-opacity="{:.3g}"'.format(
+            color[0], color[1], color[2], color[3] / 255)
+
+
+def _random_centered_genes(n_shapes, rectangle, rng, max_size):
+    "(center_x, center_y, size_x, size_y, angle) genes of random centered shapes"
+    x, y, width, height = rectangle
+    genes = np.empty((n_shapes, 5))
+    genes[:, 0] = x + width * rng.random(n_shapes)
+    genes[:, 1] = y + height * rng.random(n_shapes)
+    genes[:, 2:4] = MIN_SIZE + (0.5 * max_size * min(width, height) - MIN_SIZE) * \
+                    rng.random((n_shapes, 2))
+    genes[:, 4] = np.pi * rng.random(n_shapes)
+    return genes
+
+
+def _local_coordinates(genes, pixel_x, pixel_y):
+    " Returns the pixel coordinates (u, v) in the frame of a centered, rotated shape"
+    center_x, center_y, _, _, angle = genes
+    cos, sin = np.cos(angle), np.sin(angle)
+    dx = pixel_x - center_x
+    dy = pixel_y - center_y
+    return dx * cos + dy * sin, dy * cos - dx * sin
+
+
+class QtGsEllipseChromosome(QtGsShapeChromosome):
+    """ Rotated ellipses with (center_x, center_y, radius_x, radius_y, angle) genes
+    """
+    CENTER_X, CENTER_Y, RADIUS_X, RADIUS_Y, ANGLE = range(5)
+    SIZE_COLUMNS = (RADIUS_X, RADIUS_Y)
+    ANGLE_COLUMNS = (ANGLE, )
+
+    @staticmethod
+    def _random_shape_genes(n_shapes, rectangle, rng, max_size):
+        return _random_centered_genes(n_shapes, rectangle, rng, max_size)
+
+    def _compute_bounding_boxes(self):
+        cx, cy, rx, ry, angle = self._shape_genes.T
+        cos, sin = np.cos(angle), np.sin(angle)
+        half_w = np.hypot(rx * cos, ry * sin)
+        half_h = np.hypot(rx * sin, ry * cos)
+        return np.stack((cx - half_w, cy - half_h, cx + half_w, cy + half_h), axis = 1)
+
+    def coverage(self, idx, pixel_x, pixel_y):
+        genes = self._shape_genes[idx]
+        u, v = _local_coordinates(genes, pixel_x, pixel_y)
+        u /= genes[self.RADIUS_X]
+        v /= genes[self.RADIUS_Y]
+        return u * u + v * v <= 1.0
+
+    def create_graphic_item(self, idx, qcolor):
+        cx, cy, rx, ry, angle = self._shape_genes[idx]
+        qitem = QtGui.QGraphicsEllipseItem(-rx, -ry, 2 * rx, 2 * ry)
+        qitem.setPos(cx, cy)
+        qitem.setRotation(np.degrees(angle))
+        qitem.setBrush(QtGui.QBrush(qcolor))
+        qitem.setPen(no_pen())
+        return qitem
+
+    def svg_element(self, idx, precision = 1):
+        cx, cy, rx, ry, angle = self._shape_genes[idx]
+        fmt = u'{{:.{}f}}'.format(precision)
+        return (u'<ellipse cx="{0}" cy="{1}" rx="{2}" ry="{3}" transform="rotate({4} {0} {1})" '
+                u'{5}/>'.format(fmt.format(cx), fmt.format(cy), fmt.format(rx), fmt.format(ry),
+                                fmt.format(np.degrees(angle)), self._svg_fill(idx)))
+
+
+class QtGsRectChromosome(QtGsShapeChromosome):
+    """ Rotated rectangles with (center_x, center_y, half_width, half_height, angle) genes
+    """
+    CENTER_X, CENTER_Y, HALF_WIDTH, HALF_HEIGHT, ANGLE = range(5)
+    SIZE_COLUMNS = (HALF_WIDTH, HALF_HEIGHT)
+    ANGLE_COLUMNS = (ANGLE, )
+
+    @staticmethod
+    def _random_shape_genes(n_shapes, rectangle, rng, max_size):
+        return _random_centered_genes(n_shapes, rectangle, rng, max_size)
+
+    def _compute_bounding_boxes(self):
+        cx, cy, hw, hh, angle = self._shape_genes.T
+        cos, sin = np.abs(np.cos(angle)), np.abs(np.sin(angle))
+        half_w = hw * cos + hh * sin
+        half_h = hw * sin + hh * cos
+        return np.stack((cx - half_w, cy - half_h, cx + half_w, cy + half_h), axis = 1)
+
+    def coverage(self, idx, pixel_x, pixel_y):
+        genes = self._shape_genes[idx]
+        u, v = _local_coordinates(genes, pixel_x, pixel_y)
+        return (np.abs(u) <= genes[self.HALF_WIDTH]) & (np.abs(v) <= genes[self.HALF_HEIGHT])
+
+    def create_graphic_item(self, idx, qcolor):
+        cx, cy, hw, hh, angle = self._shape_genes[idx]
+        qitem = QtGui.QGraphicsRectItem(-hw, -hh, 2 * hw, 2 * hh)
+        qitem.setPos(cx, cy)
+        qitem.setRotation(np.degrees(angle))
+        qitem.setBrush(QtGui.QBrush(qcolor))
+        qitem.setPen(no_pen())
+        return qitem
+
+    def svg_element(self, idx, precision = 1):
+        cx, cy, hw, hh, angle = self._shape_genes[idx]
+        fmt = u'{{:.{}f}}'.format(precision)
+        return (u'<rect x="{0}" y="{1}" width="{2}" height="{3}" transform="rotate({4} {5} {6})" '
+                u'{7}/>'.format(fmt.format(cx - hw), fmt.format(cy - hh), fmt.format(2 * hw),
+                                fmt.format(2 * hh), fmt.format(np.degrees(angle)),
+                                fmt.format(cx), fmt.format(cy), self._svg_fill(idx)))
+
+
+class QtGsStrokeChromosome(QtGsShapeChromosome):
+    """ Brush strokes: line segments with round caps and (x_0, y_0, x_1, y_1, radius) genes.
+
+        The radius is half the width of the stroke.
+    """
+    X_0, Y_0, X_1, Y_1, RADIUS = range(5)
+    SIZE_COLUMNS = (RADIUS, )
+
+    @staticmethod
+    def _random_shape_genes(n_shapes, rectangle, rng, max_size):
+        x, y, width, height = rectangle
+        length = max_size * min(width, height)
+        genes = np.empty((n_shapes, 5))
+        genes[:, 0] = x + width * rng.random(n_shapes)
+        genes[:, 1] = y + height * rng.random(n_shapes)
+        genes[:, 2:4] = genes[:, 0:2] + length * (rng.random((n_shapes, 2)) - 0.5)
+        genes[:, 4] = MIN_SIZE + (0.125 * length - MIN_SIZE) * rng.random(n_shapes)
+        return genes
+
+    def _compute_bounding_boxes(self):
+        genes = self._shape_genes
+        radius = genes[:, self.RADIUS]
+        x_min = np.minimum(genes[:, self.X_0], genes[:, self.X_1]) - radius
+        y_min = np.minimum(genes[:, self.Y_0], genes[:, self.Y_1]) - radius
+        x_max = np.maximum(genes[:, self.X_0], genes[:, self.X_1]) + radius
+        y_max = np.maximum(genes[:, self.Y_0], genes[:, self.Y_1]) + radius
+        return np.stack((x_min, y_min, x_max, y_max), axis = 1)
+
+    def coverage(self, idx, pixel_x, pixel_y):
+        x_0, y_0, x_1, y_1, radius = self._shape_genes[idx]
+        seg_x, seg_y = x_1 - x_0, y_1 - y_0
+        dx = pixel_x - x_0
+        dy = pixel_y - y_0
+        length_sq = seg_x * seg_x + seg_y * seg_y
+        if length_sq > 0:
+            # Distance to the closest point of the segment
+            t = np.clip((dx * seg_x + dy * seg_y) / length_sq, 0.0, 1.0)
+            dx = dx - t * seg_x
+            dy = dy - t * seg_y
+        return dx * dx + dy * dy <= radius * radius
+
+    def create_graphic_item(self, idx, qcolor):
+        x_0, y_0, x_1, y_1, radius = self._shape_genes[idx]
+        qitem = QtGui.QGraphicsLineItem(x_0, y_0, x_1, y_1)
+        qitem.setPen(QtGui.QPen(QtGui.QBrush(qcolor), 2 * radius, QtCore.Qt.SolidLine,
+                                QtCore.Qt.RoundCap))
+        return qitem
+
+    def svg_element(self, idx, precision = 1):
+        x_0, y_0, x_1, y_1, radius = self._shape_genes[idx]
+        color = self._color_genes[idx]
+        fmt = u'{{:.{}f}}'.format(precision)
+        return (u'<line x1="{}" y1="{}" x2="{}" y2="{}" stroke="#{:02x}{:02x}{:02x}" '
+                u'stroke-opacity="{:.3g}" stroke-width="{}" stroke-linecap="round"/>'
+                .format(fmt.format(x_0), fmt.format(y_0), fmt.format(x_1), fmt.format(y_1),
+                        color[0], color[1], color[2], color[3] / 255,
+                        fmt.format(2 * radius)))
+
+
+SHAPE_CHROMOSOMES = {
+    'ellipse': QtGsEllipseChromosome,
+    'rectangle': QtGsRectChromosome,
+    'stroke': QtGsStrokeChromosome,
+}
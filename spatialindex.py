@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Uniform grid index of bounding boxes for fast overlap queries.
+
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+# Column indices of a bounding box array with shape (n, 4)
+BBOX_X_MIN = 0
+BBOX_Y_MIN = 1
+BBOX_X_MAX = 2
+BBOX_Y_MAX = 3
+
+
+def polygon_bounding_boxes(poly_genes):
+    """ Returns a (n_poly, 4) array with the (x_min, y_min, x_max, y_max) of each polygon
+
+        poly_genes must be a (n_poly, n_vertices, 2) array.
+    """
+    return np.concatenate((poly_genes.min(axis = 1), poly_genes.max(axis = 1)), axis = 1)
+
+
+def boxes_overlap(bboxes, rect):
+    """ Returns a boolean mask of the bounding boxes that overlap with rect.
+
+        rect must be a (x_min, y_min, x_max, y_max) tuple. Touching edges count as overlap.
+    """
+    x_min, y_min, x_max, y_max = rect
+    return ((bboxes[:, BBOX_X_MIN] <= x_max) & (bboxes[:, BBOX_X_MAX] >= x_min) &
+            (bboxes[:, BBOX_Y_MIN] <= y_max) & (bboxes[:, BBOX_Y_MAX] >= y_min))
+
+
+class GridIndex(object):
+
+    def __init__(self, bboxes, cell_size = 32.0):
+        """ Uniform grid over bounding boxes.
+
+            Each box is registered in all cells that it overlaps. A query only tests the
+            boxes that are registered in the cells that the query rectangle overlaps.
+            Boxes can be moved with update(), which only re-registers the boxes that move
+            to other cells.
+
+            :param bboxes: (n, 4) array with (x_min, y_min, x_max, y_max) rows
+            :param cell_size: width and height of a grid cell
+        """
+        self._cell_size = float(cell_size)
+        self._bboxes = np.array(bboxes, dtype = np.float64)
+        self._cells = {}       # (cell_x, cell_y) -> set of box indices
+        self._owned = set()    # keys of the cells that aren't shared with a copy
+        self._box_cells = self._cell_ranges(self._bboxes)  # cell range of each box
+        for idx in range(len(self._bboxes)):
+            self._insert(idx)
+
+    def __len__(self):
+        return len(self._bboxes)
+
+    @property
+    def bboxes(self):
+        return self._bboxes
+
+    def copy(self):
+        """ Returns a copy that can be updated independently
+
+            The cells are shared until either index modifies them (copy-on-write), so
+            copying is cheap when only a few boxes are updated afterwards.
+        """
+        result = GridIndex.__new__(GridIndex)
+        result._cell_size = self._cell_size
+        result._bboxes = self._bboxes.copy()
+        result._cells = dict(self._cells)
+        result._owned = set()
+        result._box_cells = self._box_cells.copy()
+        self._owned = set()
+        return result
+
+    def _cell_range(self, x_min, y_min, x_max, y_max):
+        size = self._cell_size
+        return (int(np.floor(x_min / size)), int(np.floor(y_min / size)),
+                int(np.floor(x_max / size)), int(np.floor(y_max / size)))
+
+    def _cell_ranges(self, bboxes):
+        "Returns a (n, 4) integer array with the cell range of each box"
+        return np.floor(bboxes / self._cell_size).astype(np.intp).reshape(-1, 4)
+
+    def _own_cell(self, key):
+        "Returns the set of the cell for modification, copying it first if it is shared"
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = set()
+            self._owned.add(key)
+        elif key not in self._owned:
+            cell = self._cells[key] = set(cell)
+            self._owned.add(key)
+        return cell
+
+    def _insert(self, idx):
+        cx_min, cy_min, cx_max, cy_max = self._box_cells[idx].tolist()
+        for cx in range(cx_min, cx_max + 1):
+            for cy in range(cy_min, cy_max + 1):
+                self._own_cell((cx, cy)).add(idx)
+
+    @staticmethod
+    def _cells_outside(cell_range, other_range):
+        "Yields the keys of the cells in cell_range that are not in other_range"
+        cx_min, cy_min, cx_max, cy_max = cell_range
+        ox_min, oy_min, ox_max, oy_max = other_range
+        for cx in range(cx_min, cx_max + 1):
+            if ox_min <= cx <= ox_max:
+                for cy in range(cy_min, min(cy_max, oy_min - 1) + 1):
+                    yield (cx, cy)
+                for cy in range(max(cy_min, oy_max + 1), cy_max + 1):
+                    yield (cx, cy)
+            else:
+                for cy in range(cy_min, cy_max + 1):
+                    yield (cx, cy)
+
+    def _move(self, idx, cell_range):
+        "Re-registers box idx in cell_range; only the cells that differ are touched"
+        old_range = self._box_cells[idx].tolist()
+        for key in self._cells_outside(old_range, cell_range):
+            cell = self._own_cell(key)
+            cell.discard(idx)
+            if not cell:
+                del self._cells[key]
+                self._owned.discard(key)
+        for key in self._cells_outside(cell_range, old_range):
+            self._own_cell(key).add(idx)
+        self._box_cells[idx] = cell_range
+
+    def update(self, indices, bboxes):
+        """ Moves the boxes with the given indices to new bounding boxes.
+        """
+        indices = np.asarray(indices, dtype = np.intp)
+        if len(indices) == 0:
+            return
+        self._bboxes[indices] = bboxes
+        cell_ranges = self._cell_ranges(self._bboxes[indices])
+        moved = np.any(cell_ranges != self._box_cells[indices], axis = 1)
+        for idx, cell_range in zip(indices[moved].tolist(), cell_ranges[moved].tolist()):
+            self._move(idx, cell_range)
+
+    def query(self, rect):
+        """ Returns a sorted array with the indices of the boxes that overlap with rect
+
+            rect must be a (x_min, y_min, x_max, y_max) tuple.
+        """
+        cx_min, cy_min, cx_max, cy_max = self._cell_range(*rect)
+        n_cells = (cx_max - cx_min + 1) * (cy_max - cy_min + 1)
+        if n_cells >= len(self._cells):
+            candidates = np.arange(len(self._bboxes))  # cheaper to test all boxes
+        else:
+            found = set()
+            for cx in range(cx_min, cx_max + 1):
+                for cy in range(cy_min, cy_max + 1):
+                    found.update(self._cells.get((cx, cy), ()))
+            candidates = np.array(sorted(found), dtype = np.intp)
+
+        if len(candidates) == 0:
+            return candidates
+        return candidates[boxes_overlap(self._bboxes[candidates], rect)]
+
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Widgets for displaying the progress of the evolution
+
+"""
+from __future__ import print_function
+from __future__ import division
+
+import logging
+logger = logging.getLogger(__name__)
+
+from PySide import QtCore, QtGui
+from PySide.QtCore import Qt
+
+
+class ImageWidget(QtGui.QLabel):
+
+    def __init__(self, parent = None):
+        """ Label that displays a QImage scaled to its size while keeping the aspect ratio.
+        """
+        super(ImageWidget, self).__init__(parent = parent)
+        self._pixmap = None
+        self.setAlignment(Qt.AlignCenter)
+        self.setMinimumSize(50, 50)
+        self.setSizePolicy(QtGui.QSizePolicy.Ignored, QtGui.QSizePolicy.Ignored)
+
+    def set_image(self, image):
+        self._pixmap = QtGui.QPixmap.fromImage(image)
+        self._update_scaled_pixmap()
+
+    def resizeEvent(self, event):
+        self._update_scaled_pixmap()
+        super(ImageWidget, self).resizeEvent(event)
+
+    def _update_scaled_pixmap(self):
+        if self._pixmap is not None:
+            self.setPixmap(self._pixmap.scaled(self.size(), Qt.KeepAspectRatio,
+                                               Qt.SmoothTransformation))
+
+
+class ScorePlotWidget(QtGui.QWidget):
+
+    def __init__(self, parent = None):
+        """ Plots the score versus the (running) time as a step function.
+        """
+        super(ScorePlotWidget, self).__init__(parent = parent)
+        self._times = []
+        self._scores = []
+        self._margin = 45
+        self.setMinimumSize(200, 120)
+
+    def clear(self):
+        self._times = []
+        self._scores = []
+        self.update()
+
+    def add_points(self, points):
+        """ Adds a list of (elapsed, score) tuples to the plot
+        """
+        if not points:
+            return
+        for elapsed, score in points:
+            self._times.append(elapsed)
+            self._scores.append(score)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+
+        margin = self._margin
+        plot_rect = QtCore.QRectF(margin, margin / 2, self.width() - 1.5 * margin,
+                                  self.height() - 1.5 * margin)
+        painter.setPen(Qt.black)
+        painter.drawRect(plot_rect)
+
+        if len(self._times) < 1:
+            painter.drawText(plot_rect, Qt.AlignCenter, "No data")
+            painter.end()
+            return
+
+        t_max = max(self._times[-1], 1e-6)
+        s_min = min(self._scores)
+        s_max = max(self._scores)
+        if s_max - s_min < 1e-9:
+            s_max = s_min + 1e-9
+
+        def to_point(elapsed, score):
+            x = plot_rect.left() + plot_rect.width() * elapsed / t_max
+            y = plot_rect.bottom() - plot_rect.height() * (score - s_min) / (s_max - s_min)
+            return QtCore.QPointF(x, y)
+
+        points = []
+        prev_score = self._scores[0]
+        for elapsed, score in zip(self._times, self._scores):
+            points.append(to_point(elapsed, prev_score))
+            points.append(to_point(elapsed, score))
+            prev_score = score
+
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        painter.setPen(QtGui.QPen(Qt.blue, 1.5))
+        painter.drawPolyline(QtGui.QPolygonF(points))
+
+        painter.setPen(Qt.black)
+        painter.drawText(QtCore.QPointF(2, plot_rect.top() + 10), "{:.4f}".format(s_max))
+        painter.drawText(QtCore.QPointF(2, plot_rect.bottom()), "{:.4f}".format(s_min))
+        painter.drawText(QtCore.QPointF(plot_rect.right() - 60, self.height() - 4),
+                         "{:.1f} s".format(t_max))
+        painter.end()
+